@@ -0,0 +1,114 @@
+"""Measure the alignment of transcript lines to summary segments against a per-segment scan.
+
+The scan re-parses the timestamps of every transcript line for each segment, as consumers of the annotations did,
+which is O(segments x lines) per video. `lib.align` parses each timestamp once and places every line with
+`np.searchsorted`. The dataset-wide pass is timed as the index build does it, reading the annotations written to a
+temporary dataset in one process and split across `--processes`.
+
+    python -m benchmarks.bench_align --videos 2000 --segments 12 --lines 400 --processes 8
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from lib import align
+from lib import utils
+from lib.index import DatasetIndex
+
+
+def naive_ranges(annotation):
+    """First transcript line and number of lines of every segment, scanning the transcript for each segment."""
+    result = []
+    for segment in annotation['summary']:
+        start = utils.timestamp_to_seconds(segment['start_time'])
+        end = utils.timestamp_to_seconds(segment['end_time'])
+        lines = [
+            i for i, line in enumerate(annotation['transcript'])
+            if start <= utils.timestamp_to_seconds(line['start_time']) <= end
+        ]
+        result.append((lines[0] if lines else None, len(lines)))
+    return result
+
+
+def vectorized_ranges(annotation):
+    alignment = align.align_annotation(annotation)
+    return [
+        (int(first) if count else None, int(count))
+        for first, count in zip(alignment['first_transcript'], alignment['num_transcripts'])
+    ]
+
+
+def synthetic(rng: random.Random, segments: int, lines: int, duration: int = 3600):
+    """An annotation with contiguous segments and transcript lines over `duration` seconds."""
+
+    def contiguous(count, first):
+        starts = sorted(rng.sample(range(first + 1, duration), count - 1)) if count > 1 else []
+        bounds = list(zip([first] + starts, [s - 1 for s in starts] + [duration]))
+        return [
+            {
+                'start_time': utils.float_to_timestamp(start),
+                'end_time': utils.float_to_timestamp(end),
+                'summary': 'word ' * 8
+            } for start, end in bounds
+        ]
+
+    return {'summary': contiguous(segments, 0), 'transcript': contiguous(lines, 0)}
+
+
+def write_dataset(dataset_dir: str, annotations, subcategories: int = 16):
+    for i, annotation in enumerate(annotations):
+        annotation['info'] = {'youtube_id': f"yt{i}", 'duration': annotation['summary'][-1]['end_time']}
+        for j, segment in enumerate(annotation['summary']):
+            segment['segment'], segment['length'] = j, segment['end_time']
+        ann_dir = os.path.join(dataset_dir, 'annotation', 'bench', f"sub{i % subcategories}")
+        os.makedirs(ann_dir, exist_ok=True)
+        with open(os.path.join(ann_dir, f"BENSUB{i:04d}.json"), 'w') as f:
+            json.dump(annotation, f)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Alignment benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--videos', default=500, type=int, help='Number of annotations to align')
+    parser.add_argument('--segments', default=12, type=int, help='Number of summary segments per video')
+    parser.add_argument('--lines', default=400, type=int, help='Number of transcript lines per video')
+    parser.add_argument('--processes', default=os.cpu_count(), type=int, help='Processes of the batch alignment')
+    parser.add_argument('--seed', default=0, type=int)
+    return parser
+
+
+def main(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    annotations = [synthetic(rng, args.segments, args.lines) for _ in range(args.videos)]
+    assert all(naive_ranges(a) == vectorized_ranges(a) for a in annotations[:50])
+
+    start = time.perf_counter()
+    for annotation in annotations:
+        naive_ranges(annotation)
+    naive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for annotation in annotations:
+        vectorized_ranges(annotation)
+    vectorized = time.perf_counter() - start
+
+    print(f"{args.videos} videos, {args.segments} segments, {args.lines} transcript lines each")
+    print(f"{'naive scan':>28} {1000 * naive:>9.1f} ms")
+    print(f"{'searchsorted':>28} {1000 * vectorized:>9.1f} ms {naive / vectorized:>7.1f}x")
+    with tempfile.TemporaryDirectory() as dataset_dir:
+        write_dataset(dataset_dir, annotations)
+        for processes in sorted({1, args.processes}):
+            start = time.perf_counter()
+            index = DatasetIndex.build(dataset_dir, processes=processes)
+            elapsed = time.perf_counter() - start
+            assert len(index.transcripts['video']) == args.videos * args.lines
+            label = f"index build, {processes} process{'es' if processes > 1 else ''}"
+            print(f"{label:>28} {1000 * elapsed:>9.1f} ms {naive / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
@@ -0,0 +1,117 @@
+"""Measure chapter extraction from `initial_data` against the retry loop it replaced.
+
+The previous extraction walked the engagement panel and then the overlay up to `tries=5` times each, so a video
+without chapters cost ten failed traversals. Fixtures are read from `--fixtures-dir` (see `benchmarks.fixtures`),
+or synthesized.
+
+    python -m benchmarks.bench_chapters --videos 500 --fixtures-dir benchmarks/fixtures
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from benchmarks import fixtures
+from lib import chapters
+from lib import constants
+
+
+def legacy_chapter_renderers(initial_data, tries=5):
+    """The extraction `fetch.Video.chapter_renderers` used to do."""
+
+    def from_overlay():
+        markers = initial_data['playerOverlays']['playerOverlayRenderer']['decoratedPlayerBarRenderer'][
+            'decoratedPlayerBarRenderer']['playerBar']['multiMarkersPlayerBarRenderer']['markersMap']
+        for chapter in markers[0]['value']['chapters']:
+            renderer = chapter['chapterRenderer']
+            assert len(renderer['thumbnail']['thumbnails']) > 0
+            yield renderer['timeRangeStartMillis'] / 1000, renderer
+
+    def from_engagement_panel():
+        panels = [
+            p['engagementPanelSectionListRenderer'] for p in initial_data['engagementPanels']
+            if p['engagementPanelSectionListRenderer'].get('panelIdentifier', None) == chapters.ENGAGEMENT_PANEL
+        ]
+        for chapter in (c for c in panels[0]['content']['macroMarkersListRenderer']['contents']
+                        if 'macroMarkersListItemRenderer' in c):
+            renderer = chapter['macroMarkersListItemRenderer']
+            assert len(renderer['thumbnail']['thumbnails']) > 0
+            yield renderer['onTap']['watchEndpoint']['startTimeSeconds'], renderer
+
+    errors = []
+    for _ in range(tries):
+        for gen in (from_engagement_panel, from_overlay):
+            try:
+                return list(gen())
+            except (KeyError, IndexError, AssertionError) as e:
+                errors.append(e)
+    raise Exception(errors)
+
+
+def legacy_keyframes(initial_data):
+    """Titles and keyframe urls, as `fetch.Video.build_summary` used to pick them from the renderers."""
+    result = []
+    for ts, renderer in legacy_chapter_renderers(initial_data):
+        keyframe = [
+            frame for frame in renderer['thumbnail']['thumbnails']
+            if frame['height'] == constants.KEYFRAME_HEIGHT and frame['width'] == constants.KEYFRAME_WIDTH
+        ]
+        result.append((ts, renderer['title']['simpleText'], keyframe[0]['url'] if keyframe else None))
+    return result
+
+
+def keyframes(initial_data):
+    return [
+        (chapter.start, chapter.title, chapter.thumbnail(constants.KEYFRAME_WIDTH, constants.KEYFRAME_HEIGHT))
+        for chapter in chapters.parse(initial_data)
+    ]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Chapter benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--videos', default=500, type=int, help='Number of videos to extract chapters from')
+    parser.add_argument('--chapters', default=12, type=int, help='Number of chapters of synthetic videos')
+    parser.add_argument('--fixtures-dir', default=None, help='Directory of recorded fixtures')
+    return parser
+
+
+def load_pages(args: argparse.Namespace):
+    pages = []
+    if args.fixtures_dir is not None:
+        for filename in sorted(os.listdir(args.fixtures_dir)):
+            if filename.endswith('.json'):
+                pages.append(fixtures.load(args.fixtures_dir, filename[:-len('.json')])['initial_data'])
+    if not pages:
+        pages = [fixtures.synthetic(f"bench{i:06d}", chapters=args.chapters)['initial_data'] for i in range(100)]
+    return [pages[i % len(pages)] for i in range(args.videos)]
+
+
+def timed(extract, pages) -> float:
+    start = time.perf_counter()
+    for page in pages:
+        try:
+            extract(page)
+        except Exception:
+            pass
+    return time.perf_counter() - start
+
+
+def main(args: argparse.Namespace):
+    pages = load_pages(args)
+    # Pages served without chapters, the case the retries were meant for
+    empty = [{'engagementPanels': [], 'playerOverlays': {}} for _ in pages]
+    assert all(legacy_keyframes(page) == keyframes(page) for page in pages[:100])
+    print(f"{'pages':>18} {'legacy ms':>10} {'parse ms':>10} {'speedup':>8}")
+    for name, batch, legacy_extract, extract in (
+        ('with chapters', pages, legacy_chapter_renderers, chapters.parse),
+        ('keyframe urls', pages, legacy_keyframes, keyframes),
+        ('without chapters', empty, legacy_chapter_renderers, chapters.parse),
+    ):
+        legacy = timed(legacy_extract, batch)
+        parsed = timed(extract, batch)
+        print(f"{name:>18} {1000 * legacy:>10.1f} {1000 * parsed:>10.1f} {legacy / parsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
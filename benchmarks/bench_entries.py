@@ -0,0 +1,114 @@
+"""Measure the per-entry cost of path queries against the entry class that created directories on every query.
+
+Entries are read from `--video-ids`, or from a synthetic key set the size of the real one (17 categories, 10
+subcategories, 30 videos each). Each pass reads the keys, then asks every entry for its video id, annotation, video
+and keyframe paths and whether it exists, as `build_msmo.py` does for each entry before downloading it.
+
+    python -m benchmarks.bench_entries --video-ids ./keys --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+from lib import data
+
+
+@dataclass
+class LegacyEntry:
+    """`data.MSMOEntry` as it was: paths joined and their directory created on every query."""
+    category: str
+    subcategory: str
+    index: int
+    youtube_id: str
+    root_dir: str
+
+    def keyframe_path(self, keyframe_id):
+        return self._make_path(self._subfolder('keyframe'), self.video_id, f"keyframe_{keyframe_id}.jpg")
+
+    def annotation_path(self):
+        return self._make_path(self._subfolder('annotation'), f"{self.video_id}.json")
+
+    def video_path(self):
+        return self._make_path(self._subfolder('video'), f"{self.video_id}.mp4")
+
+    @staticmethod
+    def _make_path(*args):
+        path = os.path.join(*args)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _subfolder(self, attribute: str):
+        return os.path.join(self.root_dir, attribute, self.category, self.subcategory)
+
+    @property
+    def video_id(self) -> str:
+        return f"{self.category[:3].upper()}{self.subcategory[:3].upper()}{self.index:04d}"
+
+    def exists(self) -> bool:
+        return all(os.path.exists(p) for p in (self.annotation_path(), self.keyframe_path(0), self.video_path()))
+
+
+def write_keys(key_dir: str, categories: int = 17, subcategories: int = 10, videos: int = 30):
+    for c in range(categories):
+        with open(os.path.join(key_dir, f"category{c:02d}.csv"), 'w') as f:
+            for s in range(subcategories):
+                f.write(f"Subcategory{s:02d}," + ','.join(f"yt{c:02d}{s:02d}{v:03d}" for v in range(videos)) + '\n')
+
+
+def query(entries):
+    for entry in entries:
+        entry.video_id, entry.annotation_path(), entry.video_path(), entry.keyframe_path(0), entry.exists()
+
+
+def best_of(repeat: int, f) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def count_dirs(root: str) -> int:
+    return sum(len(dirs) for _, dirs, _ in os.walk(root))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Entry benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--video-ids', default=None, help='Directory of the key files (default: synthetic keys)')
+    parser.add_argument('--repeat', default=3, type=int, help='Number of passes over the entries')
+    return parser
+
+
+def main(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        key_dir = args.video_ids
+        if key_dir is None:
+            key_dir = os.path.join(tmp_dir, 'keys')
+            os.makedirs(key_dir)
+            write_keys(key_dir)
+        rows = [(e.category, e.subcategory, e.index, e.youtube_id) for e in data.read_entries(key_dir, tmp_dir)]
+        print(f"{len(rows)} entries")
+        print(f"{'entries':>10} {'create us':>10} {'query us':>9} {'dirs created':>13}")
+        for name, entry_class in (('legacy', LegacyEntry), ('slotted', data.MSMOEntry)):
+            dataset_dir = os.path.join(tmp_dir, name)
+            os.makedirs(dataset_dir)
+            entries = [entry_class(*row, dataset_dir) for row in rows]
+            create = best_of(args.repeat, lambda: [entry_class(*row, dataset_dir) for row in rows])
+            queries = best_of(args.repeat, lambda: query(entries))
+            print(
+                f"{name:>10} {1e6 * create / len(rows):>10.2f} {1e6 * queries / len(rows):>9.2f} "
+                f"{count_dirs(dataset_dir):>13}"
+            )
+        start = time.perf_counter()
+        data.make_tree(entries)
+        print(f"make_tree: {1000 * (time.perf_counter() - start):.1f} ms for the whole tree, "
+              f"{count_dirs(dataset_dir)} directories")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
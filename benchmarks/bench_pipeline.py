@@ -0,0 +1,177 @@
+"""Measure the throughput of the whole pipeline against the fake YouTube server.
+
+Every entry goes through `fetch.Video` with an `HTTPBackend`, exactly as `build_msmo.py --backend` would run it, and
+the latency of each stage is recorded. Runs are deterministic for a given `--seed`, so changes to the fetch code can be
+compared without the live service. With `--staged`, entries also go through `lib.pipeline.Pipeline`, with that many
+workers per stage, for comparison with whole entries per worker.
+
+    python -m benchmarks.bench_pipeline --entries 100 --workers 1 8 --latency 0.02 --failure-rate 0.01 --staged
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmarks.server import FakeServer
+from lib import backend
+from lib import pipeline
+from lib import probe
+from lib import scheduler
+from lib import session
+from lib.data import MSMOEntry
+from lib.fetch import Video
+from lib.ledger import DONE, Ledger
+
+STAGES = ('metadata', 'initial_data', 'transcript', 'streams', 'keyframe', 'video')
+
+
+class Timings:
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.samples[stage].append(elapsed)
+
+    def percentiles(self, stage: str) -> Tuple[float, float]:
+        """The median and 99th percentile latency of a stage in milliseconds."""
+        samples = self.samples.get(stage)
+        if not samples:
+            return float('nan'), float('nan')
+        p50, p99 = np.percentile(samples, [50, 99]) * 1000
+        return p50, p99
+
+
+class TimedSource(backend.Source):
+
+    def __init__(self, source: backend.Source, timings: Timings):
+        self.source = source
+        self.timings = timings
+
+    def metadata(self) -> backend.Metadata:
+        return self.source.metadata()
+
+    def initial_data(self, refresh: bool = False) -> dict:
+        with self.timings.time('initial_data'):
+            return self.source.initial_data(refresh)
+
+    def transcript(self) -> List[dict]:
+        with self.timings.time('transcript'):
+            return self.source.transcript()
+
+    def stream_formats(self) -> List[probe.StreamFormat]:
+        with self.timings.time('streams'):
+            return self.source.stream_formats()
+
+    def stream(self, itag: int) -> Tuple[str, int]:
+        return self.source.stream(itag)
+
+
+class TimedBackend(backend.HTTPBackend):
+
+    def __init__(self, base_url: str, limiter: scheduler.TrafficLimiter, timings: Timings):
+        super().__init__(base_url, limiter)
+        self.timings = timings
+
+    def open(self, youtube_id: str) -> backend.Source:
+        with self.timings.time('metadata'):
+            source = super().open(youtube_id)
+        return TimedSource(source, self.timings)
+
+    def fetch_blob(self, url: str, path: str) -> bool:
+        with self.timings.time('keyframe'):
+            return super().fetch_blob(url, path)
+
+    def fetch_stream(self, url: str, path: str, filesize: int = None):
+        with self.timings.time('video'):
+            super().fetch_stream(url, path, filesize=filesize)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Pipeline benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', default=100, type=int, help='Number of videos to download per run')
+    parser.add_argument('--workers', default=[1, 8], type=int, nargs='+', help='Concurrent entries to compare')
+    parser.add_argument('--latency', default=0.02, type=float, help='Simulated round-trip latency in seconds')
+    parser.add_argument('--failure-rate', default=0., type=float, help='Fraction of requests failing with 503')
+    parser.add_argument('--seed', default=0, type=int, help='Seed of the simulated failures')
+    parser.add_argument('--chapters', default=8, type=int, help='Number of chapters (keyframes) per video')
+    parser.add_argument('--video-size', default=1024 * 1024, type=int, help='Size of each video in bytes')
+    parser.add_argument('--fixtures-dir', default=None, help='Directory of recorded fixtures to serve')
+    parser.add_argument('--staged', action='store_true', help='Also run the entries through the staged pipeline')
+    return parser
+
+
+def youtube_ids(fixtures_dir: str, entries: int) -> List[str]:
+    """Ids of the recorded fixtures, repeated up to `entries`, or synthetic ids if there are none."""
+    recorded = []
+    if fixtures_dir is not None:
+        recorded = sorted(f[:-len('.json')] for f in os.listdir(fixtures_dir) if f.endswith('.json'))
+    if not recorded:
+        return [f"bench{i:06d}" for i in range(entries)]
+    return [recorded[i % len(recorded)] for i in range(entries)]
+
+
+def run(server: FakeServer, ids: List[str], workers: int, timings: Timings, staged: bool = False):
+    """Download the videos, returning the elapsed time, the ledger and the failures."""
+    with tempfile.TemporaryDirectory() as root_dir:
+        ledger = Ledger.in_dataset(root_dir)
+        limiter = scheduler.TrafficLimiter()
+        fetch_backend = TimedBackend(server.url, limiter, timings)
+        batch = [MSMOEntry('Bench', 'Pipeline', i, youtube_id, root_dir) for i, youtube_id in enumerate(ids)]
+        start = time.perf_counter()
+        if staged:
+            stage_workers = pipeline.Workers(workers, workers, workers, workers)
+            failures = pipeline.Pipeline(fetch_backend, limiter, ledger, stage_workers).run(batch)
+        else:
+            failures = scheduler.run(
+                batch, lambda entry: Video(entry, limiter=limiter, ledger=ledger, backend=fetch_backend).download(),
+                workers
+            )
+        return time.perf_counter() - start, ledger, failures
+
+
+def main(args: argparse.Namespace):
+    with FakeServer(
+        latency=args.latency,
+        video_size=args.video_size,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+        chapters=args.chapters,
+        fixtures_dir=args.fixtures_dir,
+    ) as server:
+        ids = youtube_ids(args.fixtures_dir, args.entries)
+        for workers, staged in ((w, s) for w in args.workers for s in ((False, True) if args.staged else (False, ))):
+            session.configure(pool_size=max(workers * args.chapters, 10))
+            timings = Timings()
+            bytes_sent = server.bytes_sent
+            elapsed, ledger, failures = run(server, ids, workers, timings, staged)
+            done = {artifact: counts[DONE] for artifact, counts in ledger.summary().items()}
+            print(
+                f"workers={workers}{' staged' if staged else ''}: {args.entries / elapsed:.1f} entries/sec, "
+                f"{(server.bytes_sent - bytes_sent) / elapsed / 1024 / 1024:.1f} MB/sec, "
+                f"{len(failures)} failed entries, done " + ", ".join(f"{a}={n}" for a, n in done.items())
+            )
+            print(f"  {'stage':>12} {'count':>6} {'p50 ms':>8} {'p99 ms':>8}")
+            for stage in STAGES:
+                p50, p99 = timings.percentiles(stage)
+                print(f"  {stage:>12} {len(timings.samples[stage]):>6} {p50:>8.1f} {p99:>8.1f}")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""Measure entries/minute of the concurrent scheduler as the worker count grows.
+
+Each fake entry fetches a watch page, `--keyframes` thumbnails and one video from a local server, going through the
+same `TrafficLimiter` slots and `MSMOEntry` paths as `Video.download`.
+
+    python -m benchmarks.bench_scheduler --entries 60 --workers 1 2 4 8 16
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.server import FakeServer
+from lib import scheduler
+from lib import utils
+from lib.data import MSMOEntry
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Scheduler benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', default=60, type=int, help='Number of fake entries to download per run')
+    parser.add_argument('--keyframes', default=8, type=int, help='Number of keyframes per entry')
+    parser.add_argument('--workers', default=[1, 2, 4, 8, 16], type=int, nargs='+', help='Worker counts to compare')
+    parser.add_argument('--latency', default=0.02, type=float, help='Simulated round-trip latency in seconds')
+    return parser
+
+
+def fake_entries(n: int, root_dir: str):
+    return [MSMOEntry('bench', 'scheduler', i, f"yt{i:07d}", root_dir) for i in range(n)]
+
+
+def fake_download(server_url: str, keyframes: int, limiter: scheduler.TrafficLimiter):
+
+    def download(entry: MSMOEntry):
+        watch_url = f"{server_url}/watch/{entry.youtube_id}"
+        with limiter.slot(scheduler.METADATA, watch_url):
+            html = requests.get(watch_url).text
+        utils.make_dirs(entry.annotation_dir, entry.video_dir, entry.keyframe_dir)
+        with open(entry.annotation_path(), 'w') as ann_file:
+            ann_file.write(html)
+        for i in range(keyframes):
+            url = f"{server_url}/thumb/{entry.youtube_id}/{i}.jpg"
+            with limiter.slot(scheduler.THUMBNAIL, url):
+                utils.download_blob(url, entry.keyframe_path(i))
+        url = f"{server_url}/video/{entry.youtube_id}.mp4"
+        with limiter.slot(scheduler.VIDEO, url):
+            utils.download_blob(url, entry.video_path())
+
+    return download
+
+
+def main(args: argparse.Namespace):
+    with FakeServer(latency=args.latency) as server:
+        print(f"{'workers':>8} {'seconds':>8} {'entries/min':>12}")
+        for workers in args.workers:
+            limiter = scheduler.TrafficLimiter(scheduler.Limits(metadata=workers, thumbnail=2 * workers, video=workers))
+            with tempfile.TemporaryDirectory() as root_dir:
+                entries = fake_entries(args.entries, root_dir)
+                start = time.perf_counter()
+                failures = scheduler.run(entries, fake_download(server.url, args.keyframes, limiter), workers)
+                elapsed = time.perf_counter() - start
+                assert not failures, failures
+                assert all(entry.exists() for entry in entries)
+            print(f"{workers:>8} {elapsed:>8.2f} {60 * args.entries / elapsed:>12.1f}")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
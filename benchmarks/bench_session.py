@@ -0,0 +1,67 @@
+"""Measure thumbnails/second through `utils.download_blob` with and without connection pooling.
+
+    python -m benchmarks.bench_session --thumbnails 200 --workers 1 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.server import FakeServer
+from lib import session
+from lib import utils
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Session benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--thumbnails', default=200, type=int, help='Number of thumbnails to download per run')
+    parser.add_argument('--workers', default=[1, 8], type=int, nargs='+', help='Concurrent downloads to compare')
+    parser.add_argument('--latency', default=0.005, type=float, help='Simulated round-trip latency in seconds')
+    parser.add_argument(
+        '--connect-latency', default=0.03, type=float, help='Simulated connection handshake latency in seconds'
+    )
+    return parser
+
+
+def download_unpooled(url: str, path: str):
+    with requests.Session() as fresh:
+        utils.download_blob(url, path, session=fresh)
+
+
+def download_pooled(url: str, path: str):
+    utils.download_blob(url, path)
+
+
+def run(server: FakeServer, download, thumbnails: int, workers: int) -> float:
+    with tempfile.TemporaryDirectory() as root_dir, ThreadPoolExecutor(workers) as pool:
+        start = time.perf_counter()
+        list(
+            pool.map(
+                lambda i: download(f"{server.url}/thumb/bench/{i}.jpg", os.path.join(root_dir, f"{i}.jpg")),
+                range(thumbnails),
+            )
+        )
+        return time.perf_counter() - start
+
+
+def main(args: argparse.Namespace):
+    with FakeServer(latency=args.latency, connect_latency=args.connect_latency) as server:
+        print(f"{'mode':>9} {'workers':>8} {'connections':>12} {'thumbs/sec':>11}")
+        for workers in args.workers:
+            session.configure(pool_size=workers)
+            for mode, download in (('unpooled', download_unpooled), ('pooled', download_pooled)):
+                connections = server.connections
+                elapsed = run(server, download, args.thumbnails, workers)
+                print(
+                    f"{mode:>9} {workers:>8} {server.connections - connections:>12} "
+                    f"{args.thumbnails / elapsed:>11.1f}"
+                )
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Measure timestamp formatting and parsing against the per-call functions they replaced.
+
+`utils.float_to_timestamp` went through `math.modf`, `time.gmtime` and `time.strftime`, and `utils.parse_time`
+matched a regex, once per timestamp. `lib.timestamps` converts whole columns at once. The timestamps are those of
+`--lines` transcript lines spread over a `--hours` long video.
+
+    python -m benchmarks.bench_timestamps --lines 5000 --repeat 5
+"""
+
+import argparse
+import math
+import re
+import sys
+import time
+
+import numpy as np
+
+from lib import timestamps
+
+
+def legacy_format(ts: float) -> str:
+    _, whole = math.modf(ts)
+    return time.strftime("%H:%M:%S", time.gmtime(whole))
+
+
+def legacy_parse(timestamp: str) -> int:
+    if not re.match(r"^\d\d+\:\d{2}\:\d{2}$", timestamp):
+        raise ValueError(f"Timestamp `{timestamp}` is not in expected format HH:MM:SS")
+    hours, minutes, seconds = map(int, timestamp.split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def best_of(repeat: int, f) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Timestamp benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', default=5000, type=int, help='Number of timestamps to convert')
+    parser.add_argument('--hours', default=3, type=float, help='Length of the video the timestamps span')
+    parser.add_argument('--repeat', default=5, type=int, help='Number of runs, of which the fastest is kept')
+    return parser
+
+
+def main(args: argparse.Namespace):
+    seconds = np.sort(np.random.default_rng(0).uniform(0, args.hours * 3600, args.lines))
+    values = seconds.tolist()
+    formatted = timestamps.to_timestamps(seconds)
+    assert formatted == [legacy_format(s) for s in values]
+    assert timestamps.to_seconds_array(formatted).tolist() == [legacy_parse(t) for t in formatted]
+    cases = (
+        ('format', lambda: [legacy_format(s) for s in values], lambda: [timestamps.to_timestamp(s) for s in values],
+         lambda: timestamps.to_timestamps(seconds)),
+        ('parse', lambda: [legacy_parse(t) for t in formatted], lambda: [timestamps.to_seconds(t) for t in formatted],
+         lambda: timestamps.to_seconds_array(formatted)),
+    )
+    print(f"{args.lines} timestamps")
+    print(f"{'':>8} {'legacy ms':>10} {'per-call ms':>12} {'array ms':>9} {'speedup':>8}")
+    for name, legacy, per_call, array in cases:
+        times = [best_of(args.repeat, f) for f in (legacy, per_call, array)]
+        print(
+            f"{name:>8} {1000 * times[0]:>10.2f} {1000 * times[1]:>12.2f} {1000 * times[2]:>9.2f} "
+            f"{times[0] / times[2]:>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
@@ -0,0 +1,151 @@
+"""Fixtures served by the fake YouTube server.
+
+A fixture holds what the pipeline reads for one video: `metadata` (title, author, length), the `initial_data` with
+its chapters and the raw `transcript`. Fixtures are either recorded from the local cache of real videos, or
+synthesized with a configurable number of chapters and transcript lines.
+
+    python -m benchmarks.fixtures --video-ids ./keys --output benchmarks/fixtures --limit 50
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from typing import Optional
+
+from lib import cache
+from lib import constants
+from lib import data
+
+
+def synthetic(youtube_id: str, chapters: int = 8, length: int = 600, lines: int = 200) -> dict:
+    """A fixture with evenly spaced chapters (in the engagement panel layout) and transcript lines."""
+    contents = [
+        {
+            'macroMarkersListItemRenderer': {
+                'title': {'simpleText': f"Chapter {i} of {youtube_id}"},
+                'thumbnail': {
+                    'thumbnails': [
+                        {'url': f"https://i.ytimg.com/vi/{youtube_id}/hqdefault_{i}.jpg", 'width': 168, 'height': 94},
+                        {
+                            'url': f"https://i.ytimg.com/vi/{youtube_id}/hqdefault_{i}.jpg",
+                            'width': constants.KEYFRAME_WIDTH,
+                            'height': constants.KEYFRAME_HEIGHT,
+                        },
+                    ]
+                },
+                'onTap': {'watchEndpoint': {'startTimeSeconds': i * length // chapters}},
+            }
+        } for i in range(chapters)
+    ]
+    return {
+        'metadata': {'title': f"Video {youtube_id}", 'author': 'Fake Author', 'length': length},
+        'initial_data': {
+            'engagementPanels': [
+                {
+                    'engagementPanelSectionListRenderer': {
+                        'panelIdentifier': 'engagement-panel-macro-markers-auto-chapters',
+                        'content': {'macroMarkersListRenderer': {'contents': contents}},
+                    }
+                }
+            ]
+        },
+        'transcript': [
+            {'text': f"Line {i} of the transcript", 'start': i * length / lines, 'duration': 1.5 * length / lines}
+            for i in range(lines)
+        ],
+    }
+
+
+def load(fixtures_dir: Optional[str], youtube_id: str) -> Optional[dict]:
+    """The recorded fixture of a video, if there is one."""
+    if fixtures_dir is None:
+        return None
+    path = os.path.join(fixtures_dir, f"{youtube_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def rewrite_thumbnails(initial_data: dict, base_url: str, youtube_id: str) -> dict:
+    """A copy of `initial_data` with every thumbnail url pointing at the fake server, numbered in order."""
+    count = 0
+
+    def rewrite(node):
+        nonlocal count
+        if isinstance(node, dict):
+            if 'thumbnails' in node and isinstance(node['thumbnails'], list):
+                thumbnails = []
+                for thumbnail in node['thumbnails']:
+                    thumbnails.append({**thumbnail, 'url': f"{base_url}/thumb/{youtube_id}/{count}.jpg"})
+                    count += 1
+                return {**{k: rewrite(v) for k, v in node.items() if k != 'thumbnails'}, 'thumbnails': thumbnails}
+            return {k: rewrite(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [rewrite(v) for v in node]
+        return node
+
+    return rewrite(initial_data)
+
+
+def jpeg(width: int, height: int, size: int) -> bytes:
+    """A minimal JPEG header of the given dimensions, padded to `size` bytes."""
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    padding = max(0, size - len(sof) - 8)
+    return b'\xff\xd8' + b'\xff\xfe' + struct.pack('>H', padding + 2) + b'\x00' * padding + sof + b'\xff\xd9'
+
+
+def mp4(length: int, size: int) -> bytes:
+    """A minimal MP4 of `length` seconds, its `mdat` box padded with a byte pattern to `size` bytes in total."""
+
+    def box(box_type: bytes, payload: bytes) -> bytes:
+        return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+    mvhd = box(b'mvhd', b'\x00\x00\x00\x00' + struct.pack('>IIII', 0, 0, 1000, length * 1000) + b'\x00' * 80)
+    head = box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41') + box(b'moov', mvhd)
+    payload_size = max(0, size - len(head) - 8)
+    payload = (bytes(range(251)) * (payload_size // 251 + 1))[:payload_size]
+    return head + box(b'mdat', payload)
+
+
+def record(youtube_id: str) -> dict:
+    """A fixture of a real video, read from the local cache."""
+    yt = cache.youtube(youtube_id)
+    return {
+        'metadata': {'title': yt.title, 'author': yt.author, 'length': yt.length},
+        'initial_data': yt.initial_data,
+        'transcript': cache.transcript(youtube_id),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Fixture recorder', description='Records fixtures from the local cache')
+    parser.add_argument('--video-ids', help='Path to a directory with .csv files of videos', required=True)
+    parser.add_argument('-o', '--output', help='Directory to write the fixtures to', required=True)
+    parser.add_argument('--cache-dir', help='Directory of the cache', default=constants.CACHE_DIR)
+    parser.add_argument('--limit', help='Maximum number of fixtures to record', default=None, type=int)
+    return parser
+
+
+def main(args: argparse.Namespace):
+    cache.configure(root=args.cache_dir, enabled=True, offline=True, ttl=None)
+    os.makedirs(args.output, exist_ok=True)
+    recorded = 0
+    for entry in data.read_entries(args.video_ids, '.'):
+        if args.limit is not None and recorded >= args.limit:
+            break
+        try:
+            fixture = record(entry.youtube_id)
+        except cache.CacheMissError as e:
+            print(f"Skipping {entry.youtube_id}: {e}", file=sys.stderr)
+            continue
+        with open(os.path.join(args.output, f"{entry.youtube_id}.json"), 'w') as f:
+            json.dump(fixture, f)
+        recorded += 1
+    print(f"Recorded {recorded} fixtures to `{args.output}`")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
@@ -0,0 +1,264 @@
+"""A local HTTP server standing in for the remote hosts during benchmarks.
+
+Routes:
+    /watch/<youtube_id>                 A small HTML page.
+    /thumb/<youtube_id>/<i>.jpg         A `thumbnail_size` bytes JPEG of the keyframe dimensions.
+    /video/<youtube_id>.mp4             A `video_size` bytes MP4 of `video_length` seconds.
+    /api/<youtube_id>/metadata          Title, author and length of the video, as JSON.
+    /api/<youtube_id>/initial_data      The `initial_data` holding the chapters, its thumbnails served by `/thumb/`.
+    /api/<youtube_id>/transcript        The raw transcript.
+    /api/<youtube_id>/streams           The stream formats, served by `/video/`.
+
+The `/api/` routes are what `backend.HTTPBackend` reads, so the whole pipeline can run against this server. Their
+data comes from the recorded fixtures in `fixtures_dir` if there is one for the video, and is synthesized otherwise
+(see `benchmarks.fixtures`).
+
+Video responses honour `Range: bytes=a-b` requests, and `drops` of them can be cut off after `drop_after` bytes to
+simulate a flaky link. With `rate_limit` set, requests beyond that many per second are answered with 429, like a
+throttling CDN, and a `failure_rate` fraction of requests fail with 503 at random (seeded by `seed`). Every response
+is delayed by `latency` seconds to simulate a round-trip to a remote host, and every new connection by
+`connect_latency` seconds to simulate a TCP+TLS handshake.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import fixtures
+from lib import backend
+from lib import constants
+from lib import probe
+
+
+class FakeServer:
+    def __init__(
+        self,
+        latency: float = 0.02,
+        connect_latency: float = 0.,
+        thumbnail_size: int = 16 * 1024,
+        video_size: int = 1024 * 1024,
+        drop_after: int = None,
+        drops: int = 0,
+        rate_limit: float = None,
+        failure_rate: float = 0.,
+        seed: int = 0,
+        video_length: int = 600,
+        chapters: int = 8,
+        transcript_lines: int = 200,
+        fixtures_dir: str = None,
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.thumbnail_size = thumbnail_size
+        self.video_size = video_size
+        self.video_length = video_length
+        self.video = fixtures.mp4(video_length, video_size)
+        self.thumbnail = fixtures.jpeg(constants.KEYFRAME_WIDTH, constants.KEYFRAME_HEIGHT, thumbnail_size)
+        self.chapters = chapters
+        self.transcript_lines = transcript_lines
+        self.fixtures_dir = fixtures_dir
+        self._fixtures = {}
+        self.drop_after = drop_after
+        self.drops = drops
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.rate_limit = rate_limit
+        self.throttled = 0
+        self.failure_rate = failure_rate
+        self.failed = 0
+        self._random = random.Random(seed)
+        self._tokens = rate_limit or 0.
+        self._tokens_updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def fixture(self, youtube_id: str) -> dict:
+        """The data served for a video, its thumbnail urls pointing at this server."""
+        with self._lock:
+            if youtube_id not in self._fixtures:
+                fixture = fixtures.load(self.fixtures_dir, youtube_id) or fixtures.synthetic(
+                    youtube_id, self.chapters, self.video_length, self.transcript_lines
+                )
+                fixture['initial_data'] = fixtures.rewrite_thumbnails(fixture['initial_data'], self.url, youtube_id)
+                self._fixtures[youtube_id] = fixture
+            return self._fixtures[youtube_id]
+
+    def streams(self, youtube_id: str) -> list:
+        url = f"{self.url}/video/{youtube_id}.mp4"
+        return [
+            backend.stream_row(probe.StreamFormat(18, 'video/mp4', '360p', 30, self.video_size, True), url),
+            backend.stream_row(probe.StreamFormat(22, 'video/mp4', '720p', 30, self.video_size, True), url),
+        ]
+
+    def api(self, youtube_id: str, resource: str):
+        if resource == 'streams':
+            return self.streams(youtube_id)
+        fixture = self.fixture(youtube_id)
+        return fixture.get(resource)
+
+    def body(self, path: str) -> bytes:
+        """The content served for `path`, or `None` if the route does not exist."""
+        if path.startswith('/watch/'):
+            return f"<html><title>{path[len('/watch/'):]}</title></html>".encode()
+        if path.startswith('/thumb/'):
+            return self.thumbnail
+        if path.startswith('/video/'):
+            return self.video
+        if path.startswith('/api/'):
+            youtube_id, _, resource = path[len('/api/'):].partition('/')
+            content = self.api(youtube_id, resource)
+            return json.dumps(content).encode() if content is not None else None
+        return None
+
+    def _take_failure(self) -> bool:
+        """Whether a request should fail, with probability `failure_rate`."""
+        if not self.failure_rate:
+            return False
+        with self._lock:
+            if self._random.random() < self.failure_rate:
+                self.failed += 1
+                return True
+            return False
+
+    def _take_token(self) -> bool:
+        """Whether a request is within `rate_limit`, using a token bucket holding one second of requests."""
+        if self.rate_limit is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._tokens_updated) * self.rate_limit)
+            self._tokens_updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def _take_drop(self) -> bool:
+        with self._lock:
+            if self.drops > 0 and self.drop_after is not None:
+                self.drops -= 1
+                return True
+            return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; without this, kept-alive connections stall on delayed ACKs.
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                with server._lock:
+                    server.connections += 1
+                time.sleep(server.connect_latency)
+                super().setup()
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body: bool):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                if not server._take_token():
+                    self.send_response(429)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if server._take_failure():
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.body(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                start, end = 0, len(body) - 1
+                ranged = self.path.startswith('/video/') and self.headers.get('Range', '').startswith('bytes=')
+                if ranged:
+                    first, _, last = self.headers['Range'][len('bytes='):].partition('-')
+                    start = int(first)
+                    end = min(int(last), end) if last else end
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{len(body)}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+                if not send_body:
+                    return
+                payload = body[start:end + 1]
+                if self.path.startswith('/video/') and server._take_drop():
+                    payload = payload[:server.drop_after]
+                    self.close_connection = True
+                self.wfile.write(payload)
+                with server._lock:
+                    server.bytes_sent += len(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='Fake YouTube server', description='Serves fixtures to `build_msmo.py --backend`'
+    )
+    parser.add_argument('--port', default=8000, type=int, help='Port to listen on')
+    parser.add_argument('--latency', default=0.02, type=float, help='Simulated round-trip latency in seconds')
+    parser.add_argument('--failure-rate', default=0., type=float, help='Fraction of requests failing with 503')
+    parser.add_argument('--rate-limit', default=None, type=float, help='Requests per second before answering 429')
+    parser.add_argument('--fixtures-dir', default=None, help='Directory of recorded fixtures to serve')
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args(sys.argv[1:])
+    with FakeServer(
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        rate_limit=args.rate_limit,
+        fixtures_dir=args.fixtures_dir,
+        port=args.port,
+    ) as server:
+        print(f"Serving on {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
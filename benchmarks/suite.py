@@ -0,0 +1,323 @@
+"""Regression suite over the CPU and I/O paths of a build, runnable offline.
+
+Each case times one path as the build and the tests use it, on data derived from fixtures (recorded with
+`benchmarks.fixtures`, or synthesized) and a local server:
+    read_entries         reading the key files into entries
+    process_transcript   post-processing of raw transcripts, as `get_transcript` does
+    chapters             chapter extraction from `initial_data`
+    serialize_annotation writing annotations as JSON
+    validate             the walk of the dataset tree `test_dataset.py` runs
+    download_blob        thumbnails downloaded through `utils.download_blob`
+    blob_store           thumbnails stored through `BlobStore.fetch`, half of them already downloaded
+
+Results (best and median of `--repeat` runs) are written as JSON with `--output`. `--compare` reads the results of a
+previous run and flags the cases that got slower by more than `--threshold`, exiting with status 1 if any did.
+`--profile` writes a profile of one more run of each case to `--profile-dir`: `<case>.prof` with cProfile (read with
+`pstats` or snakeviz) or `<case>.html` with pyinstrument, which must be installed separately.
+
+    python -m benchmarks.suite --output base.json
+    python -m benchmarks.suite --compare base.json --threshold 0.1
+    python -m benchmarks.suite chapters process_transcript --profile cprofile
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks import fixtures
+from benchmarks.bench_entries import write_keys
+from benchmarks.server import FakeServer
+from lib import backend
+from lib import chapters
+from lib import constants
+from lib import data
+from lib import fetch
+from lib import probe
+from lib import utils
+from lib import validate
+from lib.blobs import BlobStore
+from lib.data import MSMOEntry
+
+CPROFILE = 'cprofile'
+PYINSTRUMENT = 'pyinstrument'
+
+
+class Context:
+    """What the cases share: the options, a scratch directory, the fixtures and the local server."""
+
+    def __init__(self, args: argparse.Namespace, tmp_dir: str, server: FakeServer):
+        self.args = args
+        self.tmp_dir = tmp_dir
+        self.server = server
+        self.fixtures = load_fixtures(args.fixtures_dir, args.videos)
+
+    def scratch(self, name: str) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+
+def load_fixtures(fixtures_dir: str, count: int) -> List[dict]:
+    recorded = []
+    if fixtures_dir is not None:
+        for filename in sorted(os.listdir(fixtures_dir)):
+            if filename.endswith('.json'):
+                recorded.append(fixtures.load(fixtures_dir, filename[:-len('.json')]))
+    if not recorded:
+        recorded = [fixtures.synthetic(f"bench{i:06d}", chapters=12, lines=400) for i in range(min(count, 100))]
+    return [recorded[i % len(recorded)] for i in range(count)]
+
+
+class FixtureSource(backend.Source):
+    """A video served from a fixture in memory, so that annotations are built without a server."""
+
+    def __init__(self, youtube_id: str, fixture: dict):
+        self.youtube_id = youtube_id
+        self.fixture = fixture
+
+    def metadata(self) -> backend.Metadata:
+        metadata = self.fixture['metadata']
+        return backend.Metadata(
+            utils.short_yt_url(self.youtube_id), metadata['title'], metadata['author'], metadata['length']
+        )
+
+    def initial_data(self, refresh: bool = False) -> dict:
+        return self.fixture['initial_data']
+
+    def transcript(self) -> List[dict]:
+        return self.fixture['transcript']
+
+    def stream_formats(self) -> List[probe.StreamFormat]:
+        return []
+
+    def stream(self, itag: int) -> Tuple[str, int]:
+        raise KeyError(itag)
+
+
+class FixtureBackend(backend.Backend):
+
+    def __init__(self, fixture: dict):
+        super().__init__()
+        self.fixture = fixture
+
+    def open(self, youtube_id: str) -> backend.Source:
+        return FixtureSource(youtube_id, self.fixture)
+
+
+def annotation(entry: MSMOEntry, fixture: dict) -> dict:
+    """The annotation `fetch.Video` writes for a fixture, built by the same code."""
+    video = fetch.Video(entry, backend=FixtureBackend(fixture))
+    summary, _ = video.build_summary()
+    return video.build_annotation(summary, video.get_transcript())
+
+
+# Each case sets up its data and returns the function to time, which returns the number of items it processed.
+def case_read_entries(ctx: Context) -> Callable[[], int]:
+    key_dir = ctx.args.video_ids
+    if key_dir is None:
+        key_dir = ctx.scratch('keys')
+        write_keys(key_dir)
+    return lambda: sum(1 for _ in data.read_entries(key_dir, ctx.tmp_dir))
+
+
+def case_process_transcript(ctx: Context) -> Callable[[], int]:
+    transcripts = [fixture['transcript'] for fixture in ctx.fixtures]
+    return lambda: sum(len(fetch.process_transcript(transcript)) for transcript in transcripts)
+
+
+def case_chapters(ctx: Context) -> Callable[[], int]:
+    pages = [fixture['initial_data'] for fixture in ctx.fixtures]
+    return lambda: sum(len(chapters.parse(page)) for page in pages)
+
+
+def case_serialize_annotation(ctx: Context) -> Callable[[], int]:
+    annotations = [
+        annotation(MSMOEntry('benchmark', 'suite', i, f"bench{i:06d}", ctx.tmp_dir), fixture)
+        for i, fixture in enumerate(ctx.fixtures)
+    ]
+    return lambda: len([fetch.serialize_annotation(a) for a in annotations])
+
+
+def case_validate(ctx: Context) -> Callable[[], int]:
+    """A dataset of `--videos` entries, each with its annotation, video and keyframes, spread over the categories."""
+    dataset_dir = ctx.scratch('dataset')
+    key_dir = ctx.scratch('tree_keys')
+    subcategories = max(1, ctx.args.videos // (constants.NUM_CATEGORIES * 10))
+    write_keys(key_dir, constants.NUM_CATEGORIES, subcategories, 10)
+    entries = list(data.read_entries(key_dir, dataset_dir))
+    data.make_tree(entries)
+    for entry in entries:
+        utils.make_dirs(entry.keyframe_dir)
+        for path in (entry.annotation_path(), entry.video_path()) + tuple(entry.keyframe_path(i) for i in range(8)):
+            with open(path, 'wb') as f:
+                f.write(b'\x00')
+
+    def run():
+        validate.validate(dataset_dir, processes=1)
+        return len(entries)
+
+    return run
+
+
+def case_download_blob(ctx: Context) -> Callable[[], int]:
+    target_dir = ctx.scratch('downloads')
+    urls = [f"{ctx.server.url}/thumb/bench/{i}.jpg" for i in range(ctx.args.thumbnails)]
+
+    def run():
+        for i, url in enumerate(urls):
+            utils.download_blob(url, os.path.join(target_dir, f"{i}.jpg"))
+        return len(urls)
+
+    return run
+
+
+def case_blob_store(ctx: Context) -> Callable[[], int]:
+    target_dir = ctx.scratch('linked')
+    # Every url twice, as thumbnails shared between chapters or videos are
+    urls = [f"{ctx.server.url}/thumb/bench/{i // 2}.jpg" for i in range(ctx.args.thumbnails)]
+
+    def run():
+        store = BlobStore(tempfile.mkdtemp(dir=ctx.tmp_dir))
+        for i, url in enumerate(urls):
+            store.fetch(url, os.path.join(target_dir, f"{i}.jpg"), utils.download_blob)
+        return len(urls)
+
+    return run
+
+
+CASES: Dict[str, Callable[[Context], Callable[[], int]]] = {
+    'read_entries': case_read_entries,
+    'process_transcript': case_process_transcript,
+    'chapters': case_chapters,
+    'serialize_annotation': case_serialize_annotation,
+    'validate': case_validate,
+    'download_blob': case_download_blob,
+    'blob_store': case_blob_store,
+}
+
+
+def measure(run: Callable[[], int], repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = run()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {'best': best, 'median': statistics.median(timings), 'items': items, 'per_item': best / max(items, 1)}
+
+
+def profile(name: str, run: Callable[[], int], profiler: str, profile_dir: str) -> str:
+    """Run a case once more under a profiler, returning the path of the profile."""
+    os.makedirs(profile_dir, exist_ok=True)
+    if profiler == CPROFILE:
+        path = os.path.join(profile_dir, f"{name}.prof")
+        cProfile.runctx('run()', {}, {'run': run}, path)
+    else:
+        from pyinstrument import Profiler
+        path = os.path.join(profile_dir, f"{name}.html")
+        with Profiler() as profiler:
+            run()
+        utils.write_atomic(path, profiler.output_html())
+    return path
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Print how each case changed since the baseline, returning those slower by more than `threshold`."""
+    regressions = []
+    print(f"\n{'case':>22} {'baseline ms':>12} {'ms':>9} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        # Per item, so runs with different sizes remain comparable
+        before, after = baseline[name]['per_item'], result['per_item']
+        change = after / before - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = ' REGRESSION'
+        print(
+            f"{name:>22} {1000 * baseline[name]['best']:>12.2f} {1000 * result['best']:>9.2f} {change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='Benchmark suite', description=__doc__.splitlines()[0])
+    parser.add_argument('cases', nargs='*', help=f"Cases to run, among {', '.join(CASES)} (default: all)")
+    parser.add_argument('--videos', default=500, type=int, help='Number of videos of the fixture-based cases')
+    parser.add_argument('--thumbnails', default=200, type=int, help='Number of thumbnails of the download cases')
+    parser.add_argument('--video-ids', default=None, help='Directory of the key files (default: synthetic keys)')
+    parser.add_argument('--fixtures-dir', default=None, help='Directory of recorded fixtures')
+    parser.add_argument('--repeat', default=5, type=int, help='Number of runs of each case')
+    parser.add_argument('-o', '--output', default=None, help='Write the results as JSON to this file')
+    parser.add_argument('--compare', default=None, help='Results of a previous run to compare with')
+    parser.add_argument('--threshold', default=0.1, type=float, help='Slowdown flagged as a regression')
+    parser.add_argument('--profile', default=None, choices=[CPROFILE, PYINSTRUMENT], help='Profile each case')
+    parser.add_argument('--profile-dir', default='profiles', help='Directory of the profiles')
+    return parser
+
+
+def main(args: argparse.Namespace):
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        sys.exit(f"Unknown cases {', '.join(unknown)}; choose among {', '.join(CASES)}")
+    if args.profile == PYINSTRUMENT:
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            sys.exit('pyinstrument is not installed: pip install pyinstrument, or use --profile cprofile')
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+    names = args.cases or list(CASES)
+    results = {}
+    # No latency: the download cases measure the client side of the transfers.
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeServer(latency=0.) as server:
+        ctx = Context(args, tmp_dir, server)
+        print(f"{'case':>22} {'best ms':>9} {'median ms':>10} {'items':>7} {'us/item':>9}")
+        for name in names:
+            run = CASES[name](ctx)
+            results[name] = measure(run, args.repeat)
+            result = results[name]
+            print(
+                f"{name:>22} {1000 * result['best']:>9.2f} {1000 * result['median']:>10.2f} {result['items']:>7} "
+                f"{1e6 * result['per_item']:>9.2f}"
+            )
+            if args.profile is not None:
+                print(f"{'':>22} profile written to {profile(name, run, args.profile, args.profile_dir)}")
+    if args.output is not None:
+        report = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.time(),
+            'options': {key: getattr(args, key) for key in ('videos', 'thumbnails', 'fixtures_dir', 'repeat')},
+            'results': results,
+        }
+        utils.write_atomic(args.output, json.dumps(report, indent=2))
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            sys.exit(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args(sys.argv[1:]))
@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+import time
+
+from lib import data
+from lib.index import INDEX_FILENAME, DatasetIndex
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Indexer', description='Builds a columnar index of the dataset from its annotation files'
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    parser.add_argument(
+        '-o', '--output', help=f"Path of the index file (default: <dataset-dir>/{INDEX_FILENAME})", default=None
+    )
+    parser.add_argument('-j', '--processes', help='Number of worker processes', default=os.cpu_count(), type=int)
+    parser.add_argument(
+        '--shard',
+        help='Only index the i-th of N disjoint parts of the dataset, given as i/N; merge them with merge_shards.py',
+        default=None
+    )
+    parser.add_argument(
+        '--shard-by', help='How the dataset is split into shards', choices=data.SHARD_BY, default=data.HASH
+    )
+    return parser
+
+
+def index_path(dataset_dir: str, shard: data.Shard = None) -> str:
+    if shard is None:
+        return os.path.join(dataset_dir, INDEX_FILENAME)
+    return os.path.join(dataset_dir, f"{INDEX_FILENAME[:-len('.npz')]}.{shard.name}.npz")
+
+
+def main(args: argparse.Namespace):
+    start = time.perf_counter()
+    shard = data.Shard.parse(args.shard, args.shard_by) if args.shard else None
+    index = DatasetIndex.build(args.dataset_dir, processes=args.processes, shard=shard)
+    output = args.output or index_path(args.dataset_dir, shard)
+    index.save(output)
+    print(f"Indexed {len(index)} videos and {len(index.segments['video'])} segments in "
+          f"{time.perf_counter() - start:.1f}s to `{output}`")
+    for category, count in index.counts_by('category').items():
+        print(f"\t{category}: {count}")
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
@@ -4,8 +4,21 @@ import sys
 
 from tqdm import tqdm
 
+from lib import cache
+from lib import constants
 from lib import data
+from lib import downloader
+from lib import metrics
+from lib import pack
+from lib import pipeline
+from lib import probe
+from lib import scheduler
+from lib import session
+from lib import throttle
+from lib.backend import Backend, HTTPBackend, YouTubeBackend
+from lib.blobs import BlobStore, describe_usage
 from lib.fetch import Video
+from lib.ledger import Ledger
 
 
 def build_parser() -> argparse.Namespace:
@@ -22,6 +35,106 @@ def build_parser() -> argparse.Namespace:
         '-d', '--dataset-dir', help='Directory where the dataset will be created', required=True, type=valid_dir
     )
     parser.add_argument('-v', '--verbose', help='Displays additional logging while building the dataset', default=False)
+    parser.add_argument(
+        '-w',
+        '--workers',
+        help='Number of entries to download concurrently. With more than one, entries go through a staged pipeline '
+        '(see lib/pipeline.py) with this many keyframe and transcript workers',
+        default=1,
+        type=positive_int
+    )
+    parser.add_argument(
+        '--metadata-workers',
+        help='Maximum concurrent watch page, stream manifest and transcript requests, and number of metadata workers '
+        'of the pipeline (default: --workers)',
+        default=None,
+        type=positive_int
+    )
+    parser.add_argument(
+        '--thumbnail-workers', help='Maximum concurrent keyframe downloads', default=None, type=positive_int
+    )
+    parser.add_argument(
+        '--video-workers',
+        help='Maximum concurrent video stream downloads, and number of video workers of the pipeline '
+        '(default: --workers)',
+        default=None,
+        type=positive_int
+    )
+    parser.add_argument(
+        '--host-rate',
+        help='Starting rate in requests per second per host, adapted to throttling responses (0 = unlimited)',
+        default=0.,
+        type=float
+    )
+    parser.add_argument(
+        '--max-host-rate', help='Maximum adapted rate per host (default: 4 x --host-rate)', default=None, type=float
+    )
+    parser.add_argument('--min-host-rate', help='Minimum adapted rate per host', default=0.1, type=float)
+    parser.add_argument(
+        '--video-segments',
+        help='Number of byte ranges of large video streams downloaded in parallel',
+        default=1,
+        type=positive_int
+    )
+    parser.add_argument(
+        '--max-res', help='Maximum height in pixels of the downloaded video stream (e.g. 480)', default=None, type=int
+    )
+    parser.add_argument(
+        '--prefer',
+        help='Which stream to download among those within --max-res',
+        choices=probe.PREFERENCES,
+        default=probe.HIGHEST
+    )
+    parser.add_argument(
+        '--pool-size', help='Number of kept-alive HTTP connections per host', default=32, type=positive_int
+    )
+    parser.add_argument('--timeout', help='HTTP read timeout in seconds', default=60., type=float)
+    parser.add_argument(
+        '--http-retries', help='Number of retries on HTTP 429 and 5xx responses', default=3, type=int
+    )
+    parser.add_argument('--cache-dir', help='Directory of the watch page cache', default=constants.CACHE_DIR)
+    parser.add_argument(
+        '--cache-ttl', help='Seconds before a cached watch page is fetched again', default=7 * 24 * 60 * 60, type=float
+    )
+    parser.add_argument(
+        '--cache-max-size', help='Maximum size of the watch page cache in MB', default=10 * 1024, type=positive_int
+    )
+    parser.add_argument('--no-cache', help='Do not cache watch pages', action='store_true')
+    parser.add_argument(
+        '--offline', help='Only read metadata from the cache, never from YouTube', action='store_true'
+    )
+    parser.add_argument(
+        '--shard',
+        help='Only build the i-th of N disjoint parts of the entries, given as i/N (e.g. 0/4), to split a build across '
+        'nodes sharing the dataset directory. Each shard keeps its own ledger; merge them with merge_shards.py',
+        default=None
+    )
+    parser.add_argument(
+        '--shard-by', help='How entries are split into shards', choices=data.SHARD_BY, default=data.HASH
+    )
+    parser.add_argument(
+        '--dedup-keyframes',
+        help='Store each distinct keyframe once in <dataset-dir>/blobs, hard linked from its keyframe paths, and never '
+        'download the same thumbnail url twice',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--pack',
+        help='Also pack every completed entry into tar shards in this directory (see export_shards.py)',
+        default=None
+    )
+    parser.add_argument('--pack-size', help='Maximum size of a packed shard in MB', default=1024, type=positive_int)
+    parser.add_argument('--pack-no-video', help='Leave videos out of the packed shards', action='store_true')
+    parser.add_argument(
+        '--metrics',
+        help='File to export per-stage timings and counters to (Prometheus text if it ends with .prom, else JSONL)',
+        default=None
+    )
+    parser.add_argument(
+        '--backend',
+        help='Base url of a server exposing the YouTube data as JSON (e.g. benchmarks/server.py) instead of YouTube',
+        default=None
+    )
     return parser
 
 
@@ -31,11 +144,145 @@ def valid_dir(arg: str):
     return arg
 
 
+def positive_int(arg: str):
+    if int(arg) <= 0:
+        raise ValueError(f"{arg} is not a positive integer")
+    return int(arg)
+
+
+def pending_artifacts(entry: data.MSMOEntry, ledger: Ledger):
+    """Artifacts of the entry still to be downloaded.
+
+    Entries that are not in the ledger yet may have been downloaded by an older build, so they are looked up on disk
+    once and recorded.
+    """
+    if not ledger.is_tracked(entry) and ledger.adopt(entry):
+        return []
+    return ledger.pending(entry)
+
+
+def build_backend(
+    args: argparse.Namespace, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED, blobs: BlobStore = None
+) -> Backend:
+    if args.backend:
+        return HTTPBackend(args.backend, limiter, blobs)
+    return YouTubeBackend(limiter, blobs)
+
+
+def build_entry(
+    entry: data.MSMOEntry,
+    ledger: Ledger,
+    backend: Backend,
+    limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED,
+    writer: pack.ShardWriter = None,
+    pack_video: bool = True,
+):
+    """Download the pending artifacts of an entry, then pack it if it is complete and not packed yet."""
+    if artifacts := pending_artifacts(entry, ledger):
+        Video(entry, limiter=limiter, ledger=ledger, backend=backend).download(artifacts)
+    pack_entry(entry, ledger, writer, pack_video)
+
+
+def pack_entry(entry: data.MSMOEntry, ledger: Ledger, writer: pack.ShardWriter = None, pack_video: bool = True):
+    if writer is not None and entry.video_id not in writer and ledger.is_complete(entry):
+        writer.write_entry(entry, include_video=pack_video)
+
+
+def build_writer(args: argparse.Namespace, shard: data.Shard = None) -> pack.ShardWriter:
+    if not args.pack:
+        return None
+    # Every shard of a build packs into its own directory, so that nodes never append to the same files.
+    shards_dir = os.path.join(args.pack, shard.name) if shard is not None else args.pack
+    return pack.ShardWriter(shards_dir, max_bytes=args.pack_size * 1024 * 1024)
+
+
+def report_blobs(blobs: BlobStore):
+    stats = blobs.stats
+    print(
+        f"keyframes: {stats['downloads']} downloaded, {stats['url_hits']} urls already downloaded "
+        f"({stats['bytes_not_downloaded'] / 1024 / 1024:.1f} MB not fetched), {stats['duplicate_blobs']} duplicates"
+    )
+    print(f"keyframe store: {describe_usage(blobs.usage())}")
+
+
+def report(ledger: Ledger):
+    for artifact, counts in ledger.summary().items():
+        print(f"{artifact:>10}: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+
+
 def main(args: argparse.Namespace):
-    for entry in tqdm(data.read_entries(args.video_ids, args.dataset_dir)):
-        if entry.exists():
-            continue
-        Video(entry).download()
+    session.configure(pool_size=args.pool_size, read_timeout=args.timeout, retries=args.http_retries)
+    downloader.configure(segments=args.video_segments)
+    probe.configure(max_res=args.max_res, prefer=args.prefer)
+    throttle.configure(rate=args.host_rate, max_rate=args.max_host_rate, min_rate=args.min_host_rate)
+    cache.configure(
+        root=args.cache_dir,
+        enabled=not args.no_cache,
+        ttl=args.cache_ttl,
+        max_bytes=args.cache_max_size * 1024 * 1024,
+        offline=args.offline,
+    )
+    shard = data.Shard.parse(args.shard, args.shard_by) if args.shard else None
+    ledger = Ledger.in_dataset(args.dataset_dir, shard)
+    report(ledger)
+    writer = build_writer(args, shard)
+    blobs = BlobStore.in_dataset(args.dataset_dir) if args.dedup_keyframes else None
+    # Entries are streamed rather than held in memory; a first pass counts them and creates the directory tree.
+    total = data.make_tree(data.read_entries(args.video_ids, args.dataset_dir, shard=shard))
+    if args.workers > 1:
+        main_concurrent(args, ledger, total, shard, writer, blobs)
+    else:
+        backend = build_backend(args, blobs=blobs)
+        for entry in tqdm(data.read_entries(args.video_ids, args.dataset_dir, shard=shard), total=total):
+            build_entry(entry, ledger, backend, writer=writer, pack_video=not args.pack_no_video)
+    if writer is not None:
+        writer.close()
+        print(f"{len(writer.keys)} entries packed in `{writer.shards_dir}`")
+    report(ledger)
+    if blobs is not None:
+        report_blobs(blobs)
+    if cache.get_cache() is not None:
+        for namespace, counts in cache.get_cache().stats().items():
+            print(f"cache {namespace}: {counts['hits']} hits, {counts['misses']} misses")
+    for host, host_metrics in throttle.metrics().items():
+        print(f"{host}: " + ", ".join(f"{name}={value}" for name, value in host_metrics.items()))
+    print(metrics.summary())
+    if args.metrics:
+        metrics.export(args.metrics)
+
+
+def main_concurrent(
+    args: argparse.Namespace,
+    ledger: Ledger,
+    total: int,
+    shard: data.Shard = None,
+    writer: pack.ShardWriter = None,
+    blobs: BlobStore = None,
+):
+    limiter = scheduler.TrafficLimiter(
+        scheduler.Limits(
+            metadata=args.metadata_workers,
+            thumbnail=args.thumbnail_workers,
+            video=args.video_workers,
+        )
+    )
+    stages = pipeline.Pipeline(
+        build_backend(args, limiter, blobs),
+        limiter,
+        ledger,
+        workers=pipeline.Workers(
+            metadata=args.metadata_workers or args.workers,
+            keyframes=args.workers,
+            transcript=args.workers,
+            video=args.video_workers or args.workers,
+        ),
+        pending=lambda entry: pending_artifacts(entry, ledger),
+        on_done=lambda entry: pack_entry(entry, ledger, writer, pack_video=not args.pack_no_video),
+    )
+    with tqdm(total=total) as progress:
+        failures = stages.run(data.read_entries(args.video_ids, args.dataset_dir, shard=shard), progress=progress)
+    if failures:
+        print(f"{len(failures)} entries failed:", *(f"\t{e.video_id} ({e.youtube_id})" for e, _ in failures), sep='\n')
 
 
 if __name__ == '__main__':
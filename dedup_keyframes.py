@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+from tqdm import tqdm
+
+from lib.blobs import BlobStore, describe_usage
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Keyframe Deduplicator',
+        description='Moves the keyframes of an existing dataset into its content-addressed store, hard linking '
+        'identical keyframes to a single copy'
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    return parser
+
+
+def keyframe_files(dataset_dir: str):
+    """Paths of every keyframe, walking `keyframe/<category>/<subcategory>/<video_id>/`."""
+    stack = [os.path.join(dataset_dir, 'keyframe')]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.name.endswith('.jpg'):
+                        yield e.path
+        except FileNotFoundError:
+            continue
+
+
+def main(args: argparse.Namespace):
+    blobs = BlobStore.in_dataset(args.dataset_dir)
+    duplicates = 0
+    for path in tqdm(keyframe_files(args.dataset_dir)):
+        duplicates += blobs.add(path)
+    print(f"{duplicates} duplicate keyframes linked; {describe_usage(blobs.usage())}")
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
@@ -0,0 +1,49 @@
+import argparse
+import sys
+
+from lib import data
+from lib import ledger
+from lib import manifest
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Key Differ',
+        description='Plans (and with --apply, makes) the renames and deletions of built entries after the key files '
+        'were edited, so that the next build only downloads the videos that were added'
+    )
+    parser.add_argument(
+        '--video-ids', help='Path to a directory with .csv files of videos in the dataset', required=True
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    parser.add_argument('--apply', help='Rename and delete files, instead of only reporting them', action='store_true')
+    parser.add_argument('--manifest', help='Write the manifest of the built entries as JSON to this file', default=None)
+    parser.add_argument('-v', '--verbose', help='List every rename, download and deletion', action='store_true')
+    return parser
+
+
+def main(args: argparse.Namespace):
+    if ledger.shard_paths(args.dataset_dir):
+        sys.exit(f"`{args.dataset_dir}` has shard ledgers: merge them first with merge_shards.py")
+    journal = ledger.Ledger.in_dataset(args.dataset_dir)
+    built = manifest.Manifest.from_ledger(journal, args.dataset_dir)
+    if args.manifest:
+        built.save(args.manifest)
+    result = manifest.plan(built, data.read_entries(args.video_ids, args.dataset_dir))
+    if args.verbose:
+        for source, entry in result.renames:
+            print(f"rename   {source.video_id} -> {entry.video_id} ({entry.youtube_id})")
+        for entry in result.downloads:
+            print(f"download {entry.video_id} ({entry.youtube_id})")
+        for source in result.deletions:
+            print(f"delete   {source.video_id} ({source.youtube_id})")
+    print(", ".join(f"{count} {name}" for name, count in result.summary().items()))
+    if args.apply:
+        manifest.apply(result, journal, args.dataset_dir)
+        print(f"Applied; rebuild the index and packed shards of `{args.dataset_dir}` if there were renames")
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
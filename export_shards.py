@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+
+from tqdm import tqdm
+
+from lib import data
+from lib import pack
+from lib.ledger import ANNOTATION, DONE, KEYFRAMES, VIDEO, Ledger
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Shard Exporter',
+        description='Packs the annotation, keyframes and video of every entry into sequential tar shards'
+    )
+    parser.add_argument(
+        '--video-ids', help='Path to a directory with .csv files of videos in the dataset', required=True
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    parser.add_argument('-o', '--output', help='Directory to write the shards and their index to', required=True)
+    parser.add_argument('--shard-size', help='Maximum size of a shard in MB', default=1024, type=int)
+    parser.add_argument('--prefix', help='File name prefix of the shards', default='msmo')
+    parser.add_argument('--no-video', help='Only pack annotations and keyframes', action='store_true')
+    return parser
+
+
+def is_ready(entry: data.MSMOEntry, ledger: Ledger, include_video: bool) -> bool:
+    """Whether every packed artifact of the entry is downloaded, per the ledger or else the files on disk."""
+    artifacts = (ANNOTATION, KEYFRAMES, VIDEO) if include_video else (ANNOTATION, KEYFRAMES)
+    if ledger.is_tracked(entry):
+        return all(ledger.state(entry, artifact) == DONE for artifact in artifacts)
+    paths = [entry.annotation_path()] + ([entry.video_path()] if include_video else [])
+    return all(os.path.exists(path) for path in paths) and os.path.exists(entry.keyframe_path(0))
+
+
+def main(args: argparse.Namespace):
+    ledger = Ledger.in_dataset(args.dataset_dir)
+    include_video = not args.no_video
+    packed, skipped = 0, 0
+    with pack.ShardWriter(args.output, prefix=args.prefix, max_bytes=args.shard_size * 1024 * 1024) as writer:
+        for entry in tqdm(data.read_entries(args.video_ids, args.dataset_dir)):
+            if entry.video_id in writer:
+                continue
+            if not is_ready(entry, ledger, include_video):
+                skipped += 1
+                continue
+            writer.write_entry(entry, include_video)
+            packed += 1
+    print(f"Packed {packed} entries into `{args.output}` ({len(writer.keys)} in total), skipped {skipped} incomplete")
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
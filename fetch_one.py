@@ -3,6 +3,7 @@ from xml.etree import ElementTree
 
 import pytube
 
+from lib import cache
 from lib import utils
 from lib import data
 from lib.fetch import Video
@@ -10,7 +11,7 @@ from lib.fetch import Video
 
 def get_video(video_id: str) -> pytube.YouTube:
     """Fetch metadata for a YouTube video by its id."""
-    return pytube.YouTube(utils.short_yt_url(video_id))
+    return cache.youtube(video_id)
 
 
 def parse_transcripts_from_xml(xml_captions: str) -> List[Dict[str, str]]:
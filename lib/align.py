@@ -0,0 +1,59 @@
+"""Alignment of the transcript lines of a video to its summary segments (chapters).
+
+A transcript line belongs to the segment during which it starts: the last segment starting at or before it. Segment
+starts are sorted, so every line is placed with one `np.searchsorted` pass instead of a scan over the segments.
+Transcript lines are sorted as well, which makes the lines of each segment a contiguous range `[first, first + count)`.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from lib import timestamps
+
+
+def seconds(rows: List[dict], key: str) -> np.ndarray:
+    """The `HH:MM:SS` timestamps under `key` of annotation rows, in seconds."""
+    return timestamps.to_seconds_array([row[key] for row in rows])
+
+
+def assign(segment_starts: np.ndarray, transcript_starts: np.ndarray) -> np.ndarray:
+    """Index of the segment of every transcript line, or -1 for lines starting before the first segment."""
+    return np.searchsorted(segment_starts, transcript_starts, side='right').astype(np.int32) - 1
+
+
+def ranges(segment_starts: np.ndarray, transcript_starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """First transcript line and number of lines of every segment, for transcript starts in ascending order."""
+    bounds = np.searchsorted(transcript_starts, segment_starts, side='left').astype(np.int32)
+    ends = np.append(bounds[1:], np.int32(len(transcript_starts)))
+    return bounds, ends - bounds
+
+
+def align_annotation(annotation: dict) -> Dict[str, np.ndarray]:
+    """Numeric bounds of the segments and transcript lines of an annotation, and the mapping between them.
+
+    Transcripts are expected in ascending order of start, as `fetch.process_transcript` writes them; any other order
+    raises a `ValueError`.
+    """
+    summary, transcript = annotation['summary'], annotation['transcript']
+    segment_starts = seconds(summary, 'start_time')
+    transcript_starts = seconds(transcript, 'start_time')
+    if np.any(np.diff(segment_starts) < 0) or np.any(np.diff(transcript_starts) < 0):
+        raise ValueError('Segments and transcript lines must be sorted by start time')
+    first, count = ranges(segment_starts, transcript_starts)
+    return {
+        'segment_start': segment_starts,
+        'segment_end': seconds(summary, 'end_time'),
+        'transcript_start': transcript_starts,
+        'transcript_end': seconds(transcript, 'end_time'),
+        'transcript_segment': assign(segment_starts, transcript_starts),
+        'first_transcript': first,
+        'num_transcripts': count,
+    }
+
+
+def segment_text(annotation: dict, alignment: Dict[str, np.ndarray], segment: int) -> str:
+    """The transcript of one segment, as the text of its lines joined by spaces."""
+    first = int(alignment['first_transcript'][segment])
+    lines = annotation['transcript'][first:first + int(alignment['num_transcripts'][segment])]
+    return ' '.join(line['summary'] for line in lines)
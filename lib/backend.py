@@ -0,0 +1,182 @@
+"""Backends that `fetch.Video` gets its data from.
+
+A backend opens a `Source` per video, which provides the watch metadata, the `initial_data` holding the chapters,
+the raw transcript, the available stream formats and their urls. The backend itself fetches blobs (keyframes) and
+streams (videos) from urls.
+
+    YouTubeBackend  talks to YouTube through pytube and `YouTubeTranscriptApi`, using the local cache.
+    HTTPBackend     talks to a server exposing the same data as JSON, such as the fake server in `benchmarks`,
+                    so that the pipeline can be exercised and benchmarked without the live service.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import List, Tuple
+
+from lib import cache
+from lib import downloader
+from lib import probe
+from lib import scheduler
+from lib import session as http_session
+from lib import utils
+from lib.blobs import BlobStore
+
+
+@dataclass(frozen=True)
+class Metadata:
+    watch_url: str
+    title: str
+    author: str
+    # Length of the video in seconds
+    length: int
+
+
+class Source(ABC):
+    """The data of one video."""
+
+    @abstractmethod
+    def metadata(self) -> Metadata:
+        pass
+
+    @abstractmethod
+    def initial_data(self, refresh: bool = False) -> dict:
+        """The `initial_data` of the watch page, fetched again if `refresh` is set."""
+
+    @abstractmethod
+    def transcript(self) -> List[dict]:
+        pass
+
+    @abstractmethod
+    def stream_formats(self) -> List[probe.StreamFormat]:
+        pass
+
+    @abstractmethod
+    def stream(self, itag: int) -> Tuple[str, int]:
+        """The url and size in bytes of the stream with the given itag, from the formats listed last."""
+
+
+class Backend(ABC):
+    """Fetches the data of videos. With `blobs`, keyframes are deduplicated in that content-addressed store."""
+
+    def __init__(self, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED, blobs: BlobStore = None):
+        self.limiter = limiter
+        self.blobs = blobs
+
+    @abstractmethod
+    def open(self, youtube_id: str) -> Source:
+        pass
+
+    def fetch_blob(self, url: str, path: str) -> bool:
+        """Download a blob to `path`, returning whether it succeeded."""
+        if self.blobs is not None:
+            return self.blobs.fetch(url, path, self._download_blob)
+        return self._download_blob(url, path)
+
+    def _download_blob(self, url: str, path: str) -> bool:
+        with self.limiter.slot(scheduler.THUMBNAIL, url):
+            return utils.download_blob(url, path)
+
+    def fetch_stream(self, url: str, path: str, filesize: int = None):
+        """Download a video stream to `path`, raising `downloader.DownloadError` if it fails."""
+        with self.limiter.slot(scheduler.VIDEO, url):
+            downloader.download_stream(url, path, filesize=filesize)
+
+
+class YouTubeSource(Source):
+
+    def __init__(self, youtube_id: str, limiter: scheduler.TrafficLimiter):
+        self.youtube_id = youtube_id
+        self.limiter = limiter
+        self.yt = cache.youtube(youtube_id, limiter=limiter)
+        self._streams = None
+
+    def metadata(self) -> Metadata:
+        return Metadata(self.yt.watch_url, self.yt.title, self.yt.author, self.yt.length)
+
+    def initial_data(self, refresh: bool = False) -> dict:
+        if refresh:
+            self.yt._initial_data = cache.refresh_initial_data(self.youtube_id, limiter=self.limiter)
+        return self.yt.initial_data
+
+    def transcript(self) -> List[dict]:
+        return cache.transcript(self.youtube_id, limiter=self.limiter)
+
+    def stream_formats(self) -> List[probe.StreamFormat]:
+        with self.limiter.slot(scheduler.METADATA, self.yt.watch_url):
+            if cache.STREAMING_DATA not in self.yt.vid_info:
+                # Served from the cache without its stream urls: fetch the player response again.
+                self.yt._vid_info = None
+            self._streams = self.yt.streams
+        return probe.record(self.youtube_id, self._streams)
+
+    def stream(self, itag: int) -> Tuple[str, int]:
+        video = self._streams.get_by_itag(itag)
+        with self.limiter.slot(scheduler.VIDEO, video.url):
+            return video.url, video.filesize
+
+
+class YouTubeBackend(Backend):
+
+    def open(self, youtube_id: str) -> Source:
+        return YouTubeSource(youtube_id, self.limiter)
+
+
+class HTTPSource(Source):
+    """Reads a video's data from `<base_url>/api/<youtube_id>/{metadata,initial_data,transcript,streams}`."""
+
+    def __init__(self, base_url: str, youtube_id: str, limiter: scheduler.TrafficLimiter):
+        self.base_url = base_url
+        self.youtube_id = youtube_id
+        self.limiter = limiter
+        self._streams = {}
+        self._metadata = self._get('metadata')
+
+    def _get(self, resource: str):
+        url = f"{self.base_url}/api/{self.youtube_id}/{resource}"
+        with self.limiter.slot(scheduler.METADATA, url):
+            response = http_session.get_session().get(url, timeout=http_session.get_config().timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def metadata(self) -> Metadata:
+        return Metadata(
+            f"{self.base_url}/watch/{self.youtube_id}",
+            self._metadata['title'],
+            self._metadata['author'],
+            self._metadata['length'],
+        )
+
+    def initial_data(self, refresh: bool = False) -> dict:
+        return self._get('initial_data')
+
+    def transcript(self) -> List[dict]:
+        return self._get('transcript')
+
+    def stream_formats(self) -> List[probe.StreamFormat]:
+        formats = []
+        for row in self._get('streams'):
+            url = row.pop('url')
+            stream_format = probe.StreamFormat(**row)
+            self._streams[stream_format.itag] = (url, stream_format.filesize)
+            formats.append(stream_format)
+        return formats
+
+    def stream(self, itag: int) -> Tuple[str, int]:
+        return self._streams[itag]
+
+
+class HTTPBackend(Backend):
+
+    def __init__(
+        self, base_url: str, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED, blobs: BlobStore = None
+    ):
+        super().__init__(limiter, blobs)
+        self.base_url = base_url.rstrip('/')
+
+    def open(self, youtube_id: str) -> Source:
+        return HTTPSource(self.base_url, youtube_id, self.limiter)
+
+
+def stream_row(stream_format: probe.StreamFormat, url: str) -> dict:
+    """A stream format as served by an `HTTPBackend` server."""
+    return {**asdict(stream_format), 'url': url}
@@ -0,0 +1,160 @@
+"""Content-addressed store of the keyframes of the dataset.
+
+Chapter thumbnails are often identical within a video, and the same thumbnail url can appear in several entries.
+Instead of a copy per keyframe, each distinct image is stored once as `blobs/<sha256[:2]>/<sha256>.jpg` and every
+`keyframe_<i>.jpg` is a hard link to its blob (or a copy, where the filesystem has no hard links). Urls already
+downloaded are remembered in `blobs/urls.jsonl`, so that they are linked without being fetched again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from lib import metrics
+
+BLOBS_DIRNAME = 'blobs'
+URLS_FILENAME = 'urls.jsonl'
+
+
+def digest_of(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+
+    def __init__(self, root: str, extension: str = '.jpg'):
+        self.root = root
+        self.extension = extension
+        os.makedirs(root, exist_ok=True)
+        self.stats = Counter()
+        self._urls: Dict[str, str] = {}
+        self._urls_path = os.path.join(root, URLS_FILENAME)
+        self._lock = threading.Lock()
+        # One lock per url being downloaded, so that concurrent requests for it wait instead of downloading it twice
+        self._in_flight: Dict[str, threading.Lock] = {}
+        if os.path.exists(self._urls_path):
+            with open(self._urls_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._urls[record['url']] = record['sha256']
+
+    @classmethod
+    def in_dataset(cls, dataset_dir: str) -> 'BlobStore':
+        return cls(os.path.join(dataset_dir, BLOBS_DIRNAME))
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + self.extension)
+
+    def lookup(self, url: str) -> Optional[str]:
+        """The digest of a url downloaded before, if its blob is still in the store."""
+        digest = self._urls.get(url)
+        return digest if digest is not None and os.path.exists(self.path(digest)) else None
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _remember(self, url: str, digest: str):
+        with self._lock:
+            self._urls[url] = digest
+            with open(self._urls_path, 'a') as f:
+                f.write(json.dumps({'url': url, 'sha256': digest}) + '\n')
+
+    def put(self, tmp_path: str) -> str:
+        """Move a file into the store, or drop it if its content is already there, returning its digest."""
+        digest = digest_of(tmp_path)
+        blob_path = self.path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if os.path.exists(blob_path):
+            self._count('duplicate_blobs')
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob_path)
+            # Blobs are shared by every keyframe linking to them, so they must not be modified in place.
+            os.chmod(blob_path, 0o444)
+        return digest
+
+    def link(self, digest: str, path: str):
+        """Make `path` a hard link to a blob, replacing whatever is there."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(self.path(digest), tmp_path)
+        except OSError:
+            self._count('copies')
+            shutil.copyfile(self.path(digest), tmp_path)
+        os.replace(tmp_path, path)
+
+    def fetch(self, url: str, path: str, download: Callable[[str, str], bool]) -> bool:
+        """Store the blob at `url` at `path`, calling `download(url, tmp_path)` only for urls not downloaded before."""
+        with self._lock:
+            url_lock = self._in_flight.setdefault(url, threading.Lock())
+        with url_lock:
+            digest = self.lookup(url)
+            if digest is not None:
+                size = os.path.getsize(self.path(digest))
+                self._count('url_hits')
+                self._count('bytes_not_downloaded', size)
+                metrics.increment('bytes_not_downloaded', size, stage='blob')
+            else:
+                tmp_path = os.path.join(self.root, f"{uuid.uuid4().hex}.tmp")
+                if not download(url, tmp_path):
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    return False
+                self._count('downloads')
+                digest = self.put(tmp_path)
+                self._remember(url, digest)
+        self.link(digest, path)
+        return True
+
+    def add(self, path: str) -> bool:
+        """Move an existing file into the store and link it back, returning whether its content was a duplicate."""
+        digest = digest_of(path)
+        blob_path = self.path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            try:
+                os.link(path, blob_path)
+            except OSError:
+                self._count('copies')
+                shutil.copyfile(path, blob_path)
+            os.chmod(blob_path, 0o444)
+            return False
+        if os.path.samefile(path, blob_path):
+            return False
+        self.link(digest, path)
+        return True
+
+    def usage(self) -> Dict[str, int]:
+        """Bytes stored in blobs, and bytes the keyframes linking to them would take as separate files."""
+        blobs, stored, linked = 0, 0, 0
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                st = blob.stat()
+                blobs += 1
+                stored += st.st_size
+                # One link is the blob itself
+                linked += st.st_size * max(st.st_nlink - 1, 1)
+        return {'blobs': blobs, 'stored_bytes': stored, 'keyframe_bytes': linked, 'saved_bytes': linked - stored}
+
+
+def describe_usage(usage: Dict[str, int]) -> str:
+    mb = {k: v / 1024 / 1024 for k, v in usage.items() if k.endswith('_bytes')}
+    return (
+        f"{usage['blobs']} blobs take {mb['stored_bytes']:.1f} MB for {mb['keyframe_bytes']:.1f} MB of keyframes "
+        f"({mb['saved_bytes']:.1f} MB saved)"
+    )
@@ -0,0 +1,235 @@
+"""On-disk cache of responses fetched from YouTube.
+
+Entries are gzip-compressed files addressed by the SHA-256 of their key, grouped by namespace (e.g. the raw watch
+page, the parsed `initial_data` or the raw transcript of a video). Entries older than `ttl` seconds are refetched, and once the cache
+grows beyond `max_bytes` the least recently used entries are evicted. In offline mode nothing is fetched, entries
+never expire and a missing entry raises `CacheMissError`, so metadata can be rebuilt purely from the cache.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional
+
+import pytube
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from lib import constants
+from lib import scheduler
+from lib import utils
+
+WATCH_HTML = 'watch_html'
+INITIAL_DATA = 'initial_data'
+VID_INFO = 'vid_info'
+TRANSCRIPT = 'transcript'
+# Key of the stream urls in `vid_info`. They are signed for a few hours, so they are never cached.
+STREAMING_DATA = 'streamingData'
+
+TRANSCRIPT_LANGUAGES = ('en', 'en-US', 'en-GB')
+# Host contacted by `YouTubeTranscriptApi`, used to rate-limit transcript requests.
+TRANSCRIPT_URL = 'https://www.youtube.com/api/timedtext'
+
+
+class CacheMissError(Exception):
+    """Raised in offline mode when a requested entry is not in the cache."""
+
+
+class DiskCache:
+    def __init__(self, root: str, ttl: float = None, max_bytes: int = None, offline: bool = False):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._lock = threading.Lock()
+        # path -> (size, last access time), built on the first write when the cache is size-bounded.
+        self._index: Optional[Dict[str, tuple]] = None
+
+    def path(self, namespace: str, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.root, namespace, digest[:2], digest)
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        path = self.path(namespace, key)
+        try:
+            stat = os.stat(path)
+            # Offline, an expired entry is still the best there is: it can't be refetched.
+            if self.ttl is not None and not self.offline and time.time() - stat.st_mtime > self.ttl:
+                raise FileNotFoundError(path)
+            with gzip.open(path, 'rb') as f:
+                data = f.read()
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile):
+            with self._lock:
+                self.misses[namespace] += 1
+            return None
+        # The access time tracks recency for eviction; the modification time keeps the write time for the TTL.
+        now = time.time()
+        os.utime(path, (now, stat.st_mtime))
+        with self._lock:
+            self.hits[namespace] += 1
+            if self._index is not None:
+                self._index[path] = (stat.st_size, now)
+        return data
+
+    def put(self, namespace: str, key: str, data: bytes):
+        path = self.path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self.max_bytes is not None:
+            with self._lock:
+                self._load_index()
+                self._index[path] = (os.path.getsize(path), time.time())
+                self._evict()
+
+    def fetch(self, namespace: str, key: str, fetch: Callable[[], bytes]) -> bytes:
+        """Return the cached entry, or store and return the result of `fetch()` if there is none."""
+        data = self.get(namespace, key)
+        if data is None:
+            if self.offline:
+                raise CacheMissError(f"`{key}` is not cached in `{namespace}`")
+            data = fetch()
+            self.put(namespace, key, data)
+        return data
+
+    def put_json(self, namespace: str, key: str, value):
+        self.put(namespace, key, json.dumps(value).encode())
+
+    def fetch_json(self, namespace: str, key: str, fetch: Callable[[], object]):
+        return json.loads(self.fetch(namespace, key, lambda: json.dumps(fetch()).encode()))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            namespace: {'hits': self.hits[namespace], 'misses': self.misses[namespace]}
+            for namespace in sorted(set(self.hits) | set(self.misses))
+        }
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith('.tmp'):
+                    stat = os.stat(path := os.path.join(dirpath, filename))
+                    self._index[path] = (stat.st_size, stat.st_atime)
+
+    def _evict(self):
+        total = sum(size for size, _ in self._index.values())
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% of the budget so that eviction does not run on every write.
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if total <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            total -= size
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    root: str = constants.CACHE_DIR
+    enabled: bool = True
+    ttl: float = 7 * 24 * 60 * 60
+    max_bytes: int = 10 * 1024**3
+    offline: bool = False
+
+
+_config = CacheConfig()
+_cache = None
+_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Update the cache configuration. The shared cache is recreated on its next use."""
+    global _config, _cache
+    with _lock:
+        _config = replace(_config, **kwargs)
+        _cache = None
+
+
+def get_cache() -> Optional[DiskCache]:
+    """The process-wide cache, or `None` if caching is disabled."""
+    global _cache
+    with _lock:
+        if _config.enabled and _cache is None:
+            _cache = DiskCache(_config.root, ttl=_config.ttl, max_bytes=_config.max_bytes, offline=_config.offline)
+        return _cache
+
+
+def youtube(youtube_id: str, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED) -> pytube.YouTube:
+    """A `pytube.YouTube` whose watch page, `initial_data` and `vid_info` are served from the cache when possible.
+
+    `vid_info` is cached without its `streamingData`, whose urls expire long before the cache entry does.
+
+    Only requests that miss the cache go through the metadata slots of `limiter`.
+    """
+    yt = pytube.YouTube(utils.short_yt_url(youtube_id))
+
+    def fetch(attribute):
+
+        def get():
+            with limiter.slot(scheduler.METADATA, yt.watch_url):
+                return getattr(yt, attribute)
+
+        return get
+
+    cache = get_cache()
+    if cache is None:
+        fetch('watch_html')()
+        return yt
+    yt._watch_html = cache.fetch(WATCH_HTML, youtube_id, lambda: fetch('watch_html')().encode()).decode()
+    yt._initial_data = cache.fetch_json(INITIAL_DATA, youtube_id, lambda: pytube.extract.initial_data(yt.watch_html))
+    # Stripped again when read, for entries cached with their streams
+    vid_info = without_streams(cache.fetch_json(VID_INFO, youtube_id, lambda: without_streams(fetch('vid_info')())))
+    # A `vid_info` just fetched (with its streams) is kept; a cached one has none, see `YouTubeSource.stream_formats`.
+    if yt._vid_info is None:
+        yt._vid_info = vid_info
+    return yt
+
+
+def without_streams(vid_info: dict) -> dict:
+    return {key: value for key, value in vid_info.items() if key != STREAMING_DATA}
+
+
+def refresh_initial_data(youtube_id: str, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED) -> dict:
+    """Fetch the watch page again, replacing the cached one, and return its `initial_data`.
+
+    For pages that were served without data they should have. In offline mode the cached `initial_data` is returned.
+    """
+    cache = get_cache()
+    if cache is not None and cache.offline:
+        return cache.fetch_json(INITIAL_DATA, youtube_id, None)
+    yt = pytube.YouTube(utils.short_yt_url(youtube_id))
+    with limiter.slot(scheduler.METADATA, yt.watch_url):
+        watch_html = yt.watch_html
+    initial_data = pytube.extract.initial_data(watch_html)
+    if cache is not None:
+        cache.put(WATCH_HTML, youtube_id, watch_html.encode())
+        cache.put_json(INITIAL_DATA, youtube_id, initial_data)
+    return initial_data
+
+
+def transcript(youtube_id: str, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED):
+    """The raw subtitles of a video from `YouTubeTranscriptApi`, served from the cache when possible."""
+
+    def fetch():
+        with limiter.slot(scheduler.METADATA, TRANSCRIPT_URL):
+            return YouTubeTranscriptApi.get_transcript(youtube_id, languages=TRANSCRIPT_LANGUAGES)
+
+    cache = get_cache()
+    if cache is None:
+        return fetch()
+    return cache.fetch_json(TRANSCRIPT, youtube_id, fetch)
@@ -0,0 +1,121 @@
+"""Extraction of the chapters of a video from its `initial_data`.
+
+YouTube lists the chapters ("Chapters" or "Key Moments") of a video in two places of the watch page data:
+    the engagement panel `engagement-panel-macro-markers-auto-chapters`, or
+    the markers of the player bar overlay, keyed `DESCRIPTION_CHAPTERS` or `AUTO_CHAPTERS`.
+`parse` reads them in that order, each at most once, into typed `Chapter` records. Parsing is deterministic, so a
+failure is only worth retrying with a freshly fetched watch page, and only when the data is missing altogether
+(`ChapterError.missing`), as happens when YouTube serves a page without its chapter containers.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+ENGAGEMENT_PANEL = 'engagement-panel-macro-markers-auto-chapters'
+# Marker keys in order of preference
+MARKER_KEYS = ('DESCRIPTION_CHAPTERS', 'AUTO_CHAPTERS')
+
+
+@dataclass
+class Thumbnail:
+    url: str
+    width: int
+    height: int
+
+
+@dataclass
+class Chapter:
+    start_ms: int
+    title: str
+    thumbnails: Tuple[Thumbnail, ...]
+
+    @property
+    def start(self) -> float:
+        """Start of the chapter in seconds."""
+        return self.start_ms / 1000
+
+    def thumbnail(self, width: int, height: int) -> Optional[str]:
+        """Url of the thumbnail of exactly the given size, if there is one."""
+        for thumbnail in self.thumbnails:
+            if thumbnail.width == width and thumbnail.height == height:
+                return thumbnail.url
+        return None
+
+
+class ChapterError(Exception):
+    """Raised when no chapters could be extracted.
+
+    `missing` tells whether neither location of the chapters exists in the data at all, as opposed to existing with
+    unexpected contents.
+    """
+
+    def __init__(self, message: str, missing: bool):
+        super().__init__(message)
+        self.missing = missing
+
+
+class _Missing(Exception):
+    """The location of the chapters does not exist in the data."""
+
+
+def _thumbnails(renderer: dict) -> Tuple[Thumbnail, ...]:
+    thumbnails = tuple([
+        Thumbnail(t['url'], t.get('width', 0), t.get('height', 0)) for t in renderer['thumbnail']['thumbnails']
+    ])
+    if not thumbnails:
+        raise ValueError(f"Chapter `{renderer['title']['simpleText']}` has no thumbnails")
+    return thumbnails
+
+
+def from_engagement_panel(initial_data: dict) -> List[Chapter]:
+    panels = [
+        p['engagementPanelSectionListRenderer'] for p in initial_data.get('engagementPanels', ())
+        if p.get('engagementPanelSectionListRenderer', {}).get('panelIdentifier') == ENGAGEMENT_PANEL
+    ]
+    if not panels:
+        raise _Missing(f"No panel `{ENGAGEMENT_PANEL}`")
+    contents = panels[0]['content']['macroMarkersListRenderer']['contents']
+    return [
+        Chapter(
+            int(c['macroMarkersListItemRenderer']['onTap']['watchEndpoint']['startTimeSeconds']) * 1000,
+            c['macroMarkersListItemRenderer']['title']['simpleText'],
+            _thumbnails(c['macroMarkersListItemRenderer']),
+        ) for c in contents if 'macroMarkersListItemRenderer' in c
+    ]
+
+
+def from_overlay(initial_data: dict) -> List[Chapter]:
+    try:
+        markers = initial_data['playerOverlays']['playerOverlayRenderer']['decoratedPlayerBarRenderer'][
+            'decoratedPlayerBarRenderer']['playerBar']['multiMarkersPlayerBarRenderer']['markersMap']
+    except KeyError as e:
+        raise _Missing(f"No player bar markers ({e!r})")
+    keyed = {m.get('key'): m for m in markers}
+    marker = next((keyed[key] for key in MARKER_KEYS if key in keyed), None)
+    if marker is None:
+        raise _Missing(f"No chapter markers among {sorted(map(str, keyed))}")
+    return [
+        Chapter(int(renderer['timeRangeStartMillis']), renderer['title']['simpleText'], _thumbnails(renderer))
+        for renderer in (c['chapterRenderer'] for c in marker['value']['chapters'])
+    ]
+
+
+def parse(initial_data: dict) -> List[Chapter]:
+    """The chapters of a video, from the engagement panel if it has them, or else from the overlay."""
+    errors = []
+    missing = True
+    for extract in (from_engagement_panel, from_overlay):
+        try:
+            chapters = extract(initial_data)
+        except _Missing as e:
+            errors.append(f"{extract.__name__}: {e}")
+            continue
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            errors.append(f"{extract.__name__}: {e!r}")
+            missing = False
+            continue
+        if chapters:
+            return chapters
+        errors.append(f"{extract.__name__}: no chapters")
+        missing = False
+    raise ChapterError("\n".join("\t" + error for error in errors), missing)
@@ -1,4 +1,10 @@
+import os
+
 KEYFRAME_WIDTH = 336
 KEYFRAME_HEIGHT = 188
-SLEEP_EVERY_N_ENTRIES = 15
-DATASET_DIR = '/mnt/data1/jielin/msmo'
\ No newline at end of file
+KEYFRAME_WORKERS = 8
+DATASET_DIR = '/mnt/data1/jielin/msmo'
+NUM_CATEGORIES = 17
+NUM_SUBCATEGORIES = 10
+NUM_ENTRIES_PER_SUBCATEGORY = 30
+CACHE_DIR = os.path.expanduser('~/.cache/msmo')
@@ -1,30 +1,86 @@
 import csv
 from dataclasses import dataclass
+import hashlib
 import os
+from typing import Iterable, List
 
 from lib import utils
 
+# Ways of splitting the entries across the nodes of a build
+HASH = 'hash'
+CATEGORY = 'category'
+SHARD_BY = (HASH, CATEGORY)
+
+
+@dataclass(frozen=True)
+class Shard:
+    """The `index`-th of `count` disjoint parts of the entries.
+
+    Entries are split either by a hash of their video id, which balances the parts, or round-robin by category, which
+    keeps each category on a single node.
+    """
+    index: int
+    count: int
+    by: str = HASH
+
+    @classmethod
+    def parse(cls, spec: str, by: str = HASH) -> 'Shard':
+        """Parse a shard given as `i/N`, counting from 0."""
+        index, sep, count = spec.partition('/')
+        if not sep or not index.isdigit() or not count.isdigit() or not 0 <= int(index) < int(count):
+            raise ValueError(f"{spec} is not a shard of the form i/N with 0 <= i < N")
+        if by not in SHARD_BY:
+            raise ValueError(f"Shards are split by one of {SHARD_BY}, not {by}")
+        return cls(int(index), int(count), by)
+
+    @property
+    def name(self) -> str:
+        return f"shard-{self.index}-of-{self.count}"
+
+    def owns(self, key: str) -> bool:
+        # `hash()` is salted per process, so a stable digest is used to agree across nodes.
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big') % self.count == self.index
+
 
 @dataclass
 class MSMOEntry:
-    """Class for tracking entries in the dataset."""
+    """Class for tracking entries in the dataset.
+
+    The video id and the paths of the entry are computed once, when it is created, so the fields must not be changed
+    afterwards. Path queries have no side effects: writers create the directories they write to with
+    `utils.make_dirs` (or all of them upfront with `make_tree`).
+    """
+    __slots__ = (
+        'category', 'subcategory', 'index', 'youtube_id', 'root_dir', 'video_id', 'annotation_dir', 'video_dir',
+        'keyframe_dir', '_annotation_path', '_video_path'
+    )
     category: str
     subcategory: str
     index: int
     youtube_id: str
     root_dir: str
 
+    def __post_init__(self):
+        # The MSMO dataset key: the first 3 letters of the category and of the subcategory (capitalized), and the
+        # index as 4 digits.
+        self.video_id = f"{self.category[:3].upper()}{self.subcategory[:3].upper()}{self.index:04d}"
+        # Joined once and extended by formatting, which gives the same paths as `os.path.join` at a fraction of its cost
+        root, sep = os.path.join(self.root_dir, ''), os.sep
+        tail = f"{sep}{self.category}{sep}{self.subcategory}"
+        self.annotation_dir = f"{root}annotation{tail}"
+        self.video_dir = f"{root}video{tail}"
+        self.keyframe_dir = f"{root}keyframe{tail}{sep}{self.video_id}"
+        self._annotation_path = f"{self.annotation_dir}{sep}{self.video_id}.json"
+        self._video_path = f"{self.video_dir}{sep}{self.video_id}.mp4"
+
     def keyframe_path(self, keyframe_id):
-        return utils.make_path(self._subfolder('keyframe'), self.video_id, f"keyframe_{keyframe_id}.jpg")
+        return f"{self.keyframe_dir}{os.sep}keyframe_{keyframe_id}.jpg"
 
     def annotation_path(self):
-        return utils.make_path(self._subfolder('annotation'), f"{self.video_id}.json")
+        return self._annotation_path
 
     def video_path(self):
-        return utils.make_path(self._subfolder('video'), f"{self.video_id}.mp4")
-
-    def _subfolder(self, attribute: str):
-        return os.path.join(self.root_dir, attribute, self.category, self.subcategory)
+        return self._video_path
 
     @staticmethod
     def _key(s: str):
@@ -38,32 +94,48 @@ class MSMOEntry:
     def subcategory_key(self) -> str:
         return self._key(self.subcategory)
 
-    @property
-    def video_id(self) -> str:
-        """Build the MSMO dataset key for a given video entry.
-        
-        The data set key consists of:
-            - The first 3 letters of the category (capitalized).
-            - The first 3 letters of the subcategory (capitalized).
-            - The a 4 digit number representing the index.
-        """
-        return f"{self.category_key}{self.subcategory_key}{self.index:04d}"
-
     def exists(self) -> bool:
         """Whether the entry has already been downloaded."""
         return all(os.path.exists(p) for p in (self.annotation_path(), self.keyframe_path(0), self.video_path()))
 
 
-def read_entries(key_dir, data_dir, categories=None):
+def make_tree(entries: Iterable[MSMOEntry]) -> int:
+    """Create the `<root>/<category>/<subcategory>` directories of the entries under every root, each once.
+
+    Returns the number of entries, so that callers streaming the entries can count them in the same pass.
+    """
+    count, dirs = 0, set()
+    for entry in entries:
+        count += 1
+        dirs.update((entry.annotation_dir, entry.video_dir, os.path.dirname(entry.keyframe_dir)))
+    utils.make_dirs(*sorted(dirs))
+    return count
+
+
+def key_files(key_dir: str) -> List[str]:
+    """The .csv files of `key_dir`, in a fixed order so every node of a sharded build sees the same entries."""
+    return sorted(f for f in os.listdir(key_dir) if f.endswith('.csv'))
+
+
+def read_entries(key_dir, data_dir, categories=None, shard: Shard = None):
+    """Generate the entries listed in the .csv files of `key_dir`, one file at a time.
+
+    Entries are generated in a deterministic order: files sorted by name, then in the order of each file. If a
+    `shard` is given, only the entries belonging to it are generated.
+    """
     assert os.path.exists(key_dir) and os.path.isdir(key_dir)
+    filenames = key_files(key_dir)
     if categories:
-        assert all(f"{cat}.csv" in os.listdir(key_dir) for cat in categories)
-        files = [os.path.join(key_dir, f"{cat}.csv") for cat in categories]
+        assert all(f"{cat}.csv" in filenames for cat in categories)
+        # The position of a category among all of them is kept, so category shards do not depend on `categories`.
+        files = [(filenames.index(f"{cat}.csv"), f"{cat}.csv") for cat in categories]
     else:
-        files = [os.path.join(key_dir, filename) for filename in os.listdir(key_dir)]
-    for file in files:
-        category = utils.sanitize(os.path.basename(file)[:-len('.csv')])
-        with open(file, 'r') as csvfile:
+        files = list(enumerate(filenames))
+    for position, filename in files:
+        if shard is not None and shard.by == CATEGORY and position % shard.count != shard.index:
+            continue
+        category = utils.sanitize(filename[:-len('.csv')])
+        with open(os.path.join(key_dir, filename), 'r') as csvfile:
             subcategory = None
             for line in csv.reader(csvfile):
                 if line[0]:
@@ -71,21 +143,23 @@ def read_entries(key_dir, data_dir, categories=None):
                     idx = 0
                 for vid in line[1:]:
                     if vid:
-                        yield MSMOEntry(category, subcategory, idx, vid, data_dir)
+                        entry = MSMOEntry(category, subcategory, idx, vid, data_dir)
+                        if shard is None or shard.by == CATEGORY or shard.owns(entry.video_id):
+                            yield entry
                         idx += 1
 
 
 if __name__ == '__main__':
     from collections import defaultdict
-    length = len(tuple(read_entries('./keys')))
-    assert length == 17 * 10 * 30, f"Length is {length}"
     cats = defaultdict(int)
     subcats = defaultdict(int)
-    for entry in read_entries('./keys'):
+    for entry in read_entries('./keys', '.'):
         cats[entry.category] += 1
         subcats[entry.subcategory] += 1
+    length = sum(cats.values())
+    assert length == 17 * 10 * 30, f"Length is {length}"
     assert len(cats) == 17, f"Expected 17 categories, found {len(cats)}"
     assert all(count == 10 * 30 for _, count in cats.items())
     # These lines will fail because the `writing` subcategory exists in both the `hobbies` and `education` categories.
     # assert len(subcats) == 17 * 10, f"Expected 170 subcategories, found {len(subcats)}"
-    # assert all(count == 30 for _, count in subcats.items())
\ No newline at end of file
+    # assert all(count == 30 for _, count in subcats.items())
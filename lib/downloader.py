@@ -0,0 +1,140 @@
+"""Resumable, range-based download of video streams.
+
+Streams are written to `<path>.part` and resumed with HTTP `Range` requests after a dropped connection, instead of
+restarting from byte zero. Large streams can optionally be split into byte ranges fetched in parallel. The finished
+file is checked against the advertised size before it is atomically renamed to its final path.
+"""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import requests
+
+from lib import metrics
+from lib import session as http_session
+from lib import utils
+
+logger = utils.get_logger()
+
+
+class DownloadError(Exception):
+    """Raised when a stream could not be downloaded completely."""
+
+
+@dataclass(frozen=True)
+class DownloadConfig:
+    # Number of byte ranges fetched in parallel for streams of at least `min_segment_size` bytes.
+    segments: int = 1
+    min_segment_size: int = 32 * 1024 * 1024
+    # Number of requests made for a byte range before giving up; each one resumes where the previous one stopped.
+    attempts: int = 5
+
+
+_config = DownloadConfig()
+
+
+def configure(**kwargs):
+    global _config
+    _config = replace(_config, **kwargs)
+
+
+def get_config() -> DownloadConfig:
+    return _config
+
+
+def remote_size(url: str, session: requests.Session) -> Optional[int]:
+    """The size advertised by the server for `url`, if any."""
+    with session.head(url, allow_redirects=True, timeout=http_session.get_config().timeout) as r:
+        if r.status_code == 200 and 'Content-Length' in r.headers:
+            return int(r.headers['Content-Length'])
+    return None
+
+
+def _size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def fetch_range(url: str, part_path: str, start: int, end: Optional[int], session: requests.Session, attempts: int):
+    """Download bytes `start` to `end` (inclusive, or up to the end of the stream if `None`) of `url` to `part_path`.
+
+    Bytes already in `part_path` are kept and only the remainder is requested.
+    """
+    chunk_size = http_session.get_config().chunk_size
+    error = None
+    for attempt in range(attempts):
+        have = _size(part_path)
+        if end is not None and have >= end - start + 1:
+            return
+        if attempt > 0:
+            metrics.increment('retries', stage='video')
+        received = 0
+        headers = {}
+        if start + have > 0 or end is not None:
+            headers['Range'] = f"bytes={start + have}-{'' if end is None else end}"
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=http_session.get_config().timeout) as r:
+                if r.status_code == 416:
+                    # Nothing left to fetch; the final size check decides whether the file is complete.
+                    return
+                r.raise_for_status()
+                mode = 'ab'
+                if headers and r.status_code == 200:
+                    if start > 0:
+                        raise DownloadError(f"Server ignored the range request for {url}")
+                    # The server sent the whole stream, so start over.
+                    mode = 'wb'
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        received += len(chunk)
+            if end is None:
+                return
+        except requests.RequestException as e:
+            error = e
+            logger.warning(f"Attempt {attempt}: Download of {url} stopped at byte {start + _size(part_path)}\n{e}")
+        finally:
+            metrics.increment('bytes_downloaded', received, stage='video')
+    if end is None or _size(part_path) < end - start + 1:
+        raise DownloadError(f"Failed to download {url} after {attempts} attempts: {error!r}")
+
+
+def download_stream(url: str, path: str, filesize: int = None, session: requests.Session = None):
+    """Download `url` to `path`, resuming from a previous `.part` file if one exists.
+
+    Raises `DownloadError` if the stream could not be downloaded or does not match `filesize`.
+    """
+    config = get_config()
+    session = session or http_session.get_session()
+    if filesize is None:
+        filesize = remote_size(url, session)
+    part_path = path + '.part'
+
+    if filesize and config.segments > 1 and filesize >= config.min_segment_size:
+        segment_size = -(-filesize // config.segments)
+        bounds = [(start, min(start + segment_size, filesize) - 1) for start in range(0, filesize, segment_size)]
+        segment_paths = [f"{part_path}.{i}" for i in range(len(bounds))]
+        with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+            list(
+                pool.map(
+                    lambda i: fetch_range(url, segment_paths[i], *bounds[i], session, config.attempts),
+                    range(len(bounds)),
+                )
+            )
+        with open(part_path, 'wb') as part:
+            for segment_path in segment_paths:
+                with open(segment_path, 'rb') as segment:
+                    shutil.copyfileobj(segment, part)
+        for segment_path in segment_paths:
+            os.remove(segment_path)
+    else:
+        fetch_range(url, part_path, 0, filesize - 1 if filesize else None, session, config.attempts)
+
+    if filesize is not None and (size := _size(part_path)) != filesize:
+        if size > filesize:
+            # Resuming cannot fix a file that is too long.
+            os.remove(part_path)
+        raise DownloadError(f"Downloaded {size} bytes of {url}; expected {filesize}")
+    os.replace(part_path, path)
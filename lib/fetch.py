@@ -1,175 +1,259 @@
 import json
 import math
 import urllib
+from concurrent.futures import ThreadPoolExecutor
 
-from pytube import YouTube, extract
-from youtube_transcript_api import YouTubeTranscriptApi
+import numpy as np
+import requests
 
+from lib import chapters
 from lib import constants
+from lib import downloader
+from lib import metrics
+from lib import probe
+from lib import scheduler
+from lib import timestamps
 from lib import utils
+from lib.backend import Backend, YouTubeBackend
 from lib.data import MSMOEntry
+from lib.ledger import ANNOTATION, ARTIFACTS, KEYFRAMES, VIDEO, Ledger
 
 logger = utils.get_logger()
 
 
+class KeyframeError(Exception):
+    """Raised when one or more keyframes of a video could not be downloaded."""
+
+    def __init__(self, youtube_id: str, failures):
+        self.youtube_id = youtube_id
+        self.failures = failures
+        super().__init__(
+            f"Failed to download {len(failures)} keyframe(s) of `{youtube_id}`\n" +
+            "\n".join(f"\tkeyframe_{i}: {error}" for i, error in sorted(failures.items()))
+        )
+
+
+def process_transcript(raw_transcript):
+    """Turn the raw subtitles returned by `YouTubeTranscriptApi` into non-overlapping transcript segments.
+
+    Bounds are computed in whole seconds first and formatted as timestamps all at once.
+    """
+    # [index, start, end, text] of each segment
+    segments = []
+    prev_start, prev_dur, prev_end = None, None, None
+    for i, subtitle in enumerate(raw_transcript):
+        # Clip previous transcript if it goes past the start of the currents transcript
+        if i > 0 and prev_start + prev_dur >= math.floor(subtitle['start']):
+            prev_end = math.floor(subtitle['start']) - 1
+            # Merge transcripts if the clipped transcript would be less than 1 second long
+            if prev_end - prev_start < 1:
+                prev_end = math.floor(subtitle['start'] + subtitle['duration'])
+                segments[-1][2] = prev_end
+                segments[-1][3] += ' ' + subtitle['text']
+                continue # Because we merged, we don't to skip to the next transcript
+            segments[-1][2] = prev_end
+        prev_start = math.floor(subtitle['start'])
+        prev_end = math.floor(subtitle['start'] + subtitle['duration'])
+        prev_dur = prev_end - prev_start
+        segments.append([i, prev_start, prev_end, subtitle['text']])
+    starts = np.array([segment[1] for segment in segments])
+    ends = np.array([segment[2] for segment in segments])
+    start_times, end_times, lengths = map(timestamps.to_timestamps, (starts, ends, ends - starts))
+    return [
+        {
+            'index': index,
+            'start_time': start_time,
+            'end_time': end_time,
+            'length': length,
+            'summary': text
+        } for (index, _, _, text), start_time, end_time, length in zip(segments, start_times, end_times, lengths)
+    ]
+
+
+def serialize_annotation(annotation) -> str:
+    return json.dumps(annotation, indent=2)
+
+
 class Video:
-    def __init__(self, entry: MSMOEntry):
+    def __init__(
+        self,
+        entry: MSMOEntry,
+        limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED,
+        ledger: Ledger = None,
+        backend: Backend = None,
+    ):
         self.entry = entry
         self.youtube_id = entry.youtube_id
-        self.yt = YouTube(utils.short_yt_url(self.youtube_id))
-        self.initial_data = extract.initial_data(self.yt.watch_html)
+        self.limiter = limiter
+        self.ledger = ledger
+        self.backend = backend or YouTubeBackend(limiter)
+        with metrics.span('watch_page'):
+            self.source = self.backend.open(self.youtube_id)
+            self.metadata = self.source.metadata()
+            self.initial_data = self.source.initial_data()
+
+    def download(self, artifacts=ARTIFACTS):
+        """Download the given artifacts of the entry, recording the outcome of each in the ledger.
 
-    def download(self):
+        The annotation and keyframes are produced together, so requesting either one downloads both. Steps run one
+        after the other; `lib.pipeline` runs the same steps of many entries as concurrent stages.
+        """
         logger.info(f"Downloading {self.entry.video_id} ({self.youtube_id})")
-        annotation = self.get_annotation()
-        with open(self.entry.annotation_path(), 'w') as ann_file:
-            ann_file.write(json.dumps(annotation, indent=2))
-        video = self.yt.streams.filter(mime_type='video/mp4').get_highest_resolution()
-        for attempt in range(5):
-            try:
-                video.download(filename=self.entry.video_path())
-            except urllib.error.HTTPError as e:
-                logger.warn(
-                    f"Attempt {attempt}: Failed to download video for video `{self.youtube_id}` ({self.entry.video_id})"
-                    + "\n" + str(e)
-                )
-            else:
-                break
-        else:
-            logger.error(f"Failed to download video stream for `{self.youtube_id}`")
+        if ANNOTATION in artifacts or KEYFRAMES in artifacts:
+            with metrics.span('annotation'):
+                self.download_annotation()
+        if VIDEO in artifacts:
+            self.download_video()
 
-    def get_transcript(self):
-        transcripts = []
-        prev_start, prev_dur, prev_end = None, None, None
-        for i, subtitle in enumerate(
-            YouTubeTranscriptApi.get_transcript(self.youtube_id, languages=('en', 'en-US', 'en-GB'))
-        ):
-            # Clip previous transcript if it goes past the start of the currents transcript
-            if i > 0 and prev_start + prev_dur >= math.floor(subtitle['start']):
-                prev_end = math.floor(subtitle['start']) - 1
-                # Merge transcripts if the clipped transcript would be less than 1 second long
-                if prev_end - prev_start < 1:
-                    prev_end = math.floor(subtitle['start'] + subtitle['duration'])
-                    transcripts[-1]['end_time'] = utils.float_to_timestamp(prev_end)
-                    transcripts[-1]['length'] = utils.float_to_timestamp(prev_end - prev_start)
-                    transcripts[-1]['summary'] += ' ' + subtitle['text']
-                    continue # Because we merged, we don't to skip to the next transcript
-                transcripts[-1]['end_time'] = utils.float_to_timestamp(prev_end)
-                transcripts[-1]['length'] = utils.float_to_timestamp(prev_end - prev_start)
-            prev_start = math.floor(subtitle['start'])
-            prev_end = math.floor(subtitle['start'] + subtitle['duration'])
-            prev_dur = prev_end - prev_start
-            transcripts.append(
-                {
-                    'index': i,
-                    'start_time': utils.float_to_timestamp(prev_start),
-                    'end_time': utils.float_to_timestamp(prev_end),
-                    'length': utils.float_to_timestamp(prev_dur),
-                    'summary': subtitle['text']
-                }
+    def download_annotation(self):
+        try:
+            summary = self.get_summary()
+            transcript = self.get_transcript()
+        except Exception as e:
+            self.record_annotation_failure(e)
+            raise
+        self.write_annotation(summary, transcript)
+
+    def record_annotation_failure(self, error: Exception):
+        if self.ledger is not None:
+            self.ledger.record_failure(self.entry, ANNOTATION, error)
+            self.ledger.record_failure(self.entry, KEYFRAMES, error)
+
+    def write_annotation(self, summary, transcript):
+        """Write the annotation of a summary (with its keyframes downloaded) and a transcript, and record both."""
+        try:
+            annotation = self.build_annotation(summary, transcript)
+            utils.make_dirs(self.entry.annotation_dir)
+            utils.write_atomic(self.entry.annotation_path(), serialize_annotation(annotation))
+        except Exception as e:
+            self.record_annotation_failure(e)
+            raise
+        if self.ledger is not None:
+            self.ledger.record_done(self.entry, ANNOTATION, [self.entry.annotation_path()])
+            self.ledger.record_done(
+                self.entry, KEYFRAMES, [self.entry.keyframe_path(i) for i in range(len(annotation['summary']))]
             )
-        return transcripts
 
-    def _chapter_renderers_from_overlay(self):
-        """Look for chapters in the video overlay.
-        
-        Generates an iterable of tuples (timestamp, renderer), each corresponding to a chapter.
-        """
-        markers = self.initial_data['playerOverlays']['playerOverlayRenderer']['decoratedPlayerBarRenderer'][
-            'decoratedPlayerBarRenderer']['playerBar']['multiMarkersPlayerBarRenderer']['markersMap']
-        chapters = markers[0]['value']['chapters']
-        for chapter in chapters:
-            renderer = chapter['chapterRenderer']
-            assert len(
-                renderer['thumbnail']['thumbnails']
-            ) > 0, f"Chapter `{renderer['title']['simpleText']}` has no thumbnails"
-            ts = renderer['timeRangeStartMillis'] / 1000
-            yield ts, renderer
-
-    def _chapter_renderers_from_engagement_panel(self):
-        """Look for chapters in the engagement panel section.
-        
-        Generates an iterable of tuples (timestamp, renderer), each corresponding to a chapter.
-        """
-        panels = [
-            p['engagementPanelSectionListRenderer'] for p in self.initial_data['engagementPanels']
-            if p['engagementPanelSectionListRenderer'].get('panelIdentifier', None) ==
-            'engagement-panel-macro-markers-auto-chapters'
-        ]
-        chapters = panels[0]['content']['macroMarkersListRenderer']['contents']
-        for chapter in (c for c in chapters if 'macroMarkersListItemRenderer' in c):
-            renderer = chapter['macroMarkersListItemRenderer']
-            assert len(
-                renderer['thumbnail']['thumbnails']
-            ) > 0, f"Chapter `{renderer['title']['simpleText']}` has no thumbnails"
-            ts = renderer['onTap']['watchEndpoint']['startTimeSeconds']
-            yield ts, renderer
-
-    def chapter_renderers(self, tries=5):
-        """Try to extract the chapters from either the engagement panel or the overlay.
-        
-        Try each location twice, to account for a non-determinism issue with the `pytube` API.
+    def download_video(self):
+        with metrics.span('streams'):
+            stream_format = probe.select(self.source.stream_formats())
+        if stream_format is None:
+            e = downloader.DownloadError(f"No MP4 stream of `{self.youtube_id}` matches {probe.get_policy()}")
+            logger.error(str(e))
+            if self.ledger is not None:
+                self.ledger.record_failure(self.entry, VIDEO, e)
+            return
+        try:
+            with metrics.span('video'):
+                url, filesize = self.source.stream(stream_format.itag)
+                utils.make_dirs(self.entry.video_dir)
+                self.backend.fetch_stream(url, self.entry.video_path(), filesize=filesize)
+        except (downloader.DownloadError, requests.RequestException, urllib.error.HTTPError) as e:
+            logger.error(f"Failed to download video stream for `{self.youtube_id}` ({self.entry.video_id})\n{e}")
+            if self.ledger is not None:
+                self.ledger.record_failure(self.entry, VIDEO, e)
+            return
+        if self.ledger is not None:
+            self.ledger.record_done(self.entry, VIDEO, [self.entry.video_path()])
+
+    def get_transcript(self):
+        with metrics.span('transcript'):
+            return process_transcript(self.source.transcript())
+
+    def get_chapters(self, refetches=1):
+        """Extract the chapters of the video.
+
+        Parsing is deterministic, so the watch page is only fetched again (at most `refetches` times) when the
+        chapters are missing from it altogether.
         """
-        errors = []
-        for _ in range(tries):
-            for gen in (self._chapter_renderers_from_engagement_panel, self._chapter_renderers_from_overlay):
-                try:
-                    return list(gen())
-                except (KeyError, IndexError, AssertionError) as e:
-                    errors.append(e)
-        raise Exception(
-            f"Unable to find chapters for video `{self.youtube_id} ({self.entry.video_id})`\n" +
-            "\n".join("\t" + repr(e) for e in errors)
-        )
+        for attempt in range(refetches + 1):
+            try:
+                return chapters.parse(self.initial_data)
+            except chapters.ChapterError as e:
+                error = e
+                if not e.missing or attempt == refetches:
+                    break
+            metrics.increment('retries', stage='chapters')
+            self.initial_data = self.source.initial_data(refresh=True)
+        raise Exception(f"Unable to find chapters for video `{self.youtube_id} ({self.entry.video_id})`\n{error}")
 
     def get_summary(self):
-        """"Create a list of chapters from the video.
-        
+        """Create a list of chapters from the video and download the keyframe of each chapter."""
+        with metrics.span('chapters'):
+            summary, keyframe_urls = self.build_summary()
+        with metrics.span('keyframes'):
+            self.download_keyframes(keyframe_urls, summary)
+        return summary
+
+    def build_summary(self):
+        """Create a list of chapters from the video.
+
         Each video is broken up to segments, labeled as either "Key Moments" or "Chapters".
-        This function extracts the (start time, end time, length) for each segment, and also
-        downloads the thumbnail for the segment.
+        This function extracts the (start time, end time, length) for each segment, along with the url of the
+        thumbnail for the segment (or `None` if it has no thumbnail of the keyframe size).
+        """
+        video_chapters = self.get_chapters()
+        # Each segment ends the second before the next one starts, and the last one at the end of the video.
+        starts = np.array([chapter.start for chapter in video_chapters], dtype=np.float64)
+        ends = np.append(starts[1:] - 1, self.metadata.length)
+        start_times, end_times, lengths = map(timestamps.to_timestamps, (starts, ends, ends - starts))
+        summary = [
+            {
+                'segment': i,
+                'start_time': start_times[i],
+                'summary': chapter.title,
+                'end_time': end_times[i],
+                'length': lengths[i],
+            } for i, chapter in enumerate(video_chapters)
+        ]
+        keyframe_urls = [
+            chapter.thumbnail(constants.KEYFRAME_WIDTH, constants.KEYFRAME_HEIGHT) for chapter in video_chapters
+        ]
+        return summary, keyframe_urls
+
+    def download_keyframes(self, keyframe_urls, summary, workers=constants.KEYFRAME_WORKERS):
+        """Download the keyframe of every segment concurrently to `keyframe_{i}.jpg`.
+
+        Every keyframe is attempted; if any of them fail, a `KeyframeError` listing each failure is raised afterwards.
         """
-        summary = []
-        prev_start = 0.
-        for i, (ts, renderer) in enumerate(self.chapter_renderers()):
-            if i > 0:
-                summary[-1]['end_time'] = utils.float_to_timestamp(ts - 1)
-                summary[-1]['length'] = utils.float_to_timestamp(ts - prev_start - 1)
-            summary.append(
-                {
-                    'segment': i,
-                    'start_time': utils.float_to_timestamp(ts),
-                    'summary': renderer['title']['simpleText'],
-                }
-            )
-            prev_start = ts
-            # Extract keyframe with proper size from `thumbnails` and download
-            keyframe = [
-                frame for frame in renderer['thumbnail']['thumbnails']
-                if frame['height'] == constants.KEYFRAME_HEIGHT and frame['width'] == constants.KEYFRAME_WIDTH
-            ]
-            assert len(keyframe) > 0, f"Frame `{summary[-1]['summary']}` of {self.youtube_id} has no thumbnail"
-            utils.download_blob(keyframe[0]['url'], self.entry.keyframe_path(i))
-        if summary:
-            summary[-1]['end_time'] = utils.float_to_timestamp(self.yt.length * 1000)
-            summary[-1]['length'] = utils.float_to_timestamp(self.yt.length - prev_start)
-        return summary
+
+        def download(i):
+            url = keyframe_urls[i]
+            if url is None:
+                return f"Frame `{summary[i]['summary']}` has no thumbnail"
+            try:
+                with metrics.span('keyframe'):
+                    if not self.backend.fetch_blob(url, self.entry.keyframe_path(i)):
+                        metrics.increment(metrics.STAGE_ERRORS, stage='keyframe')
+                        return f"Failed to fetch thumbnail {url}"
+            except Exception as e:
+                return repr(e)
+            return None
+
+        utils.make_dirs(self.entry.keyframe_dir)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(keyframe_urls)))) as pool:
+            errors = list(pool.map(download, range(len(keyframe_urls))))
+        failures = {i: error for i, error in enumerate(errors) if error is not None}
+        if failures:
+            raise KeyframeError(self.youtube_id, failures)
 
     def get_annotation(self):
-        summary = self.get_summary()
+        return self.build_annotation(self.get_summary(), self.get_transcript())
+
+    def build_annotation(self, summary, transcript):
         info = {
             'video_id': self.entry.video_id,
             'youtube_id': self.youtube_id,
-            'url': self.yt.watch_url,
-            'author': self.yt.author,
-            'title': self.yt.title,
+            'url': self.metadata.watch_url,
+            'author': self.metadata.author,
+            'title': self.metadata.title,
             'num_of_segments': len(summary),
-            'duration': utils.float_to_timestamp(self.yt.length),
+            'duration': timestamps.to_timestamp(self.metadata.length),
             'category': self.entry.category,
             'sub_category': self.entry.subcategory,
         }
         return {
             'info': info,
             'summary': summary,
-            'transcript': self.get_transcript(),
+            'transcript': transcript,
         }
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""Columnar index of the dataset built from its annotation files.
+
+The index holds three tables of NumPy arrays, saved together in a single compressed `.npz` file:
+    videos:      one row per video (ids, category, duration, segment/transcript/keyframe counts).
+    segments:    one row per summary segment, with `video` pointing at the row of its video, and the range of its
+                 transcript lines (`first_transcript`, `num_transcripts`) within the video, as aligned by `lib.align`.
+    transcripts: one row per transcript line, with its bounds in seconds and `segment`, the position of its segment
+                 within the video (-1 before the first segment).
+
+Counts and distributions over the dataset can then be answered from the arrays without re-parsing every annotation.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from lib import align
+from lib import timestamps
+from lib import utils
+from lib.data import CATEGORY, Shard
+
+logger = utils.get_logger()
+
+VIDEO_COLUMNS = {
+    'video_id': str,
+    'youtube_id': str,
+    'category': str,
+    'subcategory': str,
+    'duration': np.int32,
+    'num_segments': np.int32,
+    'num_transcripts': np.int32,
+    'transcript_chars': np.int32,
+    'num_keyframes': np.int32,
+}
+SEGMENT_COLUMNS = {
+    'video': np.int32,
+    'segment': np.int32,
+    'start': np.int32,
+    'end': np.int32,
+    'length': np.int32,
+    'summary_chars': np.int32,
+    'first_transcript': np.int32,
+    'num_transcripts': np.int32,
+}
+TRANSCRIPT_COLUMNS = {
+    'video': np.int32,
+    'segment': np.int32,
+    'start': np.int32,
+    'end': np.int32,
+}
+TABLES = ('videos', 'segments', 'transcripts')
+
+INDEX_FILENAME = 'index.npz'
+
+
+def _list_dir(path: str) -> List[str]:
+    try:
+        with os.scandir(path) as it:
+            return sorted(e.name for e in it)
+    except FileNotFoundError:
+        return []
+
+
+def scan_subcategory(dataset_dir: str, category: str,
+                     subcategory: str) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+    """Rows of the video, segment and transcript tables for one subcategory, pointing at videos in this batch."""
+    ann_dir = os.path.join(dataset_dir, 'annotation', category, subcategory)
+    keyframe_dir = os.path.join(dataset_dir, 'keyframe', category, subcategory)
+    videos, segments, transcripts = [], [], []
+    for filename in _list_dir(ann_dir):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(ann_dir, filename), 'r') as ann_file:
+                annotation = json.load(ann_file)
+            info = annotation['info']
+            video_id = filename[:-len('.json')]
+            keyframes = [name for name in _list_dir(os.path.join(keyframe_dir, video_id)) if name.endswith('.jpg')]
+            transcript = annotation['transcript']
+            alignment = align.align_annotation(annotation)
+            video_segments = list(
+                zip(
+                    [len(videos)] * len(annotation['summary']),
+                    [segment['segment'] for segment in annotation['summary']],
+                    alignment['segment_start'].tolist(),
+                    alignment['segment_end'].tolist(),
+                    align.seconds(annotation['summary'], 'length').tolist(),
+                    [len(segment['summary']) for segment in annotation['summary']],
+                    alignment['first_transcript'].tolist(),
+                    alignment['num_transcripts'].tolist(),
+                )
+            )
+            video_transcripts = list(
+                zip(
+                    [len(videos)] * len(transcript),
+                    alignment['transcript_segment'].tolist(),
+                    alignment['transcript_start'].tolist(),
+                    alignment['transcript_end'].tolist(),
+                )
+            )
+            row = (
+                video_id,
+                info['youtube_id'],
+                category,
+                subcategory,
+                timestamps.to_seconds(info['duration']),
+                len(annotation['summary']),
+                len(transcript),
+                sum(len(t['summary']) for t in transcript),
+                len(keyframes),
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Skipping annotation `{os.path.join(ann_dir, filename)}`: {e!r}")
+            continue
+        videos.append(row)
+        segments.extend(video_segments)
+        transcripts.extend(video_transcripts)
+    return videos, segments, transcripts
+
+
+def _scan(args):
+    return scan_subcategory(*args)
+
+
+class DatasetIndex:
+    def __init__(
+        self, videos: Dict[str, np.ndarray], segments: Dict[str, np.ndarray], transcripts: Dict[str, np.ndarray] = None
+    ):
+        self.videos = videos
+        self.segments = segments
+        self.transcripts = transcripts if transcripts is not None else {}
+
+    @classmethod
+    def from_rows(cls, videos: List[tuple], segments: List[tuple], transcripts: List[tuple] = ()) -> 'DatasetIndex':
+
+        def table(columns, rows):
+            values = list(zip(*rows)) if rows else [()] * len(columns)
+            return {
+                name: np.array(column, dtype=dtype) if dtype is not str else np.array(column, dtype=np.str_)
+                for (name, dtype), column in zip(columns.items(), values)
+            }
+
+        return cls(
+            table(VIDEO_COLUMNS, videos), table(SEGMENT_COLUMNS, segments), table(TRANSCRIPT_COLUMNS, transcripts)
+        )
+
+    @classmethod
+    def build(cls, dataset_dir: str, processes: int = 1, shard: Shard = None) -> 'DatasetIndex':
+        """Scan the annotation tree of the dataset once, one subcategory per task.
+
+        With a `shard`, only its part of the subcategories (or categories) is scanned; the indexes of all shards can
+        be combined with `concat`.
+        """
+        ann_root = os.path.join(dataset_dir, 'annotation')
+        tasks = [
+            (dataset_dir, category, subcategory) for position, category in enumerate(_list_dir(ann_root))
+            if shard is None or shard.by != CATEGORY or position % shard.count == shard.index
+            for subcategory in _list_dir(os.path.join(ann_root, category))
+            if shard is None or shard.by == CATEGORY or shard.owns(f"{category}/{subcategory}")
+        ]
+        if processes > 1:
+            with ProcessPoolExecutor(processes) as pool:
+                results = list(pool.map(_scan, tasks))
+        else:
+            results = [_scan(task) for task in tasks]
+        videos, segments, transcripts = [], [], []
+        for batch_videos, batch_segments, batch_transcripts in results:
+            offset = len(videos)
+            videos.extend(batch_videos)
+            segments.extend((video + offset, *rest) for video, *rest in batch_segments)
+            transcripts.extend((video + offset, *rest) for video, *rest in batch_transcripts)
+        return cls.from_rows(videos, segments, transcripts)
+
+    @classmethod
+    def concat(cls, indexes: List['DatasetIndex']) -> 'DatasetIndex':
+        """Combine the indexes of disjoint parts of the dataset into one."""
+        offsets = np.cumsum([0] + [len(index) for index in indexes[:-1]])
+
+        def table(name, columns):
+            tables = [getattr(index, name) for index in indexes]
+            result = {column: np.concatenate([t[column] for t in tables]) for column in columns}
+            if 'video' in columns:
+                result['video'] = np.concatenate(
+                    [t['video'] + offset for t, offset in zip(tables, offsets)]
+                ).astype(columns['video'])
+            return result
+
+        return cls(
+            table('videos', VIDEO_COLUMNS),
+            table('segments', SEGMENT_COLUMNS),
+            table('transcripts', TRANSCRIPT_COLUMNS),
+        )
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            **{f"videos.{name}": column for name, column in self.videos.items()},
+            **{f"segments.{name}": column for name, column in self.segments.items()},
+            **{f"transcripts.{name}": column for name, column in self.transcripts.items()},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'DatasetIndex':
+        with np.load(path) as arrays:
+            tables = {table: {} for table in TABLES}
+            for key in arrays.files:
+                table, name = key.split('.', 1)
+                tables[table][name] = arrays[key]
+        return cls(tables['videos'], tables['segments'], tables['transcripts'])
+
+    def __len__(self) -> int:
+        return len(self.videos['video_id'])
+
+    def transcript_rows(self, segment: int) -> np.ndarray:
+        """Rows of the transcripts table aligned to a row of the segments table."""
+        video = self.segments['video'][segment]
+        start = self.videos['num_transcripts'][:video].sum() + self.segments['first_transcript'][segment]
+        return np.arange(start, start + self.segments['num_transcripts'][segment])
+
+    def transcript_segments(self) -> np.ndarray:
+        """Row of the segments table of every transcript line, or -1 for lines before the first segment."""
+        first_segment = np.concatenate([[0], np.cumsum(self.videos['num_segments'])[:-1]]).astype(np.int64)
+        rows = first_segment[self.transcripts['video']] + self.transcripts['segment']
+        return np.where(self.transcripts['segment'] < 0, -1, rows)
+
+    def mask(self, **filters) -> np.ndarray:
+        """Boolean mask over videos matching every `column=value` filter (a value may also be a list)."""
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            mask &= np.isin(self.videos[column], list(values))
+        return mask
+
+    def count(self, **filters) -> int:
+        return int(self.mask(**filters).sum())
+
+    def counts_by(self, column: str, **filters) -> Dict[str, int]:
+        values, counts = np.unique(self.videos[column][self.mask(**filters)], return_counts=True)
+        return {value.item(): int(count) for value, count in zip(values, counts)}
+
+    def segment_mask(self, **filters) -> np.ndarray:
+        """Boolean mask over segments whose video matches the filters."""
+        return self.mask(**filters)[self.segments['video']]
+
+    def describe(self, column: str, **filters) -> Dict[str, float]:
+        """Summary statistics of a numeric video or segment column."""
+        if column in self.videos:
+            values = self.videos[column][self.mask(**filters)]
+        else:
+            values = self.segments[column][self.segment_mask(**filters)]
+        if len(values) == 0:
+            return {'count': 0}
+        percentiles = np.percentile(values, [50, 90, 99])
+        return {
+            'count': int(len(values)),
+            'min': float(values.min()),
+            'mean': float(values.mean()),
+            'p50': float(percentiles[0]),
+            'p90': float(percentiles[1]),
+            'p99': float(percentiles[2]),
+            'max': float(values.max()),
+        }
+
+    def histogram(self, column: str, bins=10, **filters):
+        """`np.histogram` of a numeric video or segment column."""
+        if column in self.videos:
+            values = self.videos[column][self.mask(**filters)]
+        else:
+            values = self.segments[column][self.segment_mask(**filters)]
+        return np.histogram(values, bins=bins)
@@ -0,0 +1,237 @@
+"""Persistent record of which artifacts of each entry have been downloaded.
+
+The ledger is an append-only JSONL journal stored in the dataset directory. Each line records the state of one
+artifact (annotation, keyframes or video) of one entry, along with the byte size and checksum of the written files
+or the error that stopped it. The latest line for an (entry, artifact) pair wins, so resuming a build only needs a
+single read of the journal instead of probing the filesystem for every entry.
+
+Records are tied to the YouTube video that produced them: when an edited key list gives a video id to another video,
+the records of the previous one no longer apply to it (see `lib.manifest` to move or delete its files instead of
+downloading everything again). A `removed` record drops the earlier records of an artifact.
+
+Each shard of a build split across nodes (see `data.Shard`) writes its own journal, `ledger.shard-<i>-of-<N>.jsonl`,
+so nodes never append to the same file, on top of the records of the main journal. `merge_shards` folds them back
+into the main journal.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from lib.data import MSMOEntry, Shard
+
+ANNOTATION = 'annotation'
+KEYFRAMES = 'keyframes'
+VIDEO = 'video'
+ARTIFACTS = (ANNOTATION, KEYFRAMES, VIDEO)
+
+DONE = 'done'
+FAILED = 'failed'
+# State of the records dropping an artifact, which are not kept once replayed
+REMOVED = 'removed'
+
+LEDGER_FILENAME = 'ledger.jsonl'
+
+
+def checksum(paths: Iterable[str], chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the concatenated contents of `paths`."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Ledger:
+    """Tracks per-artifact download state, backed by a JSONL journal."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, dict]] = {}
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'rb+') as journal:
+            complete = 0
+            for line in journal:
+                if not line.endswith(b'\n'):
+                    # The last line, cut short by an interrupted build: dropped so that the next record starts on a
+                    # line of its own. The artifact is simply retried.
+                    journal.truncate(complete)
+                    break
+                complete += len(line)
+                try:
+                    self._apply(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+    @classmethod
+    def in_dataset(cls, dataset_dir: str, shard: Shard = None) -> 'Ledger':
+        """The ledger of the dataset, or of one of its shards.
+
+        A shard starts from the records of the main ledger, e.g. those merged from an earlier sharded build, so that
+        its entries are neither downloaded again nor adopted from the files on disk, which would lose their history.
+        """
+        ledger = cls(ledger_path(dataset_dir, shard))
+        if shard is not None and os.path.exists(main_path := ledger_path(dataset_dir)):
+            ledger.merge(cls(main_path))
+        return ledger
+
+    def _apply(self, record: dict):
+        if record['state'] == REMOVED:
+            artifacts = self._records.get(record['video_id'], {})
+            artifacts.pop(record['artifact'], None)
+            if not artifacts:
+                self._records.pop(record['video_id'], None)
+            return
+        self._records.setdefault(record['video_id'], {})[record['artifact']] = record
+
+    def _append(self, record: dict):
+        with self._lock:
+            self._apply(record)
+            with open(self.path, 'a') as journal:
+                journal.write(json.dumps(record) + '\n')
+
+    def get(self, entry: MSMOEntry, artifact: str) -> Optional[dict]:
+        """The latest record of an artifact of the entry, unless it was made for another YouTube video."""
+        record = self._records.get(entry.video_id, {}).get(artifact)
+        return record if record is not None and record.get('youtube_id') == entry.youtube_id else None
+
+    def records(self) -> Dict[str, Dict[str, dict]]:
+        """The latest record of every artifact, by video id."""
+        with self._lock:
+            return {video_id: dict(artifacts) for video_id, artifacts in self._records.items()}
+
+    def state(self, entry: MSMOEntry, artifact: str) -> Optional[str]:
+        record = self.get(entry, artifact)
+        return record['state'] if record else None
+
+    def is_tracked(self, entry: MSMOEntry) -> bool:
+        return entry.video_id in self._records
+
+    def pending(self, entry: MSMOEntry) -> List[str]:
+        """Artifacts of the entry that have not been downloaded successfully."""
+        return [artifact for artifact in ARTIFACTS if self.state(entry, artifact) != DONE]
+
+    def is_complete(self, entry: MSMOEntry) -> bool:
+        return not self.pending(entry)
+
+    def record_done(self, entry: MSMOEntry, artifact: str, paths: List[str]):
+        self._append(
+            {
+                **_location(entry),
+                'artifact': artifact,
+                'state': DONE,
+                'files': len(paths),
+                'size': sum(os.path.getsize(p) for p in paths),
+                'sha256': checksum(paths),
+                'error': None,
+                'time': time.time(),
+            }
+        )
+
+    def record_failure(self, entry: MSMOEntry, artifact: str, error: Exception):
+        self._append(
+            {
+                **_location(entry),
+                'artifact': artifact,
+                'state': FAILED,
+                'files': 0,
+                'size': 0,
+                'sha256': None,
+                'error': repr(error),
+                'time': time.time(),
+            }
+        )
+
+    def record_moved(self, entry: MSMOEntry, record: dict):
+        """Record an artifact whose files were moved unchanged from another video id to the entry."""
+        self._append({**record, **_location(entry), 'time': time.time()})
+
+    def forget(self, video_id: str):
+        """Drop every record of a video id, e.g. once its files were moved or deleted."""
+        for artifact in list(self._records.get(video_id, {})):
+            self._append({'video_id': video_id, 'artifact': artifact, 'state': REMOVED, 'time': time.time()})
+
+    def adopt(self, entry: MSMOEntry) -> bool:
+        """Record an entry downloaded before the ledger existed, if all of its files are present.
+
+        Keyframes are counted from `keyframe_0.jpg` upwards until the first missing index.
+        """
+        keyframes = []
+        while os.path.exists(path := entry.keyframe_path(len(keyframes))):
+            keyframes.append(path)
+        if not (keyframes and os.path.exists(entry.annotation_path()) and os.path.exists(entry.video_path())):
+            return False
+        self.record_done(entry, ANNOTATION, [entry.annotation_path()])
+        self.record_done(entry, KEYFRAMES, keyframes)
+        self.record_done(entry, VIDEO, [entry.video_path()])
+        return True
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Count of entries in each state, per artifact."""
+        counts = {artifact: {DONE: 0, FAILED: 0} for artifact in ARTIFACTS}
+        for artifacts in self._records.values():
+            for artifact, record in artifacts.items():
+                counts[artifact][record['state']] += 1
+        return counts
+
+    def merge(self, other: 'Ledger'):
+        """Take the records of another ledger that are newer than ours, without writing them to the journal."""
+        with self._lock:
+            for video_id, artifacts in other._records.items():
+                for artifact, record in artifacts.items():
+                    current = self._records.get(video_id, {}).get(artifact)
+                    if current is None or record['time'] > current['time']:
+                        self._apply(record)
+
+    def compact(self):
+        """Rewrite the journal keeping only the latest record of each artifact."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as journal:
+                for artifacts in self._records.values():
+                    for record in artifacts.values():
+                        journal.write(json.dumps(record) + '\n')
+            os.replace(tmp_path, self.path)
+
+
+def _location(entry: MSMOEntry) -> dict:
+    """The fields identifying the entry of a record, and where its files are."""
+    return {
+        'video_id': entry.video_id,
+        'youtube_id': entry.youtube_id,
+        'category': entry.category,
+        'subcategory': entry.subcategory,
+        'index': entry.index,
+    }
+
+
+def ledger_path(dataset_dir: str, shard: Shard = None) -> str:
+    if shard is None:
+        return os.path.join(dataset_dir, LEDGER_FILENAME)
+    return os.path.join(dataset_dir, f"{LEDGER_FILENAME[:-len('.jsonl')]}.{shard.name}.jsonl")
+
+
+def shard_paths(dataset_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(dataset_dir, f"{LEDGER_FILENAME[:-len('.jsonl')]}.shard-*.jsonl")))
+
+
+def merge_shards(dataset_dir: str, remove: bool = False) -> Ledger:
+    """Merge the journals of every shard into the main ledger of the dataset, optionally removing them."""
+    ledger = Ledger.in_dataset(dataset_dir)
+    paths = shard_paths(dataset_dir)
+    for path in paths:
+        ledger.merge(Ledger(path))
+    ledger.compact()
+    if remove:
+        for path in paths:
+            os.remove(path)
+    return ledger
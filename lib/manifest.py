@@ -0,0 +1,199 @@
+"""Manifest of the built entries, and planning of the changes an edited key list calls for.
+
+Video ids are derived from the position of a YouTube id in the key files, so editing them (replacing a dead video,
+adding or removing one) can shift the ids of the videos after it. The manifest, read from the ledger, tells which
+YouTube video each video id was built from, where its files are and the state of each artifact. `plan` compares it
+with the entries of the new key list:
+    keep      entries whose video id still belongs to the same YouTube video,
+    renames   files built under another video id, moved to the new one instead of being downloaded again,
+    downloads entries whose YouTube video was never built (left to the next build),
+    deletions video ids whose YouTube video is no longer in the key list.
+`apply` carries out the renames and deletions and updates the ledger, so that the next build only downloads what
+`plan` listed. Packed shards and the index refer to video ids, so they are to be rebuilt after renames.
+"""
+
+import glob
+import json
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from lib import utils
+from lib.data import MSMOEntry
+from lib.ledger import ANNOTATION, DONE, KEYFRAMES, VIDEO, Ledger
+
+logger = utils.get_logger()
+
+STAGING_DIRNAME = '.staging'
+
+
+@dataclass
+class ManifestEntry:
+    video_id: str
+    youtube_id: str
+    # Where the files are, if known
+    entry: Optional[MSMOEntry]
+    # Latest record of each artifact
+    records: Dict[str, dict]
+
+    @property
+    def states(self) -> Dict[str, str]:
+        return {artifact: record['state'] for artifact, record in self.records.items()}
+
+    @property
+    def built(self) -> bool:
+        return self.entry is not None and any(state == DONE for state in self.states.values())
+
+
+def locate(dataset_dir: str, video_id: str, youtube_id: str) -> Optional[MSMOEntry]:
+    """The entry a video id was built as, from the path of its files, for records that do not say where they are."""
+    patterns = (
+        ('annotation', f"{video_id}.json"),
+        ('video', f"{video_id}.mp4"),
+        ('keyframe', video_id),
+    )
+    for root, name in patterns:
+        for path in glob.glob(os.path.join(glob.escape(dataset_dir), root, '*', '*', name)):
+            category, subcategory = path.split(os.sep)[-3:-1]
+            index = int(video_id[len(category[:3]) + len(subcategory[:3]):])
+            return MSMOEntry(category, subcategory, index, youtube_id, dataset_dir)
+    return None
+
+
+class Manifest:
+    """The video ids built into a dataset, with the YouTube video each one was built from."""
+
+    def __init__(self, entries: Dict[str, ManifestEntry]):
+        self.entries = entries
+
+    @classmethod
+    def from_ledger(cls, ledger: Ledger, dataset_dir: str) -> 'Manifest':
+        entries = {}
+        for video_id, records in ledger.records().items():
+            youtube_ids = {record['youtube_id'] for record in records.values()}
+            # Artifacts recorded for a previous YouTube video at the same id are stale.
+            latest = max(records.values(), key=lambda record: record['time'])
+            records = {a: r for a, r in records.items() if r['youtube_id'] == latest['youtube_id']}
+            if len(youtube_ids) > 1:
+                logger.warning(f"{video_id} has records of {sorted(youtube_ids)}; keeping {latest['youtube_id']}")
+            if 'category' in latest:
+                entry = MSMOEntry(
+                    latest['category'], latest['subcategory'], latest['index'], latest['youtube_id'], dataset_dir
+                )
+            else:
+                entry = locate(dataset_dir, video_id, latest['youtube_id'])
+            entries[video_id] = ManifestEntry(video_id, latest['youtube_id'], entry, records)
+        return cls(entries)
+
+    def by_youtube_id(self) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """youtube_id -> video_id -> artifact -> state."""
+        manifest = defaultdict(dict)
+        for video_id, entry in sorted(self.entries.items()):
+            manifest[entry.youtube_id][video_id] = entry.states
+        return dict(manifest)
+
+    def save(self, path: str):
+        utils.write_atomic(path, json.dumps(self.by_youtube_id(), indent=2, sort_keys=True))
+
+
+@dataclass
+class Plan:
+    keep: List[MSMOEntry] = field(default_factory=list)
+    # (built entry, new entry) pairs
+    renames: List[Tuple[ManifestEntry, MSMOEntry]] = field(default_factory=list)
+    downloads: List[MSMOEntry] = field(default_factory=list)
+    deletions: List[ManifestEntry] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, int]:
+        return {name: len(getattr(self, name)) for name in ('keep', 'renames', 'downloads', 'deletions')}
+
+
+def plan(manifest: Manifest, entries: Iterable[MSMOEntry]) -> Plan:
+    """The fewest downloads, renames and deletions turning the built entries into those of a new key list."""
+    entries = list(entries)
+    result = Plan()
+    kept = set()
+    for entry in entries:
+        built = manifest.entries.get(entry.video_id)
+        if built is not None and built.youtube_id == entry.youtube_id:
+            result.keep.append(entry)
+            kept.add(entry.video_id)
+    # Built video ids that can be reused, by YouTube id, in a fixed order
+    available = defaultdict(list)
+    for video_id, built in sorted(manifest.entries.items()):
+        if video_id not in kept:
+            available[built.youtube_id].append(built)
+    for entry in entries:
+        if entry.video_id in kept:
+            continue
+        sources = [built for built in available.get(entry.youtube_id, ()) if built.built]
+        if sources:
+            available[entry.youtube_id].remove(sources[0])
+            result.renames.append((sources[0], entry))
+        else:
+            result.downloads.append(entry)
+    result.deletions = [built for sources in available.values() for built in sources]
+    return result
+
+
+def _files(entry: MSMOEntry) -> Dict[str, str]:
+    return {ANNOTATION: entry.annotation_path(), KEYFRAMES: entry.keyframe_dir, VIDEO: entry.video_path()}
+
+
+def _rewrite_annotation(path: str, entry: MSMOEntry):
+    """Update the fields of an annotation that depend on its video id."""
+    with open(path, 'r') as f:
+        annotation = json.load(f)
+    annotation['info'].update(video_id=entry.video_id, category=entry.category, sub_category=entry.subcategory)
+    utils.write_atomic(path, json.dumps(annotation, indent=2))
+
+
+def apply(result: Plan, ledger: Ledger, dataset_dir: str):
+    """Carry out the renames and deletions of a plan, recording them in the ledger.
+
+    Files being renamed are first moved out of the way into a staging directory, so that video ids can be exchanged
+    between entries (and deleted ones reused) without overwriting each other.
+    """
+    staging = os.path.join(dataset_dir, STAGING_DIRNAME, uuid.uuid4().hex)
+    staged = []
+    for built, entry in result.renames:
+        stage_dir = os.path.join(staging, built.video_id)
+        utils.make_dirs(stage_dir)
+        for artifact, path in _files(built.entry).items():
+            if os.path.exists(path):
+                os.replace(path, os.path.join(stage_dir, artifact))
+        staged.append((built, entry, stage_dir))
+    for built in result.deletions:
+        if built.entry is not None:
+            for path in _files(built.entry).values():
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+        ledger.forget(built.video_id)
+    for built, _, _ in staged:
+        ledger.forget(built.video_id)
+    for built, entry, stage_dir in staged:
+        utils.make_dirs(entry.annotation_dir, entry.video_dir, os.path.dirname(entry.keyframe_dir))
+        for artifact, path in _files(entry).items():
+            staged_path = os.path.join(stage_dir, artifact)
+            if os.path.exists(staged_path):
+                # The new video id may hold files of a YouTube video that is not built yet.
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                os.replace(staged_path, path)
+        for artifact, record in built.records.items():
+            if record['state'] != DONE:
+                continue
+            if artifact == ANNOTATION:
+                _rewrite_annotation(entry.annotation_path(), entry)
+                ledger.record_done(entry, ANNOTATION, [entry.annotation_path()])
+            else:
+                ledger.record_moved(entry, record)
+    if staged:
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.listdir(os.path.dirname(staging)):
+            os.rmdir(os.path.dirname(staging))
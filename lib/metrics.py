@@ -0,0 +1,203 @@
+"""Lightweight instrumentation of the download pipeline.
+
+Stages are timed with `span`, which records the latency into a histogram labelled by stage and counts the spans that
+raised. Counters (retries, bytes downloaded, throttled responses, ...) are incremented with `increment`. Everything is
+kept in memory behind one lock, so it is cheap enough to leave on; at the end of a run the metrics are printed as a
+table with `summary` and can be exported to a Prometheus text file or appended to a JSONL file with `export`.
+"""
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120., 300.)
+STAGE_SECONDS = 'stage_seconds'
+STAGE_ERRORS = 'stage_errors'
+PREFIX = 'msmo_'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # The last count is of observations above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, or the maximum if it is above every bucket."""
+        if self.count == 0:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'max': round(self.max, 6),
+            'buckets': dict(zip(map(str, self.buckets), self.counts)),
+        }
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    items = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+class Registry:
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a stage of the pipeline, counting it as an error if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(STAGE_ERRORS, stage=stage)
+            raise
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self.histograms.get((name, _labels(labels)))
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for (other, labels), value in sorted(self.counters.items()):
+                    if other == name:
+                        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (other, labels), histogram in sorted(self.histograms.items()):
+                    if other != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf', ), histogram.counts):
+                        cumulative += count
+                        le = 'le="' + str(bound) + '"'
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'time': time.time(),
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def summary(self) -> str:
+        """A table of the latency of each stage, followed by the counters."""
+        rows: List[str] = [
+            f"{'stage':>14} {'count':>7} {'errors':>7} {'total s':>9} {'mean ms':>9} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>9}"
+        ]
+        with self._lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name != STAGE_SECONDS:
+                    continue
+                stage = dict(labels)['stage']
+                errors = self.counters.get((STAGE_ERRORS, labels), 0)
+                rows.append(
+                    f"{stage:>14} {histogram.count:>7} {errors:>7} {histogram.sum:>9.2f} "
+                    f"{1000 * histogram.sum / histogram.count:>9.1f} {1000 * histogram.quantile(0.5):>8.0f} "
+                    f"{1000 * histogram.quantile(0.99):>8.0f} {1000 * histogram.max:>9.1f}"
+                )
+            for (name, labels), value in sorted(self.counters.items()):
+                if name != STAGE_ERRORS:
+                    rows.append(f"{name}{_format_labels(labels)}: {value:,.0f}")
+        return '\n'.join(rows)
+
+
+_registry = Registry()
+
+
+def get_registry() -> Registry:
+    return _registry
+
+
+def increment(name: str, value: float = 1, **labels):
+    _registry.increment(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    _registry.observe(name, value, **labels)
+
+
+def span(stage: str):
+    return _registry.span(stage)
+
+
+def summary() -> str:
+    return _registry.summary()
+
+
+def export(path: str):
+    """Write the metrics to a Prometheus text file if `path` ends with `.prom`, or append them to a JSONL file."""
+    if path.endswith('.prom'):
+        with open(path, 'w') as f:
+            f.write(_registry.to_prometheus())
+    else:
+        with open(path, 'a') as f:
+            f.write(json.dumps(_registry.to_dict()) + '\n')
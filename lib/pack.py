@@ -0,0 +1,176 @@
+"""Packing of the dataset into sequential tar shards, in the WebDataset layout.
+
+Each entry becomes one sample: consecutive tar members sharing the video id as key, one per file:
+    <video_id>.json                 the annotation
+    <video_id>.keyframe_<i>.jpg     every keyframe
+    <video_id>.mp4                  the video, if included
+Shards `<prefix>-000000.tar`, `<prefix>-000001.tar`, ... are filled up to `max_bytes` each, so data loaders read a
+few large files sequentially instead of tens of thousands of small ones. `index.jsonl` records the byte offset of
+every member, for random access to a single sample without scanning its shard.
+"""
+
+import io
+import json
+import os
+import tarfile
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from lib.data import MSMOEntry
+
+INDEX_FILENAME = 'index.jsonl'
+KEY = '__key__'
+
+
+def entry_files(entry: MSMOEntry, include_video: bool = True) -> Dict[str, str]:
+    """The files of an entry by their extension in the sample, counting keyframes until the first missing one."""
+    files = {'json': entry.annotation_path()}
+    i = 0
+    while os.path.exists(path := entry.keyframe_path(i)):
+        files[f"keyframe_{i}.jpg"] = path
+        i += 1
+    if include_video:
+        files['mp4'] = entry.video_path()
+    return files
+
+
+def load_index(shards_dir: str) -> Dict[str, dict]:
+    """The index of the packed samples by key. Lines of samples cut short by an interrupted write are skipped."""
+    index = {}
+    path = os.path.join(shards_dir, INDEX_FILENAME)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                index[record['key']] = record
+    return index
+
+
+class ShardWriter:
+    """Appends samples to tar shards in `shards_dir`, starting a new shard once the current one exceeds `max_bytes`.
+
+    Existing shards are never modified: reopening a directory continues with a new shard, and samples already in the
+    index are reported by `__contains__` so that they can be skipped. Safe to use from several threads.
+    """
+
+    def __init__(self, shards_dir: str, prefix: str = 'msmo', max_bytes: int = 1 << 30):
+        os.makedirs(shards_dir, exist_ok=True)
+        self.shards_dir = shards_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.keys = set(load_index(shards_dir))
+        self._shard = len([f for f in os.listdir(shards_dir) if f.startswith(f"{prefix}-") and f.endswith('.tar')])
+        self._tar = None
+        self._name = None
+        self._index = open(os.path.join(shards_dir, INDEX_FILENAME), 'a')
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_next(self):
+        self._close_current()
+        self._name = f"{self.prefix}-{self._shard:06d}.tar"
+        self._shard += 1
+        self._tar = tarfile.open(os.path.join(self.shards_dir, self._name), 'w', format=tarfile.USTAR_FORMAT)
+
+    def _close_current(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def _add(self, name: str, content: Union[str, bytes]) -> Tuple[int, int]:
+        """Add a member from a path or bytes, returning the offset and size of its data."""
+        info = tarfile.TarInfo(name)
+        if isinstance(content, bytes):
+            info.size = len(content)
+            fileobj = io.BytesIO(content)
+        else:
+            # Always a regular member: `gettarinfo` would store the paths sharing an inode, e.g. keyframes hardlinked
+            # to the same blob, as empty links to the first one.
+            stat = os.stat(content)
+            info.size, info.mtime = stat.st_size, stat.st_mtime
+            fileobj = open(content, 'rb')
+        with fileobj:
+            header = len(info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors))
+            offset = self._tar.offset + header
+            self._tar.addfile(info, fileobj)
+        return offset, info.size
+
+    def write(self, key: str, files: Dict[str, Union[str, bytes]]):
+        """Append a sample made of `files`, given by extension as paths or contents."""
+        size = sum(len(c) if isinstance(c, bytes) else os.path.getsize(c) for c in files.values())
+        with self._lock:
+            if self._tar is None or (self._tar.offset > 0 and self._tar.offset + size > self.max_bytes):
+                self._open_next()
+            start = self._tar.offset
+            members = {extension: self._add(f"{key}.{extension}", content) for extension, content in files.items()}
+            record = {
+                'key': key,
+                'shard': self._name,
+                'offset': start,
+                'size': self._tar.offset - start,
+                'members': members,
+            }
+            # The shard is flushed before the index, so an indexed sample is always readable.
+            self._tar.fileobj.flush()
+            self._index.write(json.dumps(record) + '\n')
+            self._index.flush()
+            self.keys.add(key)
+
+    def write_entry(self, entry: MSMOEntry, include_video: bool = True):
+        self.write(entry.video_id, entry_files(entry, include_video))
+
+    def close(self):
+        with self._lock:
+            self._close_current()
+            self._index.close()
+
+
+def read_sample(shards_dir: str, key: str, index: Dict[str, dict] = None) -> Dict[str, bytes]:
+    """Read one sample by key, seeking to its members through the index."""
+    record = (index if index is not None else load_index(shards_dir))[key]
+    sample = {KEY: key}
+    with open(os.path.join(shards_dir, record['shard']), 'rb') as f:
+        for extension, (offset, size) in record['members'].items():
+            f.seek(offset)
+            sample[extension] = f.read(size)
+    return sample
+
+
+def shard_paths(shards_dir: str) -> List[str]:
+    return sorted(os.path.join(shards_dir, f) for f in os.listdir(shards_dir) if f.endswith('.tar'))
+
+
+def iter_samples(shards: Iterable[Union[str, io.IOBase]], extensions: Optional[Iterable[str]] = None) -> Iterator[dict]:
+    """Stream the samples of the given shards (paths or binary streams) in order, without extracting them.
+
+    Each sample is a dict of member contents by extension, with its key under `__key__`. With `extensions`, only the
+    members with one of those extensions are read (e.g. `('json', )` to skip keyframes and videos).
+    """
+    wanted = set(extensions) if extensions is not None else None
+    for shard in shards:
+        fileobj = open(shard, 'rb') if isinstance(shard, str) else shard
+        with fileobj, tarfile.open(fileobj=fileobj, mode='r|') as tar:
+            sample = None
+            for member in tar:
+                if not member.isfile():
+                    continue
+                key, _, extension = member.name.partition('.')
+                if sample is None or sample[KEY] != key:
+                    if sample is not None:
+                        yield sample
+                    sample = {KEY: key}
+                if wanted is None or extension in wanted:
+                    sample[extension] = tar.extractfile(member).read()
+            if sample is not None:
+                yield sample
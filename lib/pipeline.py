@@ -0,0 +1,241 @@
+"""Staged download of dataset entries.
+
+`fetch.Video.download` goes through the steps of an entry one after the other: metadata, then the keyframes and the
+transcript, then the annotation, then the video stream. `Pipeline` runs the same steps as separate stages connected by
+queues, each stage with its own pool of worker threads:
+
+    metadata ─┬─> keyframes  ─┬─> annotation, written by whichever of the two finishes last
+              ├─> transcript ─┘
+              └─> video
+
+Metadata keeps being resolved and annotations keep being written while slow video streams download. Every queue
+holds at most `backlog` entries, so a stage that falls behind eventually blocks the stages feeding it instead of
+letting entries pile up in memory; the video queue gets the largest backlog, since it is the slowest stage.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from lib import metrics
+from lib import scheduler
+from lib import utils
+from lib.backend import Backend
+from lib.data import MSMOEntry
+from lib.fetch import Video
+from lib.ledger import ANNOTATION, ARTIFACTS, KEYFRAMES, VIDEO, Ledger
+
+logger = utils.get_logger()
+
+METADATA_STAGE = 'metadata'
+KEYFRAMES_STAGE = 'keyframes'
+TRANSCRIPT_STAGE = 'transcript'
+VIDEO_STAGE = 'video'
+STAGES = (METADATA_STAGE, KEYFRAMES_STAGE, TRANSCRIPT_STAGE, VIDEO_STAGE)
+QUEUE_SECONDS = 'queue_seconds'
+
+
+@dataclass
+class Workers:
+    """Number of worker threads of each stage."""
+    metadata: int = 4
+    keyframes: int = 4
+    transcript: int = 4
+    video: int = 4
+
+    def backlog(self, stage: str) -> int:
+        """Capacity of the queue of a stage."""
+        return getattr(self, stage) * (8 if stage == VIDEO_STAGE else 2)
+
+
+class _Job:
+    """An entry going through the stages. `parts` counts the annotation and the video while they are pending."""
+
+    def __init__(self, entry: MSMOEntry):
+        self.entry = entry
+        self.video: Optional[Video] = None
+        self.parts = 0
+        self.annotation_parts = 0
+        self.summary = None
+        self.transcript = None
+        self.annotation_error: Optional[Exception] = None
+        self.errors: List[Exception] = []
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def part_done(self) -> bool:
+        """Count down the annotation or the video, returning whether the entry is done."""
+        with self.lock:
+            self.parts -= 1
+            return self.parts == 0
+
+    def annotation_part_done(self) -> bool:
+        """Count down the keyframes or the transcript, returning whether the annotation can be written."""
+        with self.lock:
+            self.annotation_parts -= 1
+            return self.annotation_parts == 0
+
+    def finish(self) -> bool:
+        """Mark the entry as done, returning whether it was not already."""
+        with self.lock:
+            first, self.finished = not self.finished, True
+            return first
+
+
+class Pipeline:
+    """Downloads the pending artifacts of entries through the stages, recording outcomes in the ledger.
+
+    `pending(entry)` gives the artifacts still to download (all of them by default), and `on_done(entry)` is called
+    once every stage is done with an entry, e.g. to pack it.
+    """
+
+    def __init__(
+        self,
+        backend: Backend,
+        limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED,
+        ledger: Ledger = None,
+        workers: Workers = None,
+        pending: Callable[[MSMOEntry], Iterable[str]] = None,
+        on_done: Callable[[MSMOEntry], None] = None,
+    ):
+        self.backend = backend
+        self.limiter = limiter
+        self.ledger = ledger
+        self.workers = workers or Workers()
+        self.pending = pending or (lambda entry: ARTIFACTS)
+        self.on_done = on_done
+        self._handlers = {
+            METADATA_STAGE: self._metadata,
+            KEYFRAMES_STAGE: self._keyframes,
+            TRANSCRIPT_STAGE: self._transcript,
+            VIDEO_STAGE: self._video,
+        }
+        self._queues = {stage: queue.Queue(self.workers.backlog(stage)) for stage in STAGES}
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._failures: List[Tuple[MSMOEntry, Exception]] = []
+        self._progress = None
+
+    def run(self, entries: Iterable[MSMOEntry], progress=None) -> List[Tuple[MSMOEntry, Exception]]:
+        """Download every entry, returning the entries that failed with their first error.
+
+        `entries` may be a lazy generator: it is only read as fast as the metadata stage keeps up.
+        """
+        self._failures, self._progress = [], progress
+        threads = [
+            threading.Thread(target=self._work, args=(stage, ), name=f"{stage}-{i}", daemon=True)
+            for stage in STAGES for i in range(getattr(self.workers, stage))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for entry in entries:
+                with self._idle:
+                    self._in_flight += 1
+                self._put(METADATA_STAGE, _Job(entry))
+        finally:
+            with self._idle:
+                self._idle.wait_for(lambda: self._in_flight == 0)
+            for stage in STAGES:
+                for _ in range(getattr(self.workers, stage)):
+                    self._queues[stage].put(None)
+            for thread in threads:
+                thread.join()
+        return self._failures
+
+    def _put(self, stage: str, job: _Job):
+        self._queues[stage].put((job, time.perf_counter()))
+
+    def _work(self, stage: str):
+        handle = self._handlers[stage]
+        while (item := self._queues[stage].get()) is not None:
+            job, queued_at = item
+            metrics.observe(QUEUE_SECONDS, time.perf_counter() - queued_at, stage=stage)
+            try:
+                handle(job)
+            except Exception as e:
+                # Handlers deal with their own errors; anything else must not leave the entry in flight.
+                logger.exception(f"Unexpected error in stage {stage} for {job.entry.video_id}")
+                job.errors.append(e)
+                self._finish(job)
+
+    def _metadata(self, job: _Job):
+        try:
+            artifacts = list(self.pending(job.entry))
+            if artifacts:
+                logger.info(f"Downloading {job.entry.video_id} ({job.entry.youtube_id})")
+                job.video = Video(job.entry, limiter=self.limiter, ledger=self.ledger, backend=self.backend)
+        except Exception as e:
+            job.errors.append(e)
+            artifacts = []
+        annotation = ANNOTATION in artifacts or KEYFRAMES in artifacts
+        job.annotation_parts = 2 if annotation else 0
+        job.parts = int(annotation) + int(VIDEO in artifacts)
+        if job.parts == 0:
+            self._finish(job)
+            return
+        if annotation:
+            self._put(KEYFRAMES_STAGE, job)
+            self._put(TRANSCRIPT_STAGE, job)
+        if VIDEO in artifacts:
+            self._put(VIDEO_STAGE, job)
+
+    def _keyframes(self, job: _Job):
+        try:
+            job.summary = job.video.get_summary()
+        except Exception as e:
+            job.annotation_error = e
+        self._annotation_part_done(job)
+
+    def _transcript(self, job: _Job):
+        try:
+            job.transcript = job.video.get_transcript()
+        except Exception as e:
+            job.annotation_error = e
+        self._annotation_part_done(job)
+
+    def _annotation_part_done(self, job: _Job):
+        if not job.annotation_part_done():
+            return
+        try:
+            if job.annotation_error is not None:
+                job.errors.append(job.annotation_error)
+                job.video.record_annotation_failure(job.annotation_error)
+            else:
+                job.video.write_annotation(job.summary, job.transcript)
+        except Exception as e:
+            job.errors.append(e)
+        if job.part_done():
+            self._finish(job)
+
+    def _video(self, job: _Job):
+        try:
+            job.video.download_video()
+        except Exception as e:
+            job.errors.append(e)
+        if job.part_done():
+            self._finish(job)
+
+    def _finish(self, job: _Job):
+        # An unexpected error finishes the entry early, so a stage still running may reach here once more.
+        if not job.finish():
+            return
+        try:
+            if self.on_done is not None:
+                try:
+                    self.on_done(job.entry)
+                except Exception as e:
+                    job.errors.append(e)
+            job.video = job.summary = job.transcript = None
+            if job.errors:
+                logger.error(f"Failed to download {job.entry.video_id} ({job.entry.youtube_id}): {job.errors[0]!r}")
+                with self._idle:
+                    self._failures.append((job.entry, job.errors[0]))
+            if self._progress is not None:
+                self._progress.update(1)
+        finally:
+            with self._idle:
+                self._in_flight -= 1
+                self._idle.notify_all()
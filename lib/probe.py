@@ -0,0 +1,110 @@
+"""Table of the stream formats available for each video.
+
+Resolving a video's stream manifest is expensive, so it is done once per video and the available formats (itag,
+resolution, mime type, fps and size) are stored in the cache. Availability checks and the choice of stream to
+download then query that table instead of resolving the manifest again.
+"""
+
+from dataclasses import asdict, dataclass, replace
+from typing import List, Optional
+
+import pytube
+
+from lib import cache
+from lib import scheduler
+
+STREAMS = 'streams'
+
+HIGHEST = 'highest'
+LOWEST = 'lowest'
+SMALLEST = 'smallest'
+PREFERENCES = (HIGHEST, LOWEST, SMALLEST)
+
+
+@dataclass(frozen=True)
+class StreamFormat:
+    itag: int
+    mime_type: str
+    resolution: Optional[str]
+    fps: Optional[int]
+    # Size in bytes advertised by the manifest, or `None` if it does not say.
+    filesize: Optional[int]
+    progressive: bool
+
+    @property
+    def height(self) -> int:
+        return int(self.resolution[:-1]) if self.resolution else 0
+
+
+@dataclass(frozen=True)
+class StreamPolicy:
+    """Which stream to download: the `prefer`red progressive MP4 stream no taller than `max_res` pixels."""
+    max_res: Optional[int] = None
+    prefer: str = HIGHEST
+
+
+_policy = StreamPolicy()
+
+
+def configure(**kwargs):
+    global _policy
+    _policy = replace(_policy, **kwargs)
+
+
+def get_policy() -> StreamPolicy:
+    return _policy
+
+
+def formats_of(streams: pytube.StreamQuery) -> List[StreamFormat]:
+    return [
+        StreamFormat(
+            itag=stream.itag,
+            mime_type=stream.mime_type,
+            resolution=stream.resolution,
+            fps=getattr(stream, 'fps', None),
+            # Read the size from the manifest rather than `filesize`, which sends a HEAD request when it is missing.
+            filesize=stream._filesize or None,
+            progressive=stream.is_progressive,
+        ) for stream in streams
+    ]
+
+
+def record(youtube_id: str, streams: pytube.StreamQuery) -> List[StreamFormat]:
+    """Store the formats of already resolved `streams` in the table."""
+    formats = formats_of(streams)
+    if (store := cache.get_cache()) is not None:
+        store.put_json(STREAMS, youtube_id, [asdict(f) for f in formats])
+    return formats
+
+
+def formats(youtube_id: str, limiter: scheduler.TrafficLimiter = scheduler.UNLIMITED) -> List[StreamFormat]:
+    """Formats available for a video, resolving its stream manifest only if it is not in the table yet."""
+
+    def resolve():
+        yt = cache.youtube(youtube_id, limiter=limiter)
+        with limiter.slot(scheduler.METADATA, yt.watch_url):
+            return [asdict(f) for f in formats_of(yt.streams)]
+
+    store = cache.get_cache()
+    rows = resolve() if store is None else store.fetch_json(STREAMS, youtube_id, resolve)
+    return [StreamFormat(**row) for row in rows]
+
+
+def has_format(formats: List[StreamFormat], resolution: str, subtype: str = 'mp4') -> bool:
+    return any(f.resolution == resolution and f.mime_type == f"video/{subtype}" for f in formats)
+
+
+def select(formats: List[StreamFormat], policy: StreamPolicy = None) -> Optional[StreamFormat]:
+    """The progressive MP4 format to download under `policy` (the configured one by default)."""
+    policy = policy or get_policy()
+    candidates = [
+        f for f in formats if f.progressive and f.mime_type == 'video/mp4' and f.resolution and
+        (policy.max_res is None or f.height <= policy.max_res)
+    ]
+    if not candidates:
+        return None
+    if policy.prefer == LOWEST:
+        return min(candidates, key=lambda f: f.height)
+    if policy.prefer == SMALLEST:
+        return min(candidates, key=lambda f: (f.filesize is None, f.filesize or 0, f.height))
+    return max(candidates, key=lambda f: f.height)
@@ -0,0 +1,109 @@
+"""Concurrent scheduling of dataset entry downloads.
+
+Entries are independent of each other, so the builder can run several of them at once. Outbound traffic is split
+into three kinds (watch page metadata, keyframe thumbnails and video streams), each with its own concurrency limit,
+and every request to a host additionally goes through that host's adaptive rate limiter (see `lib.throttle`).
+"""
+
+import contextlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from lib import throttle
+from lib import utils
+from lib.data import MSMOEntry
+
+logger = utils.get_logger()
+
+METADATA = 'metadata'
+THUMBNAIL = 'thumbnail'
+VIDEO = 'video'
+
+
+@dataclass
+class Limits:
+    """Concurrency limits for each kind of traffic. `None` means unbounded."""
+    metadata: Optional[int] = None
+    thumbnail: Optional[int] = None
+    video: Optional[int] = None
+
+
+class TrafficLimiter:
+    """Bounds concurrent requests per traffic kind and rate-limits requests to each host."""
+
+    def __init__(self, limits: Limits = None):
+        self.limits = limits or Limits()
+        self._semaphores = {
+            kind: threading.BoundedSemaphore(limit) if limit else None
+            for kind, limit in (
+                (METADATA, self.limits.metadata),
+                (THUMBNAIL, self.limits.thumbnail),
+                (VIDEO, self.limits.video),
+            )
+        }
+
+    @contextlib.contextmanager
+    def slot(self, kind: str, url: str = None):
+        """Hold a slot of the given traffic kind for the duration of a request to `url`.
+
+        An exception raised by a throttled request slows down the host. A clean exit counts as a healthy response,
+        unless a throttled response was received meanwhile (e.g. by `utils.download_blob`, which returns `False`).
+        """
+        semaphore = self._semaphores[kind]
+        with semaphore if semaphore is not None else contextlib.nullcontext():
+            rate_limiter = throttle.limiter_for(throttle.host_of(url)) if url else None
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            throttle.begin_request()
+            try:
+                yield
+            except BaseException as e:
+                throttled, retry_after = throttle.throttle_of(e)
+                if throttled and rate_limiter is not None:
+                    rate_limiter.on_throttle(retry_after)
+                raise
+            if rate_limiter is not None and not throttle.was_throttled():
+                rate_limiter.on_success()
+
+
+UNLIMITED = TrafficLimiter()
+
+
+def run(
+    entries: Iterable[MSMOEntry],
+    download: Callable[[MSMOEntry], None],
+    workers: int,
+    progress=None,
+) -> List[Tuple[MSMOEntry, Exception]]:
+    """Call `download` on every entry using a pool of `workers` threads.
+
+    At most `2 * workers` entries are in flight at once, so `entries` may be a lazy generator. A failing entry is
+    logged and does not stop the others; the failures are returned once every entry has been processed.
+    """
+    failures = []
+    entries = iter(entries)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def submit(n):
+            for entry in entries:
+                pending[pool.submit(download, entry)] = entry
+                n -= 1
+                if n <= 0:
+                    break
+
+        submit(2 * workers)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    logger.error(f"Failed to download {entry.video_id} ({entry.youtube_id}): {error!r}")
+                    failures.append((entry, error))
+                if progress is not None:
+                    progress.update(1)
+            submit(len(done))
+    return failures
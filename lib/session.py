@@ -0,0 +1,93 @@
+"""Process-wide pooled HTTP session.
+
+Reusing one `requests.Session` keeps connections to the image CDN alive between keyframes, instead of paying a new
+TCP+TLS handshake for every thumbnail. Transient failures (429 and 5xx) are retried with exponential backoff, and
+reported to the adaptive rate limiter of their host.
+"""
+
+import threading
+from dataclasses import dataclass, replace
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from lib import throttle
+
+
+@dataclass(frozen=True)
+class SessionConfig:
+    # Number of connections kept alive per host; should be at least the number of concurrent downloads.
+    pool_size: int = 32
+    connect_timeout: float = 10.
+    read_timeout: float = 60.
+    chunk_size: int = 64 * 1024
+    retries: int = 3
+    backoff_factor: float = 0.5
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+
+RETRY_STATUSES = throttle.THROTTLE_STATUSES
+
+_lock = threading.Lock()
+_config = SessionConfig()
+_session = None
+
+
+class ThrottledRetry(Retry):
+    """Reports the throttled responses that urllib3 retries by itself, which the response hook never sees."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        # Only reached when the request is retried: the response exhausting the retries goes to the response hook.
+        if response is not None and _pool is not None and response.status in throttle.THROTTLE_STATUSES:
+            throttle.report_throttle(_netloc(_pool), response.headers)
+        return retry
+
+
+def _netloc(pool) -> str:
+    """The host of a connection pool as `throttle.host_of` gives it for its urls."""
+    default_port = 443 if pool.scheme == 'https' else 80
+    return pool.host if pool.port in (None, default_port) else f"{pool.host}:{pool.port}"
+
+
+def build_session(config: SessionConfig) -> requests.Session:
+    retry = ThrottledRetry(
+        total=config.retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=('GET', 'HEAD'),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=config.pool_size, pool_maxsize=config.pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(throttle.observe_response)
+    return session
+
+
+def configure(**kwargs):
+    """Update the session configuration. The shared session is rebuilt on its next use."""
+    global _config, _session
+    with _lock:
+        _config = replace(_config, **kwargs)
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get_config() -> SessionConfig:
+    return _config
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = build_session(_config)
+        return _session
@@ -0,0 +1,172 @@
+"""Adaptive per-host rate control for outbound requests.
+
+Each host gets a token bucket whose rate follows AIMD (additive increase, multiplicative decrease): every healthy
+response raises the rate by `increase` requests/second up to `max_rate`, and every throttled response (429 or 5xx)
+multiplies it by `decrease` down to `min_rate`. Throttled responses to requests that were in flight together only
+decrease the rate once. A `Retry-After` header pauses the host for the given time.
+"""
+
+import threading
+import time
+import urllib.error
+import urllib.parse
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+import requests
+from youtube_transcript_api import TooManyRequests
+
+from lib import metrics as run_metrics
+
+THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class ThrottleConfig:
+    # Starting rate in requests per second per host; 0 disables rate control.
+    rate: float = 0.
+    min_rate: float = 0.1
+    # Ceiling for the rate, `None` meaning four times the starting rate.
+    max_rate: Optional[float] = None
+    increase: float = 0.05
+    decrease: float = 0.5
+    # Number of requests that may be sent back to back after an idle period.
+    burst: float = 1.
+
+
+class AdaptiveRateLimiter:
+    """Token bucket with an AIMD-controlled rate."""
+
+    def __init__(self, config: ThrottleConfig):
+        self.config = config
+        self.rate = config.rate
+        self.max_rate = config.max_rate or 4 * config.rate
+        self.requests = 0
+        self.successes = 0
+        self.throttle_events = 0
+        self.waited = 0.
+        self._tokens = config.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.
+        self._decreased_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.config.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token, possibly one that only becomes available in the future.
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.)
+            self.requests += 1
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.config.increase)
+
+    def on_throttle(self, retry_after: float = None):
+        with self._lock:
+            self.throttle_events += 1
+            now = time.monotonic()
+            # Requests sent at the old rate keep failing for a while; only react once per token interval.
+            if now - self._decreased_at >= 1 / self.rate:
+                self.rate = max(self.config.min_rate, self.rate * self.config.decrease)
+                self._decreased_at = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            'rate': round(self.rate, 3),
+            'requests': self.requests,
+            'successes': self.successes,
+            'throttle_events': self.throttle_events,
+            'waited_seconds': round(self.waited, 3),
+        }
+
+
+_config = ThrottleConfig()
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_lock = threading.Lock()
+# Whether a response received by the current thread was throttled, for requests that report it without raising
+_local = threading.local()
+
+
+def configure(**kwargs):
+    """Update the configuration and reset the rate of every host."""
+    global _config
+    with _lock:
+        _config = replace(_config, **kwargs)
+        _limiters.clear()
+
+
+def get_config() -> ThrottleConfig:
+    return _config
+
+
+def host_of(url: str) -> str:
+    return urllib.parse.urlsplit(url).netloc
+
+
+def limiter_for(host: str) -> Optional[AdaptiveRateLimiter]:
+    """The rate limiter of a host, or `None` if rate control is disabled."""
+    if _config.rate <= 0:
+        return None
+    with _lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveRateLimiter(_config)
+        return _limiters[host]
+
+
+def metrics() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        return {host: limiter.metrics() for host, limiter in sorted(_limiters.items())}
+
+
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers.get('Retry-After')) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def throttle_of(error: BaseException):
+    """Whether an exception means the server is throttling us, and the `Retry-After` it asked for if any."""
+    if isinstance(error, TooManyRequests):
+        return True, None
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in THROTTLE_STATUSES, _retry_after(error.headers)
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in THROTTLE_STATUSES, _retry_after(error.response.headers)
+    return False, None
+
+
+def begin_request():
+    """Forget the throttled responses previously received by the current thread."""
+    _local.throttled = False
+
+
+def was_throttled() -> bool:
+    """Whether the current thread received a throttled response since `begin_request`."""
+    return getattr(_local, 'throttled', False)
+
+
+def report_throttle(host: str, headers=None):
+    """Report a throttled response of `host` to its rate limiter."""
+    _local.throttled = True
+    run_metrics.increment('throttled_responses', host=host)
+    limiter = limiter_for(host)
+    if limiter is not None:
+        limiter.on_throttle(_retry_after(headers))
+
+
+def observe_response(response: requests.Response, *args, **kwargs):
+    """`requests` response hook reporting throttled responses to the rate limiter of their host."""
+    if response.status_code in THROTTLE_STATUSES:
+        report_throttle(host_of(response.url), response.headers)
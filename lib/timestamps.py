@@ -0,0 +1,74 @@
+"""Conversion between seconds and the `HH:MM:SS` timestamps of the annotations.
+
+Timestamps are always in whole seconds: fractions are floored when formatting, and hours keep counting past 24. The
+`*_array` functions convert every timestamp of a column (all the transcript lines of a video, all the segments of a
+subcategory) at once, by laying the characters out as a `(n, 8)` array of bytes, rather than formatting or parsing
+each timestamp on its own.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+_ZERO, _COLON = ord('0'), ord(':')
+# Columns of the digits in `HH:MM:SS`, and their weight in seconds
+_DIGITS = np.array([0, 1, 3, 4, 6, 7])
+_WEIGHTS = np.array([36000, 3600, 600, 60, 10, 1])
+
+
+def to_timestamp(seconds: float) -> str:
+    hours, rest = divmod(int(seconds // 1), 3600)
+    return f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+def to_seconds(timestamp: str) -> int:
+    """Parse a `HH:MM:SS` timestamp, with at least two digits of hours, raising a `ValueError` on any other format."""
+    parts = timestamp.split(':')
+    if not (
+        len(parts) == 3 and len(parts[0]) >= 2 and len(parts[1]) == len(parts[2]) == 2 and
+        all(part.isascii() and part.isdigit() for part in parts)
+    ):
+        raise ValueError(f"Timestamp `{timestamp}` is not in expected format HH:MM:SS")
+    return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+
+
+def to_timestamps(seconds) -> List[str]:
+    """Format an array (or sequence) of seconds."""
+    seconds = np.floor(np.asarray(seconds, dtype=np.float64)).astype(np.int64)
+    if len(seconds) == 0:
+        return []
+    if seconds.min() < 0 or seconds.max() >= 100 * 3600:
+        return [to_timestamp(value) for value in seconds.tolist()]
+    hours, rest = np.divmod(seconds, 3600)
+    minutes, secs = np.divmod(rest, 60)
+    chars = np.full((len(seconds), 8), _COLON, dtype=np.uint8)
+    for column, value in ((0, hours), (3, minutes), (6, secs)):
+        chars[:, column] = value // 10 + _ZERO
+        chars[:, column + 1] = value % 10 + _ZERO
+    text = chars.tobytes().decode('ascii')
+    return [text[i:i + 8] for i in range(0, len(text), 8)]
+
+
+def to_seconds_array(timestamps: Sequence[str]) -> np.ndarray:
+    """Parse a sequence of timestamps into an array of seconds, raising a `ValueError` if any is malformed."""
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int32)
+    if set(map(len, timestamps)) != {8}:
+        # Timestamps of 100 hours or more, or malformed ones
+        return np.array([to_seconds(timestamp) for timestamp in timestamps], dtype=np.int32)
+    # Non-ASCII characters become `?`, which fails the checks below
+    text = ''.join(timestamps).encode('ascii', errors='replace')
+    chars = np.frombuffer(text, dtype=np.uint8).reshape(-1, 8)
+    digits = chars[:, _DIGITS].astype(np.int32) - _ZERO
+    if (digits < 0).any() or (digits > 9).any() or (chars[:, [2, 5]] != _COLON).any():
+        bad = next(t for t in timestamps if not _well_formed(t))
+        raise ValueError(f"Timestamp `{bad}` is not in expected format HH:MM:SS")
+    return digits @ _WEIGHTS.astype(np.int32)
+
+
+def _well_formed(timestamp: str) -> bool:
+    try:
+        to_seconds(timestamp)
+    except ValueError:
+        return False
+    return True
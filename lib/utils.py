@@ -2,54 +2,83 @@
 
 import functools
 import logging
-import math
 import os
 import time
 import re
 import requests
 
+from lib import metrics
+from lib import session as http_session
+from lib import timestamps
 
-def retry(tries: int = 2):
-    """Try a function multiple times before failing."""
+
+def retry(tries: int = 2, backoff: float = 0.):
+    """Try a function multiple times before failing.
+
+    The decorated function returns a tuple `(result, None)` on success, or `(None, error)` combining the errors of
+    every attempt. Attempts are spaced out by `backoff`, doubling after each failure.
+    """
     def retry_decorator(func):
-        @functools.wraps
+        @functools.wraps(func)
         def retryable(*args, **kwargs):
-            nonlocal tries
             errors = []
-            result = None
-            while tries > 0:
+            for attempt in range(tries):
+                if attempt > 0:
+                    metrics.increment('retries', stage=func.__name__)
+                    if backoff > 0:
+                        time.sleep(backoff * 2**(attempt - 1))
                 try:
-                    tries -= 1
-                    result = func(*args, **kwargs)
-                    break
+                    return func(*args, **kwargs), None
                 except Exception as e:
                     errors.append(e)
-            if errors:
-                return None, Exception("\n\n".join("\t" + str(e) for e in errors))
-            return result, None
+            return None, Exception("\n\n".join("\t" + str(e) for e in errors))
 
-        return retryable(func)
+        return retryable
 
     return retry_decorator
 
 
 def float_to_timestamp(ts: float) -> str:
-    """Convert milliseconds to a timestamp."""
-    _, whole = math.modf(ts)
-    time_fmt = time.strftime("%H:%M:%S", time.gmtime(whole))
-    return time_fmt
+    """Convert seconds to a `HH:MM:SS` timestamp. See `lib.timestamps` to convert many at once."""
+    return timestamps.to_timestamp(ts)
+
 
+def download_blob(url: str, path: str, session: requests.Session = None) -> bool:
+    """Downloads a blob of data from a url to a file path. Returns whether the download succeeded.
 
-def download_blob(url: str, path: str):
-    """Downloads a blob of data from a url to a file path."""
+    Uses the shared pooled session from `lib.session` unless another session is given. The file is written through a
+    temporary file, so an existing file at `path` (possibly a hard link shared with other keyframes) is replaced rather
+    than overwritten in place.
+    """
     assert os.path.exists(os.path.dirname(path))
-    r = requests.get(url, stream=True)
-    if r.status_code == 200:
-        with open(path, 'wb') as f:
-            for chunk in r:
-                f.write(chunk)
-    else:
+    config = http_session.get_config()
+    session = session or http_session.get_session()
+    with session.get(url, stream=True, timeout=config.timeout) as r:
+        if r.status_code == 200:
+            received = 0
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=config.chunk_size):
+                        f.write(chunk)
+                        received += len(chunk)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            metrics.increment('bytes_downloaded', received, stage='blob')
+            return True
         print('Failed to fetch keyframe from', url, 'with status', r.status_code)
+        return False
+
+
+def write_atomic(path: str, text: str):
+    """Write a text file through a temporary file, so readers never see it half-written."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
 
 
 def short_yt_url(video_id: str) -> str:
@@ -60,11 +89,20 @@ def sanitize(s: str):
     return re.sub(r'[\[\]/{}.,\'\"\!\?\;]+', '', s.strip().lower()).replace(' ', '_')
 
 
-def make_path(*args):
-    path = os.path.join(*args)
-    if not os.path.exists(os.path.dirname(path)):
-        os.makedirs(os.path.dirname(path))
-    return path
+# Directories created by `make_dirs` in this process
+_made_dirs = set()
+
+
+def make_dirs(*dirs: str):
+    """Create directories and their parents, skipping those this process already created.
+
+    Repeated calls for the same directory cost a set lookup instead of a `stat`. Several threads may create the same
+    directory at the same time, which `exist_ok` allows.
+    """
+    for path in dirs:
+        if path not in _made_dirs:
+            os.makedirs(path, exist_ok=True)
+            _made_dirs.add(path)
 
 
 def get_logger():
@@ -74,6 +112,9 @@ def get_logger():
 
 
 def parse_time(timestamp: str):
-    if not re.match(r"^\d\d+\:\d{2}\:\d{2}$", timestamp):
-        raise ValueError(f"Timestamp `{timestamp}` is not in expected format HH:MM:SS")
-    return tuple(map(int, timestamp.split(':')))
\ No newline at end of file
+    seconds = timestamps.to_seconds(timestamp)
+    return seconds // 3600, seconds // 60 % 60, seconds % 60
+
+
+def timestamp_to_seconds(timestamp: str) -> int:
+    return timestamps.to_seconds(timestamp)
@@ -0,0 +1,146 @@
+"""Single-pass validation of the dataset directory tree.
+
+Each category is listed once with `os.scandir` into an in-memory snapshot of file names and sizes, and every check
+runs over that snapshot. Categories are independent, so they can be validated in parallel processes. The result is
+a JSON-serializable report with the errors found by each check.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from lib import constants
+
+ANNOTATION = 'annotation'
+VIDEO = 'video'
+KEYFRAME = 'keyframe'
+ROOTS = (ANNOTATION, VIDEO, KEYFRAME)
+
+EACH_ANNOTATION = 'each_annotation'
+KEYFRAMES_IN_ORDER = 'keyframes_in_order'
+AT_LEAST_ONE_KEYFRAME = 'at_least_one_keyframe'
+EACH_VIDEO = 'each_video'
+COMPLETE_DIR_STRUCTURE = 'complete_dir_structure'
+CHECKS = (EACH_ANNOTATION, KEYFRAMES_IN_ORDER, AT_LEAST_ONE_KEYFRAME, EACH_VIDEO, COMPLETE_DIR_STRUCTURE)
+
+
+def scan_dir(path: str, depth: int):
+    """Nested dicts of the directory tree under `path`, `depth` levels deep, with file sizes at the leaves.
+
+    Each `DirEntry` is stat-ed at most once. A missing directory is returned as `None`.
+    """
+    try:
+        it = os.scandir(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    tree = {}
+    with it:
+        for entry in it:
+            if depth > 1:
+                tree[entry.name] = scan_dir(entry.path, depth - 1) if entry.is_dir() else None
+            else:
+                tree[entry.name] = entry.stat().st_size if entry.is_file() else 0
+    return tree
+
+
+def snapshot_category(dataset_dir: str, category: str) -> Dict[str, dict]:
+    """Snapshot of one category under each root: `subcategory -> file -> size`, and one more level for keyframes."""
+    return {
+        ANNOTATION: scan_dir(os.path.join(dataset_dir, ANNOTATION, category), 2),
+        VIDEO: scan_dir(os.path.join(dataset_dir, VIDEO, category), 2),
+        KEYFRAME: scan_dir(os.path.join(dataset_dir, KEYFRAME, category), 3),
+    }
+
+
+def _check_numbered_files(root: str, category: str, tree: dict, extension: str, errors: List[str]):
+    for subcategory, files in tree.items():
+        subcat_dir = os.path.join(root, category, subcategory)
+        for i, filename in enumerate(sorted(files or {})):
+            expected = f"{category[:3].upper()}{subcategory[:3].upper()}{i:04}.{extension}"
+            if filename != expected:
+                errors.append(f"{subcat_dir}: Expected `{expected}`; Received `{filename}`")
+            elif files[filename] <= 0:
+                errors.append(f"File `{os.path.join(subcat_dir, filename)}` is empty")
+
+
+def check_category(dataset_dir: str, category: str) -> Dict[str, List[str]]:
+    """Run every check over one category of the dataset."""
+    snapshot = snapshot_category(dataset_dir, category)
+    errors = {check: [] for check in CHECKS}
+
+    if snapshot[ANNOTATION] is not None:
+        _check_numbered_files(
+            os.path.join(dataset_dir, ANNOTATION), category, snapshot[ANNOTATION], 'json', errors[EACH_ANNOTATION]
+        )
+    if snapshot[VIDEO] is not None:
+        _check_numbered_files(os.path.join(dataset_dir, VIDEO), category, snapshot[VIDEO], 'mp4', errors[EACH_VIDEO])
+
+    for subcategory, videos in (snapshot[KEYFRAME] or {}).items():
+        for vid, frames in (videos or {}).items():
+            vid_dir = os.path.join(dataset_dir, KEYFRAME, category, subcategory, vid)
+            frames = frames or {}
+            for i in range(len(frames)):
+                if f"keyframe_{i}.jpg" not in frames:
+                    errors[KEYFRAMES_IN_ORDER].append(f"{vid_dir}: Expected `keyframe_{i}.jpg` in {set(frames)}")
+            if not frames:
+                errors[AT_LEAST_ONE_KEYFRAME].append(f"No keyframes found in `{vid_dir}`")
+            for keyframe, size in frames.items():
+                if size <= 0:
+                    errors[AT_LEAST_ONE_KEYFRAME].append(f"Keyframe `{os.path.join(vid_dir, keyframe)}` is empty")
+
+    for root in ROOTS:
+        cat_dir = os.path.join(dataset_dir, root, category)
+        tree = snapshot[root]
+        if tree is None:
+            errors[COMPLETE_DIR_STRUCTURE].append(f"`{cat_dir}` is not a directory")
+            continue
+        if len(tree) != constants.NUM_SUBCATEGORIES:
+            errors[COMPLETE_DIR_STRUCTURE].append(
+                f"Expected {constants.NUM_SUBCATEGORIES} subcategories in `{cat_dir}`; Found {len(tree)}"
+            )
+        for subcategory, entries in tree.items():
+            found = len(entries or {})
+            if found != constants.NUM_ENTRIES_PER_SUBCATEGORY:
+                errors[COMPLETE_DIR_STRUCTURE].append(
+                    f"Expected {constants.NUM_ENTRIES_PER_SUBCATEGORY} entries in "
+                    f"`{os.path.join(cat_dir, subcategory)}`; Found {found}"
+                )
+    return errors
+
+
+def _check_category(args):
+    return check_category(*args)
+
+
+def validate(dataset_dir: str = constants.DATASET_DIR, processes: int = 1) -> dict:
+    """Validate the whole dataset, sharding the categories over `processes` worker processes."""
+    errors = {check: [] for check in CHECKS}
+    categories = set()
+    for root in ROOTS:
+        root_dir = os.path.join(dataset_dir, root)
+        tree = scan_dir(root_dir, 1)
+        if tree is None:
+            errors[COMPLETE_DIR_STRUCTURE].append(f"`{root_dir}` is not a directory")
+            continue
+        if len(tree) != constants.NUM_CATEGORIES:
+            errors[COMPLETE_DIR_STRUCTURE].append(
+                f"Expected {constants.NUM_CATEGORIES} categories in `{root_dir}`; Found {len(tree)}"
+            )
+        categories.update(tree)
+
+    tasks = [(dataset_dir, category) for category in sorted(categories)]
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(processes, len(tasks))) as pool:
+            results = list(pool.map(_check_category, tasks))
+    else:
+        results = [_check_category(task) for task in tasks]
+    for result in results:
+        for check, check_errors in result.items():
+            errors[check].extend(check_errors)
+
+    return {
+        'dataset_dir': dataset_dir,
+        'categories': len(categories),
+        'passed': not any(errors.values()),
+        'checks': {check: {'passed': not errors[check], 'errors': errors[check]} for check in CHECKS},
+    }
@@ -0,0 +1,183 @@
+"""Deep verification of the downloaded content of each entry.
+
+Beyond checking that files exist, this parses them: the annotation must be valid JSON, the video must be an MP4
+with `moov` and `mdat` boxes whose duration matches the annotation, and every keyframe must be a complete JPEG of
+`KEYFRAME_WIDTH`x`KEYFRAME_HEIGHT`. Results are cached per entry by the (path, size, mtime) of its files and the
+duration tolerance, so only entries whose files changed are verified again.
+"""
+
+import json
+import os
+import struct
+from typing import List, Optional, Tuple
+
+from lib import constants
+from lib import timestamps
+from lib import utils
+from lib.data import MSMOEntry
+from lib.ledger import ANNOTATION, KEYFRAMES, VIDEO
+
+VERIFY_CACHE_FILENAME = 'verify_cache.json'
+
+# JPEG start-of-frame markers, which carry the image dimensions.
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class VerificationError(Exception):
+    """Raised when a file is truncated or is not of the expected format."""
+
+
+def _boxes(f, start: int, end: int):
+    """Iterate over (type, payload offset, box end) of the MP4 boxes between `start` and `end`."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size, = struct.unpack('>Q', f.read(8))
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise VerificationError(f"Invalid size {size} of box `{box_type!r}` at byte {offset}")
+        if offset + size > end:
+            raise VerificationError(f"Box `{box_type.decode(errors='replace')}` at byte {offset} is truncated")
+        yield box_type.decode(errors='replace'), offset + header, offset + size
+        offset += size
+    if offset != end:
+        raise VerificationError(f"Trailing {end - offset} bytes after the last box")
+
+
+def mp4_duration(path: str) -> float:
+    """Duration in seconds from the `mvhd` box of an MP4 file, checking that `moov` and `mdat` are present."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        top_level = {box_type: (start, end) for box_type, start, end in _boxes(f, 0, size)}
+        for required in ('ftyp', 'moov', 'mdat'):
+            if required not in top_level:
+                raise VerificationError(f"Missing `{required}` box")
+        mvhd = {box_type: (start, end) for box_type, start, end in _boxes(f, *top_level['moov'])}.get('mvhd')
+        if mvhd is None:
+            raise VerificationError('Missing `mvhd` box')
+        f.seek(mvhd[0])
+        version = f.read(4)[0]
+        if version == 1:
+            _, _, timescale, duration = struct.unpack('>QQIQ', f.read(28))
+        else:
+            _, _, timescale, duration = struct.unpack('>IIII', f.read(16))
+    if timescale == 0:
+        raise VerificationError('`mvhd` has a timescale of 0')
+    return duration / timescale
+
+
+def jpeg_size(path: str) -> Tuple[int, int]:
+    """(width, height) of a JPEG file, checking that it starts with SOI and ends with EOI."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:2] != b'\xff\xd8':
+        raise VerificationError('Not a JPEG (missing SOI marker)')
+    if data.rstrip(b'\x00')[-2:] != b'\xff\xd9':
+        raise VerificationError('JPEG is truncated (missing EOI marker)')
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            raise VerificationError(f"Invalid JPEG marker at byte {offset}")
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        length, = struct.unpack('>H', data[offset + 2:offset + 4])
+        if marker in SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    raise VerificationError('JPEG has no start-of-frame marker')
+
+
+def signature(paths: List[str]) -> List[list]:
+    """(path, size, mtime) of each file, or `None` size and mtime if it does not exist."""
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            result.append([path, stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            result.append([path, None, None])
+    return result
+
+
+def verify_entry(entry: MSMOEntry, duration_tolerance: float = 2.) -> List[dict]:
+    """Failures found in the files of an entry, one dict per failing file."""
+    failures = []
+
+    def fail(artifact, path, error):
+        failures.append({'artifact': artifact, 'path': path, 'error': str(error)})
+
+    try:
+        with open(entry.annotation_path(), 'r') as ann_file:
+            annotation = json.load(ann_file)
+        duration = timestamps.to_seconds(annotation['info']['duration'])
+        num_keyframes = len(annotation['summary'])
+    except (OSError, ValueError, KeyError) as e:
+        fail(ANNOTATION, entry.annotation_path(), e)
+        duration, num_keyframes = None, 0
+
+    try:
+        video_duration = mp4_duration(entry.video_path())
+        if duration is not None and abs(video_duration - duration) > duration_tolerance:
+            raise VerificationError(f"Video is {video_duration:.1f}s long; the annotation says {duration}s")
+    except (OSError, VerificationError, struct.error, IndexError) as e:
+        fail(VIDEO, entry.video_path(), e)
+
+    for i in range(num_keyframes):
+        path = entry.keyframe_path(i)
+        try:
+            size = jpeg_size(path)
+            if size != (constants.KEYFRAME_WIDTH, constants.KEYFRAME_HEIGHT):
+                raise VerificationError(
+                    f"Keyframe is {size[0]}x{size[1]}; expected {constants.KEYFRAME_WIDTH}x{constants.KEYFRAME_HEIGHT}"
+                )
+        except (OSError, VerificationError, struct.error) as e:
+            fail(KEYFRAMES, path, e)
+    return failures
+
+
+def entry_files(entry: MSMOEntry) -> List[str]:
+    """Files of an entry whose changes invalidate its cached verification."""
+    paths = [entry.annotation_path(), entry.video_path()]
+    i = 0
+    while os.path.exists(path := entry.keyframe_path(i)):
+        paths.append(path)
+        i += 1
+    return paths
+
+
+def verify_cached(entry: MSMOEntry, cached: Optional[dict], duration_tolerance: float = 2.):
+    """Verify an entry unless none of its files (nor the tolerance) changed since the `cached` result.
+
+    Returns the (possibly cached) result, with the signature of the files and the tolerance it was computed for.
+    """
+    current = signature(entry_files(entry))
+    if (
+        cached is not None and cached['signature'] == current and
+        cached.get('duration_tolerance') == duration_tolerance
+    ):
+        return cached
+    return {
+        'signature': current,
+        'duration_tolerance': duration_tolerance,
+        'failures': verify_entry(entry, duration_tolerance),
+    }
+
+
+def load_cache(dataset_dir: str) -> dict:
+    path = os.path.join(dataset_dir, VERIFY_CACHE_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_cache(dataset_dir: str, results: dict):
+    utils.write_atomic(os.path.join(dataset_dir, VERIFY_CACHE_FILENAME), json.dumps(results))
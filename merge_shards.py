@@ -0,0 +1,51 @@
+import argparse
+import glob
+import os
+import sys
+
+from lib import ledger
+from lib.index import INDEX_FILENAME, DatasetIndex
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Shard Merger',
+        description='Merges the ledgers and indexes written by the shards of a build into those of the dataset'
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    parser.add_argument(
+        '--indexes',
+        help='Index files of the shards (default: <dataset-dir>/index.shard-*.npz)',
+        nargs='*',
+        default=None
+    )
+    parser.add_argument('--remove', help='Remove the shard files once merged', action='store_true')
+    return parser
+
+
+def main(args: argparse.Namespace):
+    shard_ledgers = ledger.shard_paths(args.dataset_dir)
+    merged = ledger.merge_shards(args.dataset_dir, remove=args.remove)
+    print(f"Merged {len(shard_ledgers)} shard ledgers into `{merged.path}`")
+    for artifact, counts in merged.summary().items():
+        print(f"{artifact:>10}: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+
+    index_paths = args.indexes
+    if index_paths is None:
+        index_paths = sorted(
+            glob.glob(os.path.join(args.dataset_dir, f"{INDEX_FILENAME[:-len('.npz')]}.shard-*.npz"))
+        )
+    if index_paths:
+        index = DatasetIndex.concat([DatasetIndex.load(path) for path in index_paths])
+        output = os.path.join(args.dataset_dir, INDEX_FILENAME)
+        index.save(output)
+        print(f"Merged {len(index_paths)} shard indexes ({len(index)} videos) into `{output}`")
+        if args.remove:
+            for path in index_paths:
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
@@ -0,0 +1,51 @@
+import argparse
+import sys
+
+from tqdm import tqdm
+
+from lib import cache
+from lib import constants
+from lib import data
+from lib import scheduler
+
+METADATA = 'metadata'
+TRANSCRIPT = 'transcript'
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Prefetcher', description='Fills the local cache with watch pages and transcripts of every video'
+    )
+    parser.add_argument(
+        '--video-ids', help='Path to a directory with .csv files of videos to prefetch', required=True
+    )
+    parser.add_argument('--cache-dir', help='Directory of the cache', default=constants.CACHE_DIR)
+    parser.add_argument('-w', '--workers', help='Number of videos fetched concurrently', default=16, type=int)
+    parser.add_argument(
+        '--only', help='Only prefetch one kind of data', choices=(METADATA, TRANSCRIPT), default=None
+    )
+    return parser
+
+
+def main(args: argparse.Namespace):
+    cache.configure(root=args.cache_dir, enabled=True)
+
+    def prefetch(entry: data.MSMOEntry):
+        if args.only in (None, METADATA):
+            cache.youtube(entry.youtube_id)
+        if args.only in (None, TRANSCRIPT):
+            cache.transcript(entry.youtube_id)
+
+    entries = list(data.read_entries(args.video_ids, '.'))
+    with tqdm(total=len(entries)) as progress:
+        failures = scheduler.run(entries, prefetch, args.workers, progress=progress)
+    for namespace, counts in cache.get_cache().stats().items():
+        print(f"{namespace}: {counts['hits']} already cached, {counts['misses']} not cached")
+    if failures:
+        print(f"{len(failures)} videos failed:", *(f"\t{e.youtube_id}: {err!r}" for e, err in failures), sep='\n')
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
@@ -0,0 +1,68 @@
+import argparse
+import csv
+import sys
+from collections import Counter
+from dataclasses import asdict, fields
+
+from tqdm import tqdm
+
+from lib import cache
+from lib import constants
+from lib import data
+from lib import probe
+from lib import scheduler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Stream Prober', description='Records the stream formats available for every video'
+    )
+    parser.add_argument(
+        '--video-ids', help='Path to a directory with .csv files of videos to probe', required=True
+    )
+    parser.add_argument('-o', '--output', help='Path of the CSV table of formats', required=True)
+    parser.add_argument('--cache-dir', help='Directory of the cache', default=constants.CACHE_DIR)
+    parser.add_argument('-w', '--workers', help='Number of manifests resolved concurrently', default=8, type=int)
+    parser.add_argument('--max-res', help='Maximum height in pixels for the selected stream', default=None, type=int)
+    parser.add_argument(
+        '--prefer', help='Which stream to select among those within --max-res', choices=probe.PREFERENCES,
+        default=probe.HIGHEST
+    )
+    return parser
+
+
+def main(args: argparse.Namespace):
+    cache.configure(root=args.cache_dir, enabled=True)
+    policy = probe.StreamPolicy(max_res=args.max_res, prefer=args.prefer)
+    limiter = scheduler.TrafficLimiter(scheduler.Limits(metadata=args.workers))
+    table = {}
+
+    def probe_entry(entry: data.MSMOEntry):
+        table[entry.youtube_id] = probe.formats(entry.youtube_id, limiter=limiter)
+
+    entries = list(data.read_entries(args.video_ids, '.'))
+    with tqdm(total=len(entries)) as progress:
+        failures = scheduler.run(entries, probe_entry, args.workers, progress=progress)
+
+    columns = ['youtube_id', *(f.name for f in fields(probe.StreamFormat)), 'selected']
+    selected_bytes = 0
+    resolutions = Counter()
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for youtube_id, formats in table.items():
+            selected = probe.select(formats, policy)
+            selected_bytes += (selected.filesize or 0) if selected else 0
+            resolutions[selected.resolution if selected else None] += 1
+            for stream_format in formats:
+                writer.writerow({'youtube_id': youtube_id, **asdict(stream_format), 'selected': stream_format == selected})
+
+    print(f"Probed {len(table)} videos; {len(failures)} failed")
+    print("Selected resolutions:", ", ".join(f"{res}: {count}" for res, count in resolutions.most_common()))
+    print(f"Selected streams total {selected_bytes / 1024**3:.1f} GB (where the manifest gives sizes)")
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
@@ -0,0 +1,102 @@
+import argparse
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from lib import cache
+from lib import constants
+from lib import data
+from lib import ledger
+from lib import utils
+from lib.fetch import Video, serialize_annotation
+
+CREATED = 'created'
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Re-annotator',
+        description='Regenerates the annotation files of the dataset from cached watch pages and transcripts'
+    )
+    parser.add_argument(
+        '--video-ids', help='Path to a directory with .csv files of videos in the dataset', required=True
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    parser.add_argument('--cache-dir', help='Directory of the cache', default=constants.CACHE_DIR)
+    parser.add_argument(
+        '-j', '--processes', help='Number of worker processes', default=os.cpu_count(), type=int
+    )
+    parser.add_argument('-n', '--dry-run', help='Report changes without writing any file', action='store_true')
+    return parser
+
+
+def init_worker(cache_dir: str):
+    # Never fetch from YouTube, and never expire entries: the cache is the source of truth here.
+    cache.configure(root=cache_dir, enabled=True, offline=True, ttl=None, max_bytes=None)
+
+
+def reannotate(entry: data.MSMOEntry, dry_run: bool = False):
+    """Rebuild the annotation of an entry from the cache, writing it only if its content changed."""
+    try:
+        video = Video(entry)
+        summary, _ = video.build_summary()
+        annotation = serialize_annotation(video.build_annotation(summary, video.get_transcript()))
+    except Exception as e:
+        return entry, FAILED, repr(e)
+    return entry, write_if_changed(entry, annotation, dry_run), None
+
+
+def write_if_changed(entry: data.MSMOEntry, annotation: str, dry_run: bool = False) -> str:
+    """Write the annotation file of an entry unless it already has this content, returning what was done."""
+    path = entry.annotation_path()
+    if os.path.exists(path):
+        with open(path, 'r') as ann_file:
+            if ann_file.read() == annotation:
+                return UNCHANGED
+        status = UPDATED
+    else:
+        status = CREATED
+    if not dry_run:
+        utils.make_dirs(entry.annotation_dir)
+        utils.write_atomic(path, annotation)
+    return status
+
+
+def record(journal: ledger.Ledger, entry: data.MSMOEntry, status: str):
+    """Record a rewritten annotation with its new checksum.
+
+    Entries the ledger does not track are left alone: the build adopts them, with all their files, on its next run.
+    """
+    if status in (CREATED, UPDATED) and journal.is_tracked(entry):
+        journal.record_done(entry, ledger.ANNOTATION, [entry.annotation_path()])
+
+
+def _reannotate(args):
+    return reannotate(*args)
+
+
+def main(args: argparse.Namespace):
+    entries = list(data.read_entries(args.video_ids, args.dataset_dir))
+    journal = ledger.Ledger.in_dataset(args.dataset_dir)
+    counts = Counter()
+    with ProcessPoolExecutor(args.processes, initializer=init_worker, initargs=(args.cache_dir, )) as pool:
+        results = pool.map(_reannotate, ((entry, args.dry_run) for entry in entries), chunksize=16)
+        for entry, status, error in tqdm(results, total=len(entries)):
+            counts[status] += 1
+            if not args.dry_run:
+                record(journal, entry, status)
+            if error is not None:
+                print(f"Failed to re-annotate {entry.video_id} ({entry.youtube_id}): {error}", file=sys.stderr)
+    print(", ".join(f"{counts[status]} {status}" for status in (CREATED, UPDATED, UNCHANGED, FAILED)))
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    main(args)
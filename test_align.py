@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from lib import align
+from lib import utils
+
+
+def rows(bounds):
+    return [
+        {'start_time': utils.float_to_timestamp(start), 'end_time': utils.float_to_timestamp(end), 'summary': str(i)}
+        for i, (start, end) in enumerate(bounds)
+    ]
+
+
+@pytest.fixture
+def annotation():
+    return {
+        'summary': rows([(5, 59), (60, 119), (120, 120), (121, 300)]),
+        'transcript': rows([(0, 4), (5, 20), (21, 59), (60, 130), (200, 210)]),
+    }
+
+
+def test_lines_go_to_the_segment_they_start_in(annotation):
+    alignment = align.align_annotation(annotation)
+    assert alignment['transcript_segment'].tolist() == [-1, 0, 0, 1, 3]
+    assert alignment['first_transcript'].tolist() == [1, 3, 4, 4]
+    assert alignment['num_transcripts'].tolist() == [2, 1, 0, 1]
+    assert align.segment_text(annotation, alignment, 0) == '1 2'
+
+
+def test_ranges_match_assignment():
+    rng = np.random.default_rng(0)
+    segments = np.sort(rng.choice(1000, 20, replace=False))
+    transcripts = np.sort(rng.integers(0, 1000, 300))
+    segment_of = align.assign(segments, transcripts)
+    first, count = align.ranges(segments, transcripts)
+    for i in range(len(segments)):
+        assert (segment_of[first[i]:first[i] + count[i]] == i).all()
+    assert count.sum() == (segment_of >= 0).sum()
+
+
+def test_unsorted_transcript(annotation):
+    annotation['transcript'].reverse()
+    with pytest.raises(ValueError):
+        align.align_annotation(annotation)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from lib.blobs import BlobStore
+
+
+def writer(contents):
+    """A download function writing `contents[url]`, recording the urls it was called with."""
+    calls = []
+
+    def download(url, path):
+        calls.append(url)
+        with open(path, 'wb') as f:
+            f.write(contents[url])
+        return True
+
+    return download, calls
+
+
+def test_url_downloaded_once(tmp_path):
+    store = BlobStore.in_dataset(str(tmp_path))
+    download, calls = writer({'a': b'frame'})
+    assert store.fetch('a', str(tmp_path / 'k0.jpg'), download)
+    assert store.fetch('a', str(tmp_path / 'k1.jpg'), download)
+    assert calls == ['a']
+    assert store.stats['url_hits'] == 1
+    # The memo survives reopening the store
+    assert BlobStore.in_dataset(str(tmp_path)).lookup('a') is not None
+
+
+def test_identical_content_is_linked(tmp_path):
+    store = BlobStore.in_dataset(str(tmp_path))
+    download, calls = writer({'a': b'frame' * 100, 'b': b'frame' * 100, 'c': b'other'})
+    for i, url in enumerate('abc'):
+        store.fetch(url, str(tmp_path / f"k{i}.jpg"), download)
+    assert calls == ['a', 'b', 'c']
+    assert os.path.samefile(tmp_path / 'k0.jpg', tmp_path / 'k1.jpg')
+    assert (tmp_path / 'k2.jpg').read_bytes() == b'other'
+    usage = store.usage()
+    assert usage['blobs'] == 2
+    assert usage['saved_bytes'] == 500
+
+
+def test_failed_download_leaves_nothing(tmp_path):
+    store = BlobStore.in_dataset(str(tmp_path))
+    assert not store.fetch('a', str(tmp_path / 'k0.jpg'), lambda url, path: False)
+    assert not (tmp_path / 'k0.jpg').exists()
+    assert store.lookup('a') is None
+
+
+def test_add_existing_keyframes(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    for i in range(3):
+        (tmp_path / f"k{i}.jpg").write_bytes(b'same')
+    assert [store.add(str(tmp_path / f"k{i}.jpg")) for i in range(3)] == [False, True, True]
+    assert not store.add(str(tmp_path / 'k0.jpg'))
+    assert store.usage()['blobs'] == 1
+    assert os.stat(tmp_path / 'k2.jpg').st_nlink == 4
+
+
+if __name__ == '__main__':
+    pytest.main()
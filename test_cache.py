@@ -0,0 +1,76 @@
+import os
+import time
+
+import pytest
+
+from lib import cache
+
+
+def test_expired_entries_are_refetched(tmp_path):
+    disk = cache.DiskCache(str(tmp_path), ttl=60)
+    disk.put(cache.TRANSCRIPT, 'a', b'old')
+    assert disk.get(cache.TRANSCRIPT, 'a') == b'old'
+    written = time.time() - 120
+    os.utime(disk.path(cache.TRANSCRIPT, 'a'), (written, written))
+    assert disk.get(cache.TRANSCRIPT, 'a') is None
+    assert disk.fetch(cache.TRANSCRIPT, 'a', lambda: b'new') == b'new'
+    assert disk.stats()[cache.TRANSCRIPT] == {'hits': 1, 'misses': 2}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    disk = cache.DiskCache(str(tmp_path), max_bytes=2500)
+    # Random bytes do not compress, so each entry takes a little over 1000 bytes
+    for key in ('a', 'b'):
+        disk.put(cache.WATCH_HTML, key, os.urandom(1000))
+    assert disk.get(cache.WATCH_HTML, 'a') is not None
+    disk.put(cache.WATCH_HTML, 'c', os.urandom(1000))
+    assert [disk.get(cache.WATCH_HTML, key) is not None for key in 'abc'] == [True, False, True]
+
+
+def test_offline_mode_only_reads_the_cache(tmp_path):
+    cache.DiskCache(str(tmp_path)).put_json(cache.INITIAL_DATA, 'a', {'cached': True})
+    disk = cache.DiskCache(str(tmp_path), offline=True)
+    assert disk.fetch_json(cache.INITIAL_DATA, 'a', None) == {'cached': True}
+    with pytest.raises(cache.CacheMissError):
+        disk.fetch_json(cache.INITIAL_DATA, 'b', lambda: {'fetched': True})
+
+
+def test_expired_entries_are_read_offline(tmp_path):
+    disk = cache.DiskCache(str(tmp_path), ttl=60, offline=True)
+    disk.put(cache.WATCH_HTML, 'a', b'old')
+    written = time.time() - 120
+    os.utime(disk.path(cache.WATCH_HTML, 'a'), (written, written))
+    assert disk.fetch(cache.WATCH_HTML, 'a', None) == b'old'
+
+
+class FakeYouTube:
+    """The attributes of `pytube.YouTube` that `cache.youtube` reads, counting player requests."""
+    player_requests = 0
+
+    def __init__(self, url):
+        self.watch_url = url
+        self._watch_html = self._initial_data = self._vid_info = None
+
+    @property
+    def watch_html(self):
+        return self._watch_html or '<html></html>'
+
+    @property
+    def vid_info(self):
+        if self._vid_info is None:
+            FakeYouTube.player_requests += 1
+            self._vid_info = {'videoDetails': {'title': 't'}, cache.STREAMING_DATA: {'formats': ['signed']}}
+        return self._vid_info
+
+
+def test_stream_urls_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache.pytube, 'YouTube', FakeYouTube)
+    monkeypatch.setattr(cache.pytube.extract, 'initial_data', lambda html: {})
+    monkeypatch.setattr(cache, '_config', cache.CacheConfig(root=str(tmp_path)))
+    monkeypatch.setattr(cache, '_cache', None)
+
+    fetched = cache.youtube('a')
+    assert cache.STREAMING_DATA in fetched.vid_info
+    cached = cache.youtube('a')
+    assert cached._vid_info == {'videoDetails': {'title': 't'}}
+    assert FakeYouTube.player_requests == 1
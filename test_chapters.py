@@ -0,0 +1,118 @@
+import pytest
+
+from benchmarks import fixtures
+from lib import chapters
+from lib import backend
+from lib import constants
+from lib.data import MSMOEntry
+from lib.fetch import Video
+
+
+def overlay(*keys):
+    chapter = {
+        'chapterRenderer': {
+            'title': {'simpleText': 'Intro'},
+            'timeRangeStartMillis': 1500,
+            'thumbnail': {'thumbnails': [{'url': 'u', 'width': 1, 'height': 1}]},
+        }
+    }
+    markers = [{'key': key, 'value': {'chapters': [chapter] * (i + 1)}} for i, key in enumerate(keys)]
+    player_bar = {'playerBar': {'multiMarkersPlayerBarRenderer': {'markersMap': markers}}}
+    return {
+        'playerOverlays': {
+            'playerOverlayRenderer': {'decoratedPlayerBarRenderer': {'decoratedPlayerBarRenderer': player_bar}}
+        }
+    }
+
+
+class FakeSource(backend.Source):
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetches = 0
+
+    def metadata(self) -> backend.Metadata:
+        return backend.Metadata('url', 'title', 'author', 600)
+
+    def initial_data(self, refresh: bool = False) -> dict:
+        self.fetches += 1
+        return self.pages[min(self.fetches, len(self.pages)) - 1]
+
+    def transcript(self):
+        raise NotImplementedError
+
+    def stream_formats(self):
+        raise NotImplementedError
+
+    def stream(self, itag):
+        raise NotImplementedError
+
+
+class FakeBackend(backend.Backend):
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def open(self, youtube_id: str) -> backend.Source:
+        return self.source
+
+
+def test_parses_engagement_panel():
+    found = chapters.parse(fixtures.synthetic('abc', chapters=4, length=400)['initial_data'])
+    assert [chapter.start_ms for chapter in found] == [0, 100_000, 200_000, 300_000]
+    assert found[1].title == 'Chapter 1 of abc'
+    assert found[0].thumbnail(constants.KEYFRAME_WIDTH, constants.KEYFRAME_HEIGHT).endswith('hqdefault_0.jpg')
+    assert found[0].thumbnail(1, 1) is None
+
+
+def test_prefers_description_chapters_in_overlay():
+    found = chapters.parse(overlay('HEATSEEKER', 'AUTO_CHAPTERS', 'DESCRIPTION_CHAPTERS'))
+    assert len(found) == 3
+    assert (found[0].start, found[0].title) == (1.5, 'Intro')
+
+
+def test_missing_chapters():
+    with pytest.raises(chapters.ChapterError) as e:
+        chapters.parse({'engagementPanels': []})
+    assert e.value.missing
+    with pytest.raises(chapters.ChapterError) as e:
+        chapters.parse(overlay('HEATSEEKER'))
+    assert e.value.missing
+
+
+def test_malformed_chapters_are_not_missing():
+    initial_data = fixtures.synthetic('abc')['initial_data']
+    panel = initial_data['engagementPanels'][0]['engagementPanelSectionListRenderer']
+    panel['content']['macroMarkersListRenderer']['contents'][0]['macroMarkersListItemRenderer']['thumbnail'] = {
+        'thumbnails': []
+    }
+    with pytest.raises(chapters.ChapterError) as e:
+        chapters.parse(initial_data)
+    assert not e.value.missing
+
+
+def test_refetches_only_missing_chapters(tmp_path):
+    entry = MSMOEntry('education', 'writing', 0, 'abc', str(tmp_path))
+    with_chapters = fixtures.synthetic('abc', chapters=3)['initial_data']
+
+    source = FakeSource([{}, with_chapters])
+    assert len(Video(entry, backend=FakeBackend(source)).get_chapters()) == 3
+    assert source.fetches == 2
+
+    source = FakeSource([{}, {}, with_chapters])
+    with pytest.raises(Exception, match='Unable to find chapters'):
+        Video(entry, backend=FakeBackend(source)).get_chapters(refetches=1)
+    assert source.fetches == 2
+
+    malformed = overlay('AUTO_CHAPTERS')
+    del malformed['playerOverlays']['playerOverlayRenderer']['decoratedPlayerBarRenderer'][
+        'decoratedPlayerBarRenderer']['playerBar']['multiMarkersPlayerBarRenderer']['markersMap'][0]['value']
+    source = FakeSource([malformed, with_chapters])
+    with pytest.raises(Exception, match='Unable to find chapters'):
+        Video(entry, backend=FakeBackend(source)).get_chapters()
+    assert source.fetches == 1
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+import requests
+
+from benchmarks.server import FakeServer
+from lib import downloader
+from lib import session
+from lib import utils
+
+
+@pytest.fixture(autouse=True)
+def default_config():
+    yield
+    downloader.configure(**vars(downloader.DownloadConfig()))
+
+
+def test_downloads_whole_stream(tmp_path):
+    with FakeServer(latency=0, video_size=300_000) as server:
+        path = str(tmp_path / 'video.mp4')
+        downloader.download_stream(f"{server.url}/video/abc.mp4", path)
+        with open(path, 'rb') as f:
+            assert f.read() == server.video
+        assert not os.path.exists(path + '.part')
+
+
+def test_failed_blob_leaves_no_temporary_file(tmp_path):
+    with FakeServer(latency=0, video_size=300_000, drop_after=100_000, drops=1) as server:
+        path = str(tmp_path / 'blob')
+        with pytest.raises(requests.RequestException):
+            utils.download_blob(f"{server.url}/video/abc.mp4", path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_resumes_dropped_connections(tmp_path):
+    with FakeServer(latency=0, video_size=300_000, drop_after=100_000, drops=2) as server:
+        path = str(tmp_path / 'video.mp4')
+        downloader.download_stream(f"{server.url}/video/abc.mp4", path, filesize=server.video_size)
+        with open(path, 'rb') as f:
+            assert f.read() == server.video
+        # Each retry continued where the previous request stopped instead of starting over; at most the chunk in
+        # flight when the connection dropped is sent twice.
+        assert server.bytes_sent < server.video_size + 2 * session.get_config().chunk_size
+
+
+def test_resumes_from_existing_part_file(tmp_path):
+    with FakeServer(latency=0, video_size=300_000) as server:
+        path = str(tmp_path / 'video.mp4')
+        with open(path + '.part', 'wb') as part:
+            part.write(server.video[:123_456])
+        downloader.download_stream(f"{server.url}/video/abc.mp4", path)
+        with open(path, 'rb') as f:
+            assert f.read() == server.video
+        assert server.bytes_sent == server.video_size - 123_456
+
+
+def test_downloads_parallel_segments(tmp_path):
+    downloader.configure(segments=4, min_segment_size=0)
+    with FakeServer(latency=0, video_size=300_001, drop_after=10_000, drops=3) as server:
+        path = str(tmp_path / 'video.mp4')
+        downloader.download_stream(f"{server.url}/video/abc.mp4", path)
+        with open(path, 'rb') as f:
+            assert f.read() == server.video
+        assert sorted(os.listdir(tmp_path)) == ['video.mp4']
+
+
+def test_rejects_size_mismatch(tmp_path):
+    with FakeServer(latency=0, video_size=1000) as server:
+        path = str(tmp_path / 'video.mp4')
+        with pytest.raises(downloader.DownloadError):
+            downloader.download_stream(f"{server.url}/video/abc.mp4", path, filesize=2000)
+        assert not os.path.exists(path)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,42 @@
+import os
+import pickle
+
+import pytest
+
+from lib import data
+
+
+@pytest.fixture
+def entry(tmp_path):
+    return data.MSMOEntry('education', 'writing', 7, 'abc', str(tmp_path))
+
+
+def test_paths(entry, tmp_path):
+    assert entry.video_id == 'EDUWRI0007'
+    assert entry.annotation_path() == os.path.join(tmp_path, 'annotation', 'education', 'writing', 'EDUWRI0007.json')
+    assert entry.video_path() == os.path.join(tmp_path, 'video', 'education', 'writing', 'EDUWRI0007.mp4')
+    assert entry.keyframe_path(3) == os.path.join(
+        tmp_path, 'keyframe', 'education', 'writing', 'EDUWRI0007', 'keyframe_3.jpg'
+    )
+
+
+def test_queries_have_no_side_effects(entry, tmp_path):
+    entry.annotation_path(), entry.video_path(), entry.keyframe_path(0)
+    assert not entry.exists()
+    assert os.listdir(tmp_path) == []
+
+
+def test_make_tree(entry, tmp_path):
+    other = data.MSMOEntry('education', 'writing', 8, 'def', str(tmp_path))
+    assert data.make_tree([entry, other]) == 2
+    for directory in (entry.annotation_dir, entry.video_dir, os.path.dirname(entry.keyframe_dir)):
+        assert os.listdir(directory) == []
+
+
+def test_entries_pickle(entry):
+    copy = pickle.loads(pickle.dumps(entry))
+    assert copy == entry and copy.keyframe_path(1) == entry.keyframe_path(1)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+
+import numpy as np
+
+from lib.index import DatasetIndex, INDEX_FILENAME
+
+
+def row(start, end, text, **fields):
+    return {'start_time': start, 'end_time': end, 'length': '00:00:10', 'summary': text, **fields}
+
+
+def write_annotation(dataset_dir, category, video_id, youtube_id, summary, transcript, keyframes):
+    ann_dir = os.path.join(dataset_dir, 'annotation', category, 'sub')
+    keyframe_dir = os.path.join(dataset_dir, 'keyframe', category, 'sub', video_id)
+    os.makedirs(ann_dir, exist_ok=True)
+    os.makedirs(keyframe_dir, exist_ok=True)
+    for i in range(keyframes):
+        open(os.path.join(keyframe_dir, f"keyframe_{i}.jpg"), 'wb').close()
+    annotation = {
+        'info': {'youtube_id': youtube_id, 'duration': summary[-1]['end_time']},
+        'summary': [dict(segment, segment=i) for i, segment in enumerate(summary)],
+        'transcript': transcript,
+    }
+    with open(os.path.join(ann_dir, f"{video_id}.json"), 'w') as f:
+        json.dump(annotation, f)
+
+
+def test_build_save_and_query(tmp_path):
+    dataset_dir = str(tmp_path)
+    write_annotation(
+        dataset_dir, 'cooking', 'COOSUB0000', 'yt0',
+        [row('00:00:00', '00:00:09', 'intro'), row('00:00:10', '00:01:00', 'recipe')],
+        [row('00:00:02', '00:00:05', 'hello'), row('00:00:12', '00:00:20', 'flour'), row('00:00:30', '00:00:40', 'egg')],
+        keyframes=2,
+    )
+    write_annotation(
+        dataset_dir, 'sports', 'SPOSUB0000', 'yt1',
+        [row('00:00:05', '00:02:00', 'match')],
+        [row('00:00:01', '00:00:04', 'before'), row('00:00:06', '00:00:09', 'kickoff')],
+        keyframes=1,
+    )
+    DatasetIndex.build(dataset_dir).save(os.path.join(dataset_dir, INDEX_FILENAME))
+    index = DatasetIndex.load(os.path.join(dataset_dir, INDEX_FILENAME))
+
+    assert len(index) == 2
+    assert list(index.videos['video_id']) == ['COOSUB0000', 'SPOSUB0000']
+    assert index.counts_by('category') == {'cooking': 1, 'sports': 1}
+    assert index.describe('duration', category='sports')['max'] == 120
+    assert index.videos['num_keyframes'].tolist() == [2, 1]
+    assert index.segment_mask(category='cooking').tolist() == [True, True, False]
+
+    # The recipe segment holds the 2nd and 3rd lines of its video
+    assert index.transcript_rows(1).tolist() == [1, 2]
+    assert index.transcripts['start'][index.transcript_rows(1)].tolist() == [12, 30]
+    # The first line of the sports video starts before its only segment
+    assert index.transcript_rows(2).tolist() == [4]
+    assert index.transcript_segments().tolist() == [0, 1, 1, -1, 2]
+    assert np.array_equal(index.segments['start'], [0, 10, 5])
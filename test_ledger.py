@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from lib import ledger
+from lib.data import MSMOEntry
+
+
+@pytest.fixture
+def entry(tmp_path):
+    return MSMOEntry('hobbies', 'writing', 0, 'yt0', str(tmp_path))
+
+
+def write(path, content=b'x'):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def test_resume_from_journal(tmp_path, entry):
+    journal = ledger.Ledger.in_dataset(str(tmp_path))
+    journal.record_failure(entry, ledger.VIDEO, Exception('403'))
+    write(tmp_path / 'a.json')
+    journal.record_done(entry, ledger.ANNOTATION, [str(tmp_path / 'a.json')])
+    journal.record_done(entry, ledger.VIDEO, [str(tmp_path / 'a.json')])
+
+    resumed = ledger.Ledger.in_dataset(str(tmp_path))
+    assert resumed.state(entry, ledger.VIDEO) == ledger.DONE
+    assert resumed.pending(entry) == [ledger.KEYFRAMES]
+    assert resumed.get(entry, ledger.ANNOTATION)['sha256'] == ledger.checksum([str(tmp_path / 'a.json')])
+
+
+def test_torn_last_line_is_dropped(tmp_path, entry):
+    journal = ledger.Ledger.in_dataset(str(tmp_path))
+    journal.record_failure(entry, ledger.ANNOTATION, Exception())
+    with open(journal.path, 'a') as f:
+        f.write('{"video_id": "HOBWRI0000", "artif')
+
+    resumed = ledger.Ledger.in_dataset(str(tmp_path))
+    resumed.record_failure(entry, ledger.VIDEO, Exception())
+    with open(journal.path) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['artifact'] for record in records] == [ledger.ANNOTATION, ledger.VIDEO]
+    assert ledger.Ledger.in_dataset(str(tmp_path)).state(entry, ledger.VIDEO) == ledger.FAILED
+
+
+def test_adopt(tmp_path, entry):
+    journal = ledger.Ledger.in_dataset(str(tmp_path))
+    for directory in (entry.annotation_dir, entry.video_dir, entry.keyframe_dir):
+        (tmp_path / directory).mkdir(parents=True, exist_ok=True)
+    write(entry.annotation_path())
+    write(entry.keyframe_path(0))
+    write(entry.keyframe_path(1))
+    assert not journal.adopt(entry)
+    assert journal.pending(entry) == list(ledger.ARTIFACTS)
+
+    write(entry.video_path())
+    assert journal.adopt(entry)
+    assert journal.is_complete(entry)
+    assert journal.get(entry, ledger.KEYFRAMES)['files'] == 2
+
+
+def test_pending_ignores_records_of_another_video(tmp_path, entry):
+    journal = ledger.Ledger.in_dataset(str(tmp_path))
+    write(tmp_path / 'a.json')
+    for artifact in ledger.ARTIFACTS:
+        journal.record_done(entry, artifact, [str(tmp_path / 'a.json')])
+    replaced = MSMOEntry(entry.category, entry.subcategory, entry.index, 'yt1', entry.root_dir)
+    assert journal.is_complete(entry)
+    assert journal.pending(replaced) == list(ledger.ARTIFACTS)
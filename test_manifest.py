@@ -0,0 +1,72 @@
+import json
+import os
+
+from lib import data
+from lib import ledger
+from lib import manifest
+from lib import utils
+
+
+def write_keys(key_dir, youtube_ids):
+    with open(os.path.join(key_dir, 'hobbies.csv'), 'w') as f:
+        f.write('Writing,' + ','.join(youtube_ids) + '\n')
+    return list(data.read_entries(key_dir, os.path.join(key_dir, 'dataset')))
+
+
+def build(entry, journal):
+    """Write the files of an entry as a build would, recording them in the ledger."""
+    utils.make_dirs(entry.annotation_dir, entry.video_dir, entry.keyframe_dir)
+    annotation = {'info': {'video_id': entry.video_id, 'category': entry.category, 'sub_category': entry.subcategory}}
+    for path, content in (
+        (entry.annotation_path(), json.dumps(annotation)),
+        (entry.keyframe_path(0), entry.youtube_id),
+        (entry.video_path(), entry.youtube_id),
+    ):
+        with open(path, 'w') as f:
+            f.write(content)
+    journal.record_done(entry, ledger.ANNOTATION, [entry.annotation_path()])
+    journal.record_done(entry, ledger.KEYFRAMES, [entry.keyframe_path(0)])
+    journal.record_done(entry, ledger.VIDEO, [entry.video_path()])
+
+
+def built_dataset(tmp_path, youtube_ids):
+    journal = ledger.Ledger(str(tmp_path / 'dataset' / 'ledger.jsonl'))
+    for entry in write_keys(str(tmp_path), youtube_ids):
+        build(entry, journal)
+    return journal, manifest.Manifest.from_ledger(journal, str(tmp_path / 'dataset'))
+
+
+def test_plan(tmp_path):
+    _, built = built_dataset(tmp_path, ['a', 'b', 'c', 'd'])
+    assert built.by_youtube_id()['b'] == {'HOBWRI0001': {artifact: ledger.DONE for artifact in ledger.ARTIFACTS}}
+
+    # `b` removed, so `d` moves up, and `e` added
+    result = manifest.plan(built, write_keys(str(tmp_path), ['a', 'd', 'c', 'e']))
+    assert [entry.video_id for entry in result.keep] == ['HOBWRI0000', 'HOBWRI0002']
+    assert [(source.video_id, entry.video_id) for source, entry in result.renames] == [('HOBWRI0003', 'HOBWRI0001')]
+    assert [entry.youtube_id for entry in result.downloads] == ['e']
+    assert [source.youtube_id for source in result.deletions] == ['b']
+
+
+def test_apply_swaps_and_deletes(tmp_path):
+    journal, built = built_dataset(tmp_path, ['a', 'b', 'c'])
+    entries = write_keys(str(tmp_path), ['c', 'b', 'e'])
+    result = manifest.plan(built, entries)
+    assert result.summary() == {'keep': 1, 'renames': 1, 'downloads': 1, 'deletions': 1}
+    manifest.apply(result, journal, str(tmp_path / 'dataset'))
+
+    first, kept, added = entries
+    with open(first.video_path()) as f:
+        assert f.read() == 'c'
+    with open(first.annotation_path()) as f:
+        assert json.load(f)['info']['video_id'] == first.video_id
+    # Nothing is left of `a` or of the former id of `c`
+    assert not os.path.exists(added.video_path()) and not os.path.exists(added.keyframe_dir)
+    assert not os.path.exists(tmp_path / 'dataset' / manifest.STAGING_DIRNAME)
+
+    # Only `e` is left to download, also after replaying the journal
+    for journal in (journal, ledger.Ledger(journal.path)):
+        assert [journal.is_complete(entry) for entry in entries] == [True, True, False]
+        assert journal.pending(added) == list(ledger.ARTIFACTS)
+        assert manifest.plan(manifest.Manifest.from_ledger(journal, str(tmp_path / 'dataset')), entries).summary() \
+            == {'keep': 2, 'renames': 0, 'downloads': 1, 'deletions': 0}
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from lib import metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+
+def test_span_records_latency_and_errors(registry):
+    with registry.span('transcript'):
+        pass
+    with pytest.raises(ValueError):
+        with registry.span('transcript'):
+            raise ValueError()
+    histogram = registry.histogram(metrics.STAGE_SECONDS, stage='transcript')
+    assert histogram.count == 2
+    assert registry.counter(metrics.STAGE_ERRORS, stage='transcript') == 1
+    assert 'transcript' in registry.summary()
+
+
+def test_histogram_quantiles():
+    histogram = metrics.Histogram(buckets=(1., 2., 4.))
+    for value in (0.5, 0.5, 1.5, 3., 10.):
+        histogram.observe(value)
+    assert histogram.quantile(0.4) == 1.
+    assert histogram.quantile(0.6) == 2.
+    assert histogram.quantile(1.) == 10.
+
+
+def test_exports(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, '_registry', registry)
+    metrics.increment('bytes_downloaded', 100, stage='blob')
+    metrics.increment('bytes_downloaded', 50, stage='blob')
+    metrics.observe(metrics.STAGE_SECONDS, 0.2, stage='video')
+
+    metrics.export(str(tmp_path / 'metrics.prom'))
+    text = (tmp_path / 'metrics.prom').read_text()
+    assert 'msmo_bytes_downloaded{stage="blob"} 150' in text
+    assert 'msmo_stage_seconds_bucket{stage="video",le="0.25"} 1' in text
+    assert 'msmo_stage_seconds_count{stage="video"} 1' in text
+
+    metrics.export(str(tmp_path / 'metrics.jsonl'))
+    metrics.export(str(tmp_path / 'metrics.jsonl'))
+    lines = (tmp_path / 'metrics.jsonl').read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])['counters'][0]['value'] == 150
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,66 @@
+import io
+import os
+
+import pytest
+
+from lib import pack
+
+
+def write_samples(shards_dir, n, max_bytes=10_000):
+    with pack.ShardWriter(str(shards_dir), max_bytes=max_bytes) as writer:
+        for i in range(n):
+            writer.write(f"VID{i:04d}", {'json': b'{"i": %d}' % i, 'keyframe_0.jpg': bytes([i]) * 3000})
+    return writer
+
+
+def test_rolls_over_shards_and_indexes_samples(tmp_path):
+    write_samples(tmp_path, 10)
+    paths = pack.shard_paths(str(tmp_path))
+    # Each sample takes about 4.5KB with its tar headers, so two fit in a shard.
+    assert len(paths) == 5
+    index = pack.load_index(str(tmp_path))
+    assert len(index) == 10
+    sample = pack.read_sample(str(tmp_path), 'VID0007', index)
+    assert sample == {'__key__': 'VID0007', 'json': b'{"i": 7}', 'keyframe_0.jpg': bytes([7]) * 3000}
+
+
+def test_streams_samples_in_order(tmp_path):
+    write_samples(tmp_path, 10)
+    samples = list(pack.iter_samples(pack.shard_paths(str(tmp_path))))
+    assert [s['__key__'] for s in samples] == [f"VID{i:04d}" for i in range(10)]
+    with open(pack.shard_paths(str(tmp_path))[0], 'rb') as f:
+        stream = io.BytesIO(f.read())
+    assert list(pack.iter_samples([stream], extensions=('json', ))) == [
+        {'__key__': 'VID0000', 'json': b'{"i": 0}'}, {'__key__': 'VID0001', 'json': b'{"i": 1}'}
+    ]
+
+
+def test_reopening_appends_new_shards(tmp_path):
+    write_samples(tmp_path, 2)
+    with pack.ShardWriter(str(tmp_path), max_bytes=10_000) as writer:
+        assert 'VID0001' in writer
+        writer.write('NEW0000', {'json': b'{}'})
+    assert len(pack.shard_paths(str(tmp_path))) == 2
+    assert pack.read_sample(str(tmp_path), 'VID0000')['json'] == b'{"i": 0}'
+    assert pack.read_sample(str(tmp_path), 'NEW0000')['json'] == b'{}'
+
+
+def test_hardlinked_files_are_packed_in_full(tmp_path):
+    # Deduplicated keyframes are hardlinks to the same blob
+    blob = tmp_path / 'blob.jpg'
+    blob.write_bytes(b'\xff' * 1000)
+    os.link(blob, tmp_path / 'keyframe_1.jpg')
+    shards_dir = tmp_path / 'shards'
+    with pack.ShardWriter(str(shards_dir)) as writer:
+        writer.write('VID0000', {'keyframe_0.jpg': str(blob), 'keyframe_1.jpg': str(tmp_path / 'keyframe_1.jpg')})
+    index = pack.load_index(str(shards_dir))
+    assert {extension: size for extension, (_, size) in index['VID0000']['members'].items()} == {
+        'keyframe_0.jpg': 1000, 'keyframe_1.jpg': 1000
+    }
+    expected = {'__key__': 'VID0000', 'keyframe_0.jpg': b'\xff' * 1000, 'keyframe_1.jpg': b'\xff' * 1000}
+    assert pack.read_sample(str(shards_dir), 'VID0000', index) == expected
+    assert list(pack.iter_samples(pack.shard_paths(str(shards_dir)))) == [expected]
+
+
+if __name__ == '__main__':
+    pytest.main()
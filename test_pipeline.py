@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+
+import pytest
+
+from benchmarks.server import FakeServer
+from lib import backend
+from lib import pipeline
+from lib.data import MSMOEntry
+from lib.fetch import KeyframeError, Video
+from lib.ledger import ANNOTATION, DONE, FAILED, KEYFRAMES, VIDEO, Ledger
+
+
+class NoTranscriptBackend(backend.HTTPBackend):
+    """Fails the transcript of the videos in `broken`."""
+
+    def __init__(self, base_url, broken):
+        super().__init__(base_url)
+        self.broken = broken
+
+    def open(self, youtube_id):
+        source = super().open(youtube_id)
+        if youtube_id in self.broken:
+            source.transcript = self.no_transcript
+        return source
+
+    @staticmethod
+    def no_transcript():
+        raise ValueError('no transcript')
+
+
+class BrokenThumbnailBackend(backend.HTTPBackend):
+    """Fails the thumbnails whose url ends with one of `broken`."""
+
+    def __init__(self, base_url, broken):
+        super().__init__(base_url)
+        self.broken = broken
+
+    def fetch_blob(self, url, path):
+        return not url.endswith(self.broken) and super().fetch_blob(url, path)
+
+
+class SlowVideoBackend(NoTranscriptBackend):
+    """Holds video downloads until `release` is set."""
+
+    def __init__(self, base_url, broken):
+        super().__init__(base_url, broken)
+        self.release = threading.Event()
+
+    def fetch_stream(self, url, path, filesize=None):
+        assert self.release.wait(5)
+        super().fetch_stream(url, path, filesize)
+
+
+class BrokenLedger(Ledger):
+    """Fails to record annotation failures, letting the video stage go on."""
+
+    def __init__(self, path, release):
+        super().__init__(path)
+        self.release = release
+
+    def record_failure(self, entry, artifact, error):
+        if artifact == ANNOTATION:
+            self.release.set()
+            raise OSError('disk full')
+        super().record_failure(entry, artifact, error)
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FakeServer(latency=0, video_size=50_000, chapters=3) as server:
+        yield server
+
+
+def entries(root_dir, count):
+    return [MSMOEntry('Test', 'Pipeline', i, f"pipe{i:04d}", str(root_dir)) for i in range(count)]
+
+
+def test_pipeline_matches_sequential_download(server, tmp_path):
+    staged = entries(tmp_path / 'staged', 6)
+    ledger = Ledger.in_dataset(str(tmp_path / 'staged'))
+    workers = pipeline.Workers(metadata=2, keyframes=2, transcript=1, video=1)
+    assert pipeline.Pipeline(backend.HTTPBackend(server.url), ledger=ledger, workers=workers).run(staged) == []
+    assert all(ledger.is_complete(entry) for entry in staged)
+    for entry in entries(tmp_path / 'sequential', 2):
+        Video(entry, backend=backend.HTTPBackend(server.url)).download()
+        with open(entry.annotation_path()) as f, open(staged[entry.index].annotation_path()) as g:
+            assert json.load(f) == json.load(g)
+
+
+def test_failed_stage_is_recorded(server, tmp_path):
+    batch = entries(tmp_path, 4)
+    ledger = Ledger.in_dataset(str(tmp_path))
+    done = []
+    failures = pipeline.Pipeline(
+        NoTranscriptBackend(server.url, {'pipe0002'}), ledger=ledger, on_done=lambda entry: done.append(entry)
+    ).run(iter(batch))
+    assert [(entry.video_id, type(error)) for entry, error in failures] == [(batch[2].video_id, ValueError)]
+    assert sorted(e.video_id for e in done) == [e.video_id for e in batch]
+    states = ledger.summary()
+    assert states[ANNOTATION][FAILED] == states[KEYFRAMES][FAILED] == 1
+    assert states[VIDEO][DONE] == 4
+
+
+def test_keyframe_failures_are_reported_together(server, tmp_path):
+    entry = entries(tmp_path, 1)[0]
+    # Thumbnails are numbered in order, the keyframe-sized one of chapter i being `2i + 1`
+    video = Video(entry, backend=BrokenThumbnailBackend(server.url, ('/1.jpg', '/5.jpg')))
+    with pytest.raises(KeyframeError) as error:
+        video.get_summary()
+    assert sorted(error.value.failures) == [0, 2]
+    assert os.path.exists(entry.keyframe_path(1))
+
+
+def test_incomplete_backend_cannot_be_instantiated():
+    class NoOpen(backend.Backend):
+        pass
+
+    with pytest.raises(TypeError):
+        NoOpen()
+
+
+def test_entry_is_finished_once_when_recording_a_failure_fails(server, tmp_path):
+    entry = entries(tmp_path, 1)[0]
+    source = SlowVideoBackend(server.url, {entry.youtube_id})
+    ledger = BrokenLedger(os.path.join(str(tmp_path), 'ledger.jsonl'), source.release)
+    done = []
+    failures = pipeline.Pipeline(
+        source, ledger=ledger, on_done=lambda entry: done.append(os.path.exists(entry.video_path()))
+    ).run([entry])
+    assert [(e.video_id, type(error)) for e, error in failures] == [(entry.video_id, ValueError)]
+    # The entry is only done once its video is downloaded
+    assert done == [True]
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,50 @@
+import pytest
+
+from benchmarks.server import FakeServer
+from lib import backend
+from lib import probe
+from lib.data import MSMOEntry
+from lib.fetch import Video
+from lib.ledger import FAILED, VIDEO, Ledger
+
+FORMATS = [
+    probe.StreamFormat(18, 'video/mp4', '360p', 30, 5_000, True),
+    probe.StreamFormat(22, 'video/mp4', '720p', 30, None, True),
+    probe.StreamFormat(17, 'video/3gpp', '144p', 8, 1_000, True),
+    probe.StreamFormat(137, 'video/mp4', '1080p', 30, 90_000, False),
+    probe.StreamFormat(160, 'video/mp4', '144p', 30, 2_000, True),
+    probe.StreamFormat(140, 'audio/mp4', None, None, 500, True),
+]
+
+
+@pytest.mark.parametrize(
+    'max_res, prefer, itag',
+    [
+        (None, probe.HIGHEST, 22),
+        (480, probe.HIGHEST, 18),
+        (None, probe.LOWEST, 160),
+        (360, probe.LOWEST, 160),
+        # Formats of unknown size come last
+        (None, probe.SMALLEST, 160),
+        (720, probe.SMALLEST, 160),
+        (100, probe.HIGHEST, None),
+    ],
+)
+def test_select(max_res, prefer, itag):
+    selected = probe.select(FORMATS, probe.StreamPolicy(max_res=max_res, prefer=prefer))
+    assert (selected.itag if selected else None) == itag
+
+
+def test_select_ignores_audio_adaptive_and_other_containers():
+    assert probe.select(FORMATS[2:4] + FORMATS[5:], probe.StreamPolicy()) is None
+    assert probe.select([], probe.StreamPolicy()) is None
+
+
+def test_no_matching_stream_is_recorded_as_a_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(probe, '_policy', probe.StreamPolicy(max_res=240))
+    entry = MSMOEntry('Test', 'Probe', 0, 'probe0000', str(tmp_path))
+    ledger = Ledger.in_dataset(str(tmp_path))
+    with FakeServer(latency=0, video_size=10_000) as server:
+        Video(entry, ledger=ledger, backend=backend.HTTPBackend(server.url)).download_video()
+    assert ledger.state(entry, VIDEO) == FAILED
+    assert '240' in ledger.get(entry, VIDEO)['error']
@@ -0,0 +1,32 @@
+import os
+
+import reannotate
+from lib import ledger
+from lib.data import MSMOEntry
+
+
+def test_only_changed_annotations_are_written(tmp_path):
+    entry = MSMOEntry('hobbies', 'writing', 0, 'yt0', str(tmp_path))
+    assert reannotate.write_if_changed(entry, '{}', dry_run=True) == reannotate.CREATED
+    assert not os.path.exists(entry.annotation_path())
+    assert reannotate.write_if_changed(entry, '{}') == reannotate.CREATED
+    mtime = os.stat(entry.annotation_path()).st_mtime_ns
+    assert reannotate.write_if_changed(entry, '{}') == reannotate.UNCHANGED
+    assert os.stat(entry.annotation_path()).st_mtime_ns == mtime
+    assert reannotate.write_if_changed(entry, '{"a": 1}') == reannotate.UPDATED
+    with open(entry.annotation_path()) as f:
+        assert f.read() == '{"a": 1}'
+
+
+def test_rewritten_annotations_are_recorded(tmp_path):
+    tracked, untracked = (MSMOEntry('hobbies', 'writing', i, f"yt{i}", str(tmp_path)) for i in range(2))
+    journal = ledger.Ledger.in_dataset(str(tmp_path))
+    for entry in (tracked, untracked):
+        reannotate.write_if_changed(entry, '{}')
+    journal.record_done(tracked, ledger.ANNOTATION, [tracked.annotation_path()])
+
+    reannotate.write_if_changed(tracked, '{"a": 1}')
+    for entry in (tracked, untracked):
+        reannotate.record(journal, entry, reannotate.UPDATED)
+    assert journal.get(tracked, ledger.ANNOTATION)['sha256'] == ledger.checksum([tracked.annotation_path()])
+    assert not journal.is_tracked(untracked)
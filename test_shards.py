@@ -0,0 +1,80 @@
+import pytest
+
+from lib import data
+from lib import ledger
+from lib.index import DatasetIndex
+
+
+@pytest.fixture
+def key_dir(tmp_path):
+    for category in ('hobbies', 'education', 'sports'):
+        with open(tmp_path / f"{category}.csv", 'w') as f:
+            for subcategory in ('Writing', 'Drawing'):
+                f.write(subcategory + ',' + ','.join(f"{category}{subcategory}{i}" for i in range(7)) + '\n')
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('by', data.SHARD_BY)
+def test_shards_partition_entries(key_dir, by):
+    everything = [e.video_id for e in data.read_entries(key_dir, '.')]
+    shards = [[e.video_id for e in data.read_entries(key_dir, '.', shard=data.Shard(i, 4, by))] for i in range(4)]
+    assert sorted(sum(shards, [])) == sorted(everything)
+    assert len(set(sum(shards, []))) == len(everything)
+
+
+def test_entries_are_read_in_a_fixed_order(key_dir):
+    assert [e.category for e in data.read_entries(key_dir, '.')][::14] == ['education', 'hobbies', 'sports']
+
+
+def test_parse_shard():
+    assert data.Shard.parse('1/4', data.CATEGORY) == data.Shard(1, 4, data.CATEGORY)
+    for spec in ('4/4', '1', 'a/b', '-1/2'):
+        with pytest.raises(ValueError):
+            data.Shard.parse(spec)
+
+
+def test_merge_shard_ledgers(key_dir, tmp_path):
+    entries = list(data.read_entries(key_dir, str(tmp_path)))
+    for i in range(2):
+        shard = data.Shard(i, 2)
+        shard_ledger = ledger.Ledger.in_dataset(str(tmp_path), shard)
+        for entry in data.read_entries(key_dir, str(tmp_path), shard=shard):
+            shard_ledger.record_failure(entry, ledger.VIDEO, Exception())
+    merged = ledger.merge_shards(str(tmp_path), remove=True)
+    assert merged.summary()[ledger.VIDEO][ledger.FAILED] == len(entries)
+    assert ledger.shard_paths(str(tmp_path)) == []
+    assert ledger.Ledger.in_dataset(str(tmp_path)).summary() == merged.summary()
+
+
+def test_shard_ledger_starts_from_main_ledger(key_dir, tmp_path):
+    shard = data.Shard(0, 2)
+    entry, other = list(data.read_entries(key_dir, str(tmp_path), shard=shard))[:2]
+    first = ledger.Ledger.in_dataset(str(tmp_path), shard)
+    first.record_failure(entry, ledger.VIDEO, Exception('timeout'))
+    ledger.merge_shards(str(tmp_path), remove=True)
+
+    rerun = ledger.Ledger.in_dataset(str(tmp_path), shard)
+    assert rerun.get(entry, ledger.VIDEO)['error'] == repr(Exception('timeout'))
+    rerun.record_failure(other, ledger.VIDEO, Exception())
+    # Only the records of the rerun are written to the shard journal
+    assert len(ledger.Ledger(ledger.ledger_path(str(tmp_path), shard)).records()) == 1
+    assert ledger.merge_shards(str(tmp_path)).summary()[ledger.VIDEO][ledger.FAILED] == 2
+
+
+def test_concat_indexes():
+    first = DatasetIndex.from_rows(
+        [('A', 'a', 'c', 's', 10, 1, 1, 1, 1)], [(0, 0, 0, 10, 10, 5, 0, 1)], [(0, 0, 0, 10)]
+    )
+    second = DatasetIndex.from_rows(
+        [('B', 'b', 'c', 's', 20, 2, 1, 1, 2), ('C', 'c', 'c', 's', 5, 1, 1, 1, 1)],
+        [(0, 0, 0, 9, 9, 5, 0, 0), (0, 1, 10, 20, 10, 5, 0, 1), (1, 0, 0, 5, 5, 5, 0, 1)],
+        [(0, 1, 12, 20), (1, 0, 0, 5)],
+    )
+    index = DatasetIndex.concat([first, second])
+    assert list(index.videos['video_id']) == ['A', 'B', 'C']
+    assert list(index.videos['video_id'][index.segments['video']]) == ['A', 'B', 'B', 'C']
+    assert list(index.videos['video_id'][index.transcripts['video']]) == ['A', 'B', 'C']
+
+
+if __name__ == '__main__':
+    pytest.main()
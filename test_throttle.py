@@ -0,0 +1,115 @@
+import os
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.server import FakeServer
+from lib import scheduler
+from lib import session
+from lib import throttle
+from lib import utils
+
+
+@pytest.fixture(autouse=True)
+def default_config():
+    session.configure(retries=0)
+    yield
+    throttle.configure(**vars(throttle.ThrottleConfig()))
+    session.configure(**vars(session.SessionConfig()))
+
+
+def fetch_thumbnails(server: FakeServer, directory, n: int, workers: int = 8):
+    limiter = scheduler.TrafficLimiter()
+
+    def fetch(i):
+        url = f"{server.url}/thumb/abc/{i}.jpg"
+        with limiter.slot(scheduler.THUMBNAIL, url):
+            utils.download_blob(url, os.path.join(directory, f"{i}.jpg"))
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(fetch, range(n)))
+    return throttle.metrics()[throttle.host_of(server.url)]
+
+
+def test_backs_off_when_throttled(tmp_path):
+    throttle.configure(rate=200., max_rate=200.)
+    with FakeServer(latency=0, rate_limit=20.) as server:
+        metrics = fetch_thumbnails(server, tmp_path, 60)
+    assert metrics['throttle_events'] > 0
+    assert metrics['throttle_events'] == server.throttled
+    assert metrics['rate'] < 200.
+
+
+def test_speeds_up_when_healthy(tmp_path):
+    throttle.configure(rate=50., max_rate=100., increase=1.)
+    with FakeServer(latency=0) as server:
+        metrics = fetch_thumbnails(server, tmp_path, 40)
+    assert metrics['throttle_events'] == 0
+    assert metrics['rate'] == pytest.approx(90.)
+
+
+def test_throttled_exception_slows_down_host():
+    throttle.configure(rate=10.)
+    limiter = scheduler.TrafficLimiter()
+    with pytest.raises(urllib.error.HTTPError):
+        with limiter.slot(scheduler.METADATA, 'https://youtube.com/watch?v=abc'):
+            raise urllib.error.HTTPError('https://youtube.com/watch?v=abc', 429, 'Too Many Requests', {}, None)
+    metrics = throttle.metrics()['youtube.com']
+    assert metrics['throttle_events'] == 1
+    assert metrics['rate'] == pytest.approx(5.)
+
+
+def test_retry_after_pauses_host():
+    rate_limiter = throttle.AdaptiveRateLimiter(throttle.ThrottleConfig(rate=100.))
+    rate_limiter.on_throttle(retry_after=0.2)
+    start = time.monotonic()
+    rate_limiter.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_retry_counts_attempts_per_call():
+    calls = []
+
+    @utils.retry(tries=2)
+    def flaky(x):
+        """Fails on every other call."""
+        calls.append(x)
+        if len(calls) % 2:
+            raise ValueError(x)
+        return x
+
+    assert flaky.__name__ == 'flaky'
+    assert flaky(1) == (1, None)
+    assert flaky(2) == (2, None)
+    result, error = utils.retry(tries=3)(lambda: 1 / 0)()
+    assert result is None and 'division by zero' in str(error)
+
+
+def test_throttled_blob_is_not_a_success(tmp_path):
+    throttle.configure(rate=1000., max_rate=1000.)
+    limiter = scheduler.TrafficLimiter()
+    with FakeServer(latency=0, rate_limit=1.) as server:
+        downloaded = []
+        for i in range(10):
+            url = f"{server.url}/thumb/abc/{i}.jpg"
+            with limiter.slot(scheduler.THUMBNAIL, url):
+                downloaded.append(utils.download_blob(url, os.path.join(tmp_path, f"{i}.jpg")))
+    metrics = throttle.metrics()[throttle.host_of(server.url)]
+    assert metrics['throttle_events'] == downloaded.count(False) > 0
+    assert metrics['successes'] == downloaded.count(True)
+
+
+def test_throttled_responses_retried_by_the_session_are_reported(tmp_path):
+    # The default number of retries, without the backoff between them
+    session.configure(retries=session.SessionConfig().retries, backoff_factor=0.)
+    throttle.configure(rate=200., max_rate=200.)
+    with FakeServer(latency=0, rate_limit=10.) as server:
+        metrics = fetch_thumbnails(server, tmp_path, 20)
+    assert metrics['throttle_events'] == server.throttled > 0
+    assert metrics['rate'] < 200.
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from lib import timestamps
+
+
+def test_round_trip():
+    seconds = [0, 59, 60, 3599, 3600, 86399, 86400, 359999, 360000]
+    formatted = timestamps.to_timestamps(seconds)
+    assert formatted[:3] == ['00:00:00', '00:00:59', '00:01:00']
+    # Hours are not wrapped at 24, and take a third digit from 100 on
+    assert formatted[-3:] == ['24:00:00', '99:59:59', '100:00:00']
+    assert formatted == [timestamps.to_timestamp(s) for s in seconds]
+    assert timestamps.to_seconds_array(formatted).tolist() == seconds
+    assert [timestamps.to_seconds(t) for t in formatted] == seconds
+
+
+def test_fractions_are_floored():
+    assert timestamps.to_timestamps(np.array([1.99, 61.5])) == ['00:00:01', '00:01:01']
+    assert timestamps.to_timestamp(1.99) == '00:00:01'
+
+
+@pytest.mark.parametrize('batch', [['1:00:00'], ['12:0a:00'], ['12-00-00'], ['12:00:0', '012:00:00'], ['01:00:0٣']])
+def test_malformed(batch):
+    with pytest.raises(ValueError):
+        timestamps.to_seconds_array(batch)
+    with pytest.raises(ValueError):
+        [timestamps.to_seconds(t) for t in batch]
+
+
+if __name__ == '__main__':
+    pytest.main()
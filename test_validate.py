@@ -0,0 +1,40 @@
+import os
+
+from lib import constants
+from lib import data
+from lib import validate
+
+
+def touch(path):
+    with open(path, 'wb') as f:
+        f.write(b'\x00')
+
+
+def test_validate_reports_each_problem(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, 'NUM_CATEGORIES', 1)
+    monkeypatch.setattr(constants, 'NUM_SUBCATEGORIES', 1)
+    monkeypatch.setattr(constants, 'NUM_ENTRIES_PER_SUBCATEGORY', 3)
+    entries = [data.MSMOEntry('hobbies', 'writing', i, f"yt{i}", str(tmp_path)) for i in range(3)]
+    data.make_tree(entries)
+    for entry in entries:
+        os.makedirs(entry.keyframe_dir)
+        for path in (entry.annotation_path(), entry.video_path(), entry.keyframe_path(0), entry.keyframe_path(1)):
+            touch(path)
+    os.remove(entries[1].annotation_path())
+    os.remove(entries[0].keyframe_path(0))
+    touch(os.path.join(entries[2].video_dir, 'extra.txt'))
+
+    report = validate.validate(str(tmp_path))
+    errors = {check: result['errors'] for check, result in report['checks'].items()}
+    assert [message.rsplit(': ', 1)[-1] for message in errors[validate.EACH_ANNOTATION]] == [
+        'Expected `HOBWRI0001.json`; Received `HOBWRI0002.json`'
+    ]
+    assert [message.rsplit(': ', 1)[-1] for message in errors[validate.EACH_VIDEO]] == [
+        'Expected `HOBWRI0003.mp4`; Received `extra.txt`'
+    ]
+    assert len(errors[validate.KEYFRAMES_IN_ORDER]) == 1
+    assert errors[validate.KEYFRAMES_IN_ORDER][0].startswith(entries[0].keyframe_dir)
+    assert report['checks'][validate.AT_LEAST_ONE_KEYFRAME]['passed']
+    assert sorted(message.rsplit('; ', 1)[-1] for message in errors[validate.COMPLETE_DIR_STRUCTURE]) == [
+        'Found 2', 'Found 4'
+    ]
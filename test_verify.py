@@ -0,0 +1,53 @@
+import json
+import struct
+
+import pytest
+
+from benchmarks import fixtures
+from lib import constants
+from lib import verify
+from lib.data import MSMOEntry
+
+
+def write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_mp4_duration(tmp_path):
+    assert verify.mp4_duration(write(tmp_path / 'a.mp4', fixtures.mp4(600, 5000))) == 600
+
+
+def test_truncated_mp4(tmp_path):
+    with pytest.raises(verify.VerificationError, match='truncated'):
+        verify.mp4_duration(write(tmp_path / 'a.mp4', fixtures.mp4(600, 5000)[:-100]))
+    # Only the `ftyp` box
+    mp4 = fixtures.mp4(600, 5000)
+    ftyp = mp4[:struct.unpack('>I', mp4[:4])[0]]
+    with pytest.raises(verify.VerificationError, match='Missing `moov`'):
+        verify.mp4_duration(write(tmp_path / 'b.mp4', ftyp))
+
+
+def test_jpeg_size(tmp_path):
+    jpeg = fixtures.jpeg(336, 188, 2000)
+    assert verify.jpeg_size(write(tmp_path / 'a.jpg', jpeg)) == (336, 188)
+    with pytest.raises(verify.VerificationError, match='truncated'):
+        verify.jpeg_size(write(tmp_path / 'b.jpg', jpeg[:-2]))
+    with pytest.raises(verify.VerificationError, match='SOI'):
+        verify.jpeg_size(write(tmp_path / 'c.jpg', b'GIF89a' + jpeg))
+
+
+def test_cached_result_depends_on_tolerance(tmp_path):
+    entry = MSMOEntry('hobbies', 'writing', 0, 'yt0', str(tmp_path))
+    for directory in (entry.annotation_dir, entry.video_dir, entry.keyframe_dir):
+        (tmp_path / directory).mkdir(parents=True, exist_ok=True)
+    annotation = {'info': {'duration': '00:10:00'}, 'summary': [{}]}
+    write(entry.annotation_path(), json.dumps(annotation).encode())
+    write(entry.video_path(), fixtures.mp4(603, 5000))
+    write(entry.keyframe_path(0), fixtures.jpeg(constants.KEYFRAME_WIDTH, constants.KEYFRAME_HEIGHT, 2000))
+
+    strict = verify.verify_cached(entry, None, duration_tolerance=2.)
+    assert [failure['artifact'] for failure in strict['failures']] == ['video']
+    assert verify.verify_cached(entry, strict, duration_tolerance=2.) is strict
+    assert verify.verify_cached(entry, strict, duration_tolerance=5.)['failures'] == []
@@ -0,0 +1,36 @@
+import argparse
+import json
+import os
+import sys
+
+from lib import constants
+from lib import validate
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Validator', description='Checks the directory structure and files of the dataset'
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', default=constants.DATASET_DIR)
+    parser.add_argument('-o', '--output', help='Path of the JSON report (default: stdout)', default=None)
+    parser.add_argument('-j', '--processes', help='Number of worker processes', default=os.cpu_count(), type=int)
+    return parser
+
+
+def main(args: argparse.Namespace) -> int:
+    report = validate.validate(args.dataset_dir, processes=args.processes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        for check, result in report['checks'].items():
+            status = 'passed' if result['passed'] else f"{len(result['errors'])} errors"
+            print(f"{check}: {status}")
+    else:
+        print(json.dumps(report, indent=2))
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    sys.exit(main(args))
@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from lib import data
+from lib import verify
+from lib.ledger import Ledger
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='MSMO Verifier', description='Decodes the videos and keyframes of the dataset to find corrupt files'
+    )
+    parser.add_argument(
+        '--video-ids', help='Path to a directory with .csv files of videos in the dataset', required=True
+    )
+    parser.add_argument('-d', '--dataset-dir', help='Directory of the dataset', required=True)
+    parser.add_argument('-j', '--processes', help='Number of worker processes', default=os.cpu_count(), type=int)
+    parser.add_argument(
+        '--duration-tolerance',
+        help='Maximum difference in seconds between the video and annotation durations',
+        default=2.,
+        type=float
+    )
+    parser.add_argument(
+        '-o', '--output', help='Path of the re-download queue (JSONL, one failing file per line)', default=None
+    )
+    parser.add_argument(
+        '--mark-ledger',
+        help='Mark the failing artifacts as failed in the build ledger, so the next build downloads them again',
+        action='store_true'
+    )
+    return parser
+
+
+def _verify(args):
+    return verify.verify_cached(*args)
+
+
+def main(args: argparse.Namespace) -> int:
+    entries = list(data.read_entries(args.video_ids, args.dataset_dir))
+    cache = verify.load_cache(args.dataset_dir)
+    tasks = ((entry, cache.get(entry.video_id), args.duration_tolerance) for entry in entries)
+    queue = []
+    with ProcessPoolExecutor(args.processes) as pool:
+        for entry, result in tqdm(zip(entries, pool.map(_verify, tasks, chunksize=8)), total=len(entries)):
+            cache[entry.video_id] = result
+            for failure in result['failures']:
+                queue.append({'video_id': entry.video_id, 'youtube_id': entry.youtube_id, **failure})
+    verify.save_cache(args.dataset_dir, cache)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.writelines(json.dumps(item) + '\n' for item in queue)
+    if args.mark_ledger:
+        ledger = Ledger.in_dataset(args.dataset_dir)
+        by_id = {entry.video_id: entry for entry in entries}
+        for item in {(item['video_id'], item['artifact']): item for item in queue}.values():
+            ledger.record_failure(by_id[item['video_id']], item['artifact'], verify.VerificationError(item['error']))
+
+    failed = {item['video_id'] for item in queue}
+    print(f"{len(entries) - len(failed)} entries verified, {len(failed)} with {len(queue)} failing files")
+    return 1 if queue else 0
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:])
+    sys.exit(main(args))